@@ -0,0 +1,200 @@
+"""
+ann_index.py
+Pure-NumPy IVF (inverted file) approximate nearest-neighbour index for
+128-D face embeddings. Used instead of the brute-force GalleryMatcher scan
+once the gallery grows past ANN_MIN_GALLERY_SIZE identities.
+"""
+
+import logging
+import numpy as np
+
+from config import DISTANCE_METRIC, ANN_NLIST, ANN_TARGET_RECALL
+
+_EPS = 1e-8
+_FORMAT_VERSION = 1
+
+
+def _sq_dists(a, b, b_sq=None):
+    """Squared L2 distances between rows of a (N, D) and b (M, D)."""
+    a_sq = np.einsum('ij,ij->i', a, a)[:, None]
+    if b_sq is None:
+        b_sq = np.einsum('ij,ij->i', b, b)
+    return np.maximum(a_sq + b_sq[None, :] - 2.0 * (a @ b.T), 0.0)
+
+
+def kmeans(data, k, iters=20, seed=0, max_train=None):
+    """Plain Lloyd's k-means; returns (k, D) float32 centroids."""
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    if max_train and data.shape[0] > max_train:
+        data = data[rng.choice(data.shape[0], max_train, replace=False)]
+    k = min(k, data.shape[0])
+    centroids = data[rng.choice(data.shape[0], k, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmin(_sq_dists(data, centroids), axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters on random points so every list stays usable
+        if empty.any():
+            centroids[empty] = data[rng.choice(data.shape[0], int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Coarse k-means quantizer with one inverted list of gallery rows per centroid.
+
+    Vectors are stored reordered by list so each probe reads one contiguous
+    block. For the cosine metric rows are L2-normalized, which makes L2
+    ranking identical to cosine ranking (cos_dist = ||a - b||^2 / 2).
+    """
+
+    def __init__(self, centroids, offsets, ids, vectors, metric, nprobe=1, roll_nos=None, sq_norms=None):
+        # Arrays already of the right dtype and layout (e.g. views of shared memory) are used without copying
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.metric = metric
+        self.nprobe = int(nprobe)
+        self.roll_nos = None if roll_nos is None else [str(r) for r in roll_nos]
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.sq_norms = np.asarray(sq_norms, dtype=np.float32)
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @staticmethod
+    def _prepare(x, metric):
+        x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+        if metric == 'cosine':
+            x = x / (np.linalg.norm(x, axis=1, keepdims=True) + _EPS)
+        return x
+
+    @classmethod
+    def build(cls, features, roll_nos=None, metric=DISTANCE_METRIC, nlist=ANN_NLIST,
+              target_recall=ANN_TARGET_RECALL, iters=20, seed=0):
+        """Train the coarse quantizer, fill the inverted lists and calibrate nprobe."""
+        if metric not in ('cosine', 'euclidean'):
+            raise ValueError(f"Unsupported distance metric: {metric}")
+        data = cls._prepare(features, metric)
+        n = data.shape[0]
+        if n == 0:
+            raise ValueError("Cannot build an index over an empty gallery")
+        if not nlist:
+            nlist = int(4 * np.sqrt(n))
+        nlist = max(1, min(int(nlist), n))
+
+        centroids = kmeans(data, nlist, iters=iters, seed=seed, max_train=256 * nlist)
+        assign = np.argmin(_sq_dists(data, centroids), axis=1)
+        order = np.argsort(assign, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+
+        index = cls(centroids, offsets, order, data[order], metric, nprobe=1, roll_nos=roll_nos)
+        if target_recall:
+            index.calibrate(target_recall, seed=seed)
+        return index
+
+    def _exact(self, q, k):
+        d2 = _sq_dists(q, self.vectors, self.sq_norms)
+        pos = np.argsort(d2, axis=1)[:, :k]
+        return self.ids[pos], np.take_along_axis(d2, pos, axis=1)
+
+    def _to_metric(self, d2):
+        if self.metric == 'cosine':
+            return d2 / 2.0
+        return np.sqrt(d2)
+
+    def search(self, queries, k=1, nprobe=None):
+        """Return (indices, distances), both (N, k), in the index's metric.
+
+        Indices refer to the original gallery order. Rows whose probed lists
+        hold fewer than k vectors are padded with -1 / inf.
+        """
+        q = self._prepare(queries, self.metric)
+        nprobe = max(1, min(int(nprobe or self.nprobe), self.nlist))
+        out_idx = np.full((q.shape[0], k), -1, dtype=np.int64)
+        out_d2 = np.full((q.shape[0], k), np.inf, dtype=np.float32)
+        if len(self) == 0 or q.shape[0] == 0:
+            return out_idx, out_d2
+
+        coarse = _sq_dists(q, self.centroids)
+        if nprobe < self.nlist:
+            probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), coarse.shape)
+
+        for row, lists in enumerate(probes):
+            pos = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+            if pos.size == 0:
+                continue
+            d2 = _sq_dists(q[row:row + 1], self.vectors[pos], self.sq_norms[pos])[0]
+            kk = min(k, pos.size)
+            top = np.argpartition(d2, kk - 1)[:kk] if kk < pos.size else np.arange(pos.size)
+            top = top[np.argsort(d2[top])]
+            out_idx[row, :kk] = self.ids[pos[top]]
+            out_d2[row, :kk] = d2[top]
+
+        return out_idx, self._to_metric(out_d2)
+
+    def recall_at_1(self, queries, nprobe):
+        """Fraction of queries whose approximate top-1 equals the exact top-1."""
+        q = self._prepare(queries, self.metric)
+        exact, _ = self._exact(q, 1)
+        approx, _ = self.search(q, 1, nprobe=nprobe)
+        return float(np.mean(exact[:, 0] == approx[:, 0]))
+
+    def calibrate(self, target_recall=ANN_TARGET_RECALL, n_queries=256, noise=0.02, seed=0):
+        """Pick the smallest nprobe whose recall@1 against exact search meets target_recall.
+
+        Queries are gallery rows perturbed with Gaussian noise, which stands in
+        for a fresh capture of an enrolled student.
+        """
+        rng = np.random.default_rng(seed)
+        n = len(self)
+        sample = self.vectors[rng.choice(n, min(n_queries, n), replace=False)]
+        queries = sample + rng.normal(0.0, noise, sample.shape).astype(np.float32)
+
+        nprobe = 1
+        while True:
+            recall = self.recall_at_1(queries, nprobe)
+            if recall >= target_recall or nprobe >= self.nlist:
+                break
+            nprobe = min(nprobe * 2, self.nlist)
+        self.nprobe = nprobe
+        logging.info("IVF index calibrated: nlist=%d nprobe=%d recall@1=%.3f (target %.3f)",
+                     self.nlist, nprobe, recall, target_recall)
+        return nprobe
+
+    def matches_gallery(self, roll_nos):
+        """True if this index was built for exactly this gallery (same rows, same order)."""
+        return self.roll_nos is not None and self.roll_nos == [str(r) for r in roll_nos]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     version=np.array(_FORMAT_VERSION),
+                     metric=np.array(self.metric),
+                     nprobe=np.array(self.nprobe),
+                     centroids=self.centroids,
+                     offsets=self.offsets,
+                     ids=self.ids,
+                     vectors=self.vectors,
+                     roll_nos=np.array(self.roll_nos if self.roll_nos is not None else [], dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            if int(z['version']) != _FORMAT_VERSION:
+                raise ValueError(f"Unsupported IVF index version {int(z['version'])} in {path}")
+            return cls(z['centroids'], z['offsets'], z['ids'], z['vectors'],
+                       str(z['metric']), nprobe=int(z['nprobe']),
+                       roll_nos=z['roll_nos'].tolist())
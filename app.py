@@ -9,12 +9,22 @@ import json
 import redis
 import ssl
 import time
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_socketio import SocketIO, emit
 import mysql.connector
 from datetime import datetime, date, time, timedelta
 import logging
-from config import MYSQL_CONFIG, VALKEY_CONFIG, VALKEY_STREAM_NAME
+from config import (
+    MYSQL_CONFIG, VALKEY_CONFIG, DASHBOARD_DB_POOL_SIZE, DASHBOARD_DB_POOL_TIMEOUT_SEC, DB_POOL_HEALTH_CHECK_SEC,
+    VALKEY_COMMITS_STREAM, SUMMARY_TABLES_ENABLED, EXPORT_MAX_CONCURRENT, EXPORT_CHUNK_BYTES,
+    EXPORT_FETCH_ROWS, EXPORT_NET_WRITE_TIMEOUT_SEC
+)
+from db_pool import ConnectionPool, PoolExhausted
+from query_cache import QueryCache
+import attendance_partitions
+import columnar_export
+import stream_codec
+import stream_partitions
 
 # Set up logging early
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -32,9 +42,22 @@ thread_lock = eventlet.semaphore.Semaphore()
 
 # --- Connection Helper Functions ---
 
+# Shared by all dashboard routes. Read-only, so autocommit: every query sees the latest marks.
+db_pool = ConnectionPool({**MYSQL_CONFIG, 'autocommit': True}, max_size=DASHBOARD_DB_POOL_SIZE,
+                         timeout=DASHBOARD_DB_POOL_TIMEOUT_SEC,
+                         health_check_sec=DB_POOL_HEALTH_CHECK_SEC) if DASHBOARD_DB_POOL_SIZE > 0 else None
+
+
+# Aggregate results for / and /view; active only while valkey_stream_reader can invalidate it
+query_cache = QueryCache()
+
+
 def get_connection():
-    """Return a new MySQL connection using config. Caller must close."""
-    return mysql.connector.connect(**MYSQL_CONFIG)
+    """Return a MySQL connection (pooled unless DASHBOARD_DB_POOL_SIZE=0). Caller must close;
+    closing a pooled connection returns it to the pool."""
+    if db_pool is None:
+        return mysql.connector.connect(**MYSQL_CONFIG)
+    return db_pool.connection()
 
 
 def get_valkey_client_worker():
@@ -66,39 +89,35 @@ def valkey_stream_reader():
 
     DASHBOARD_GROUP = 'dashboard_readers'
 
+    streams = stream_partitions.readable_streams()
+
     if r:
+        for stream in streams:
+            try:
+                # We don't use XGROUP READ, but we create a non-durable group just for sanity checks if needed
+                r.xgroup_create(name=stream, groupname=DASHBOARD_GROUP, id='0', mkstream=True)
+                logging.info(f" [VALKEY] Dashboard reader group '{DASHBOARD_GROUP}' created on {stream}.")
+            except redis.exceptions.ResponseError as e:
+                if 'BUSYGROUP' in str(e):
+                    logging.info(f" [VALKEY] Dashboard reader group '{DASHBOARD_GROUP}' already exists on {stream}.")
+                else:
+                    logging.error(f" [VALKEY] Error creating group: {e}")
+
+    # Start each partition (and the consumers' commit notices) at its current end so only NEW
+    # events are handled; '$' for streams that are empty or cannot be inspected.
+    last_ids = {}
+    for stream in streams + [VALKEY_COMMITS_STREAM]:
         try:
-            # We don't use XGROUP READ, but we create a non-durable group just for sanity checks if needed
-            r.xgroup_create(name=VALKEY_STREAM_NAME, groupname=DASHBOARD_GROUP, id='0', mkstream=True)
-            logging.info(f" [VALKEY] Dashboard reader group '{DASHBOARD_GROUP}' created (non-durable listener).")
-        except redis.exceptions.ResponseError as e:
-            if 'BUSYGROUP' in str(e):
-                logging.info(f" [VALKEY] Dashboard reader group '{DASHBOARD_GROUP}' already exists.")
-            else:
-                logging.error(f" [VALKEY] Error creating group: {e}")
-
-    # Set initial ID to '0-0' (start of stream) if thread is first running,
-    # but we will use the stream's current end ID after the first run.
-    # To catch all messages reliably after startup, let's start at the beginning of stream ('0').
-    last_id = '0'
-
-    # Attempt to find the actual latest ID if the stream exists
-    try:
-        if r:
-            stream_info = r.xinfo_stream(VALKEY_STREAM_NAME)
-            # Use the last ID if the stream has entries, otherwise use '$' for new entries
+            stream_info = r.xinfo_stream(stream) if r else {}
             if stream_info.get(b'last-generated-id'):
-                # Set last_id to the last entry seen plus one, to catch only NEW ones.
-                # The '0' initial read below will fetch all, but we ensure it works on subsequent loops.
-                last_id = stream_info[b'last-generated-id'].decode()
-                logging.info(f" [VALKEY] Starting read from existing stream ID: {last_id}")
+                last_ids[stream] = stream_info[b'last-generated-id'].decode()
+                logging.info(f" [VALKEY] Starting read of {stream} from existing stream ID: {last_ids[stream]}")
             else:
-                # If stream is empty, start reading from the next one created
-                last_id = '$'
-                logging.info(" [VALKEY] Starting read from end of empty stream.")
-    except Exception as e:
-        logging.warning(f" [VALKEY] Could not determine last stream ID: {e}. Defaulting to '$'.")
-        last_id = '$'
+                last_ids[stream] = '$'
+                logging.info(f" [VALKEY] Starting read of {stream} from end of empty stream.")
+        except Exception as e:
+            logging.warning(f" [VALKEY] Could not determine last ID of {stream}: {e}. Defaulting to '$'.")
+            last_ids[stream] = '$'
 
     while True:
         if r is None:
@@ -108,33 +127,49 @@ def valkey_stream_reader():
                 continue
 
         try:
-            # XREAD is used here. If last_id is '$', it waits for a new message.
-            # If last_id is a specific ID, it reads from the next entry.
+            # One XREAD covers every partition. For a stream at '$' it waits for a new message;
+            # for a specific ID it reads from the next entry.
             messages = r.xread(
-                streams={VALKEY_STREAM_NAME: last_id},
+                streams=last_ids,
                 count=10,
                 block=5000  # Block for up to 5 seconds
             )
 
-            if messages:
-                # messages structure: [[stream_name, [[id, data], [id, data], ...]]]
-                stream_data = messages[0][1]
+            query_cache.activate()
 
+            # messages structure: [[stream_name, [[id, data], [id, data], ...]], ...]
+            events = set()
+            for stream_name, stream_data in messages or []:
+                stream = stream_name.decode() if isinstance(stream_name, bytes) else stream_name
                 for msg_id, data in stream_data:
-                    # Decode byte keys/values to string before sending over WebSocket
-                    payload = {k.decode('utf-8'): v.decode('utf-8') for k, v in data.items()}
+                    last_id = last_ids[stream] = msg_id.decode()  # Update last read ID
+                    if stream == VALKEY_COMMITS_STREAM:
+                        # A consumer committed these (class_id, date) pairs; cached views of them are stale now
+                        try:
+                            events |= stream_codec.decode_commits(data)
+                        except ValueError as e:
+                            logging.warning(f" [VALKEY] Skipping malformed commit notice {last_id}: {e}")
+                        continue
+                    try:
+                        mark = stream_codec.decode(data)
+                    except ValueError as e:
+                        logging.warning(f" [VALKEY] Skipping malformed message {last_id}: {e}")
+                        continue
 
                     # Broadcast the new attendance event to all connected clients
                     socketio.emit('new_attendance_event', {
-                        'roll_no': payload.get('roll_no'),
-                        'class_id': payload.get('class_id')
+                        'roll_no': mark.roll_no,
+                        'class_id': str(mark.class_id)
                     }, namespace='/')
 
-                    last_id = msg_id.decode()  # Update last read ID
-                    logging.info(f" [SOCKETIO] Emitted new event for Roll No: {payload.get('roll_no')}")
+                    logging.info(f" [SOCKETIO] Emitted new event for Roll No: {mark.roll_no}")
+
+            if events:
+                query_cache.invalidate(events)
 
         except Exception as e:
             logging.error(f" [!!!] Error reading stream/emitting: {e}")
+            query_cache.deactivate()  # events may be missed until the reader is back
             r = None  # Force reconnect
 
         socketio.sleep(0.1)  # Yield control to the eventlet loop
@@ -181,19 +216,41 @@ def count_total_students():
 
 
 def count_total_records():
+    return query_cache.get_or_compute(('total_records',), (None, None, None), _count_total_records)
+
+
+def _count_total_records():
     conn = get_connection()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM attendance")
+        cur.execute(f"SELECT COUNT(*) FROM {attendance_partitions.history_source(conn)} a")
         return cur.fetchone()[0]
     finally:
         conn.close()
 
 
 def fetch_class_overview(date_from=None, date_to=None):
+    return query_cache.get_or_compute(('class_overview', date_from, date_to), (None, date_from, date_to),
+                                      lambda: _fetch_class_overview(date_from, date_to))
+
+
+def _overview_rows(rows, total_students):
+    overview = []
+    for class_id, class_name, total_sessions, total_attendances in rows:
+        ts = int(total_sessions or 0)
+        ta = int(total_attendances or 0)
+        avg_pct = round((ta / (total_students * ts) * 100) if (ts > 0 and total_students > 0) else 0.0, 1)
+        overview.append((class_id, class_name, ts, ta, avg_pct))
+    return overview
+
+
+def _fetch_class_overview(date_from=None, date_to=None):
     """Return per-class overview: (class_id, class_name, total_sessions, total_attendances, avg_pct)."""
+    if SUMMARY_TABLES_ENABLED:
+        return _class_overview_from_summaries(date_from, date_to)
     conn = get_connection()
     try:
+        source = attendance_partitions.history_source(conn, date_from)
         cur = conn.cursor()
         date_clause = ""
         params = []
@@ -206,8 +263,8 @@ def fetch_class_overview(date_from=None, date_to=None):
 
         q = f"""
             SELECT c.class_id, c.class_name,
-              (SELECT COUNT(DISTINCT a.date) FROM attendance a WHERE a.class_id = c.class_id {date_clause}) AS total_sessions,
-              (SELECT COUNT(*) FROM attendance a WHERE a.class_id = c.class_id {date_clause}) AS total_attendances
+              (SELECT COUNT(DISTINCT a.date) FROM {source} a WHERE a.class_id = c.class_id {date_clause}) AS total_sessions,
+              (SELECT COUNT(*) FROM {source} a WHERE a.class_id = c.class_id {date_clause}) AS total_attendances
             FROM classes c
             ORDER BY c.class_name
         """
@@ -220,94 +277,156 @@ def fetch_class_overview(date_from=None, date_to=None):
         cur2.execute("SELECT COUNT(*) FROM students")
         total_students = cur2.fetchone()[0] or 0
 
-        overview = []
-        for class_id, class_name, total_sessions, total_attendances in rows:
-            ts = int(total_sessions or 0)
-            ta = int(total_attendances or 0)
-            avg_pct = round((ta / (total_students * ts) * 100) if (ts > 0 and total_students > 0) else 0.0, 1)
-            overview.append((class_id, class_name, ts, ta, avg_pct))
-        return overview
+        return _overview_rows(rows, total_students)
+    finally:
+        conn.close()
+
+
+def _class_overview_from_summaries(date_from=None, date_to=None):
+    """Same overview from class_sessions: one row per class and day instead of one per mark."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        date_clause = ""
+        params = []
+        if date_from:
+            date_clause += " AND cs.date >= %s"
+            params.append(date_from)
+        if date_to:
+            date_clause += " AND cs.date <= %s"
+            params.append(date_to)
+
+        cur.execute(f"""
+            SELECT c.class_id, c.class_name, COUNT(cs.date) AS total_sessions,
+              COALESCE(SUM(cs.attendees), 0) AS total_attendances
+            FROM classes c
+            LEFT JOIN class_sessions cs ON cs.class_id = c.class_id {date_clause}
+            GROUP BY c.class_id, c.class_name
+            ORDER BY c.class_name
+        """, params)
+        rows = cur.fetchall()
+
+        cur.execute("SELECT COUNT(*) FROM students")
+        total_students = cur.fetchone()[0] or 0
+
+        return _overview_rows(rows, total_students)
     finally:
         conn.close()
 
 
 def fetch_student_attendance(selected_class_id=None, date_from=None, date_to=None):
+    return query_cache.get_or_compute(('student_attendance', selected_class_id, date_from, date_to),
+                                      (selected_class_id, date_from, date_to),
+                                      lambda: _fetch_student_attendance(selected_class_id, date_from, date_to))
+
+
+def _fetch_student_attendance(selected_class_id=None, date_from=None, date_to=None):
     """Return list of dicts: roll_no, name, attended_sessions, total_sessions, percentage."""
     conn = get_connection()
     try:
-        cur = conn.cursor(dictionary=True)
+        return list(iter_student_attendance(conn, selected_class_id, date_from, date_to))
+    finally:
+        conn.close()
 
-        # total_sessions (denominator)
-        if selected_class_id:
-            q_sessions = "SELECT COUNT(DISTINCT date) AS total_sessions FROM attendance WHERE class_id = %s"
-            params = [selected_class_id]
-            if date_from:
-                q_sessions += " AND date >= %s"
-                params.append(date_from)
-            if date_to:
-                q_sessions += " AND date <= %s"
-                params.append(date_to)
-            cur.execute(q_sessions, params)
-            total_sessions = cur.fetchone()['total_sessions'] or 0
-        else:
-            q_sessions = "SELECT COUNT(DISTINCT class_id, date) AS total_sessions FROM attendance WHERE 1=1"
-            params = []
-            if date_from:
-                q_sessions += " AND date >= %s"
-                params.append(date_from)
-            if date_to:
-                q_sessions += " AND date <= %s"
-                params.append(date_to)
-            cur.execute(q_sessions, params)
-            total_sessions = cur.fetchone()['total_sessions'] or 0
-
-        # student attendance
+
+def iter_student_attendance(conn, selected_class_id=None, date_from=None, date_to=None):
+    """Yield the per-student dicts of fetch_student_attendance as rows arrive (unbuffered cursor)."""
+    source = attendance_partitions.history_source(conn, date_from)
+    cur = conn.cursor(dictionary=True)
+
+    # total_sessions (denominator)
+    if SUMMARY_TABLES_ENABLED:
+        # class_sessions has one row per (class, day) that had attendance
+        q_sessions = "SELECT COUNT(*) AS total_sessions FROM class_sessions WHERE 1=1"
+        params = []
         if selected_class_id:
-            q = """
-                SELECT s.roll_no, s.name, COUNT(DISTINCT a.date) AS attended_sessions
-                FROM students s
-                LEFT JOIN attendance a
-                  ON s.roll_no = a.roll_no AND a.class_id = %s
-            """
-            params = [selected_class_id]
-        else:
-            q = """
-                SELECT s.roll_no, s.name, COUNT(DISTINCT a.class_id, a.date) AS attended_sessions
-                FROM students s
-                LEFT JOIN attendance a
-                  ON s.roll_no = a.roll_no
-            """
-            params = []
-
-        # date filters in JOIN
-        date_filters_on = ""
+            q_sessions += " AND class_id = %s"
+            params.append(selected_class_id)
         if date_from:
-            date_filters_on += " AND a.date >= %s"
+            q_sessions += " AND date >= %s"
             params.append(date_from)
         if date_to:
-            date_filters_on += " AND a.date <= %s"
+            q_sessions += " AND date <= %s"
             params.append(date_to)
+        cur.execute(q_sessions, params)
+        total_sessions = cur.fetchone()['total_sessions'] or 0
+    elif selected_class_id:
+        q_sessions = f"SELECT COUNT(DISTINCT date) AS total_sessions FROM {source} a WHERE class_id = %s"
+        params = [selected_class_id]
+        if date_from:
+            q_sessions += " AND date >= %s"
+            params.append(date_from)
+        if date_to:
+            q_sessions += " AND date <= %s"
+            params.append(date_to)
+        cur.execute(q_sessions, params)
+        total_sessions = cur.fetchone()['total_sessions'] or 0
+    else:
+        q_sessions = f"SELECT COUNT(DISTINCT class_id, date) AS total_sessions FROM {source} a WHERE 1=1"
+        params = []
+        if date_from:
+            q_sessions += " AND date >= %s"
+            params.append(date_from)
+        if date_to:
+            q_sessions += " AND date <= %s"
+            params.append(date_to)
+        cur.execute(q_sessions, params)
+        total_sessions = cur.fetchone()['total_sessions'] or 0
 
-        q = q.replace("ON s.roll_no = a.roll_no", "ON s.roll_no = a.roll_no " + date_filters_on)
-        q += " GROUP BY s.roll_no, s.name ORDER BY s.roll_no"
-        cur.execute(q, params)
-        rows = cur.fetchall()
+    # student attendance
+    if SUMMARY_TABLES_ENABLED and not (date_from or date_to):
+        # All-time counts are kept per student and class; date ranges still need the scan below
+        q = """
+            SELECT s.roll_no, s.name, COALESCE(SUM(sc.attended), 0) AS attended_sessions
+            FROM students s
+            LEFT JOIN student_class_counts sc
+              ON s.roll_no = sc.roll_no
+        """
+        params = []
+        if selected_class_id:
+            q += " AND sc.class_id = %s"
+            params.append(selected_class_id)
+    elif selected_class_id:
+        q = f"""
+            SELECT s.roll_no, s.name, COUNT(DISTINCT a.date) AS attended_sessions
+            FROM students s
+            LEFT JOIN {source} a
+              ON s.roll_no = a.roll_no AND a.class_id = %s
+        """
+        params = [selected_class_id]
+    else:
+        q = f"""
+            SELECT s.roll_no, s.name, COUNT(DISTINCT a.class_id, a.date) AS attended_sessions
+            FROM students s
+            LEFT JOIN {source} a
+              ON s.roll_no = a.roll_no
+        """
+        params = []
 
-        result = []
-        for r in rows:
-            attended = int(r['attended_sessions'] or 0)
-            total = int(total_sessions or 0)
-            pct = round((attended / total * 100) if total > 0 else 0.0, 1)
-            result.append({
-                'roll_no': r['roll_no'],
-                'name': r['name'],
-                'attended': attended,
-                'total_sessions': total,
-                'percentage': pct
-            })
-        return result
-    finally:
-        conn.close()
+    # date filters in JOIN
+    date_filters_on = ""
+    if date_from:
+        date_filters_on += " AND a.date >= %s"
+        params.append(date_from)
+    if date_to:
+        date_filters_on += " AND a.date <= %s"
+        params.append(date_to)
+
+    q += date_filters_on  # still inside the ON clause, after the class_id placeholder
+    q += " GROUP BY s.roll_no, s.name ORDER BY s.roll_no"
+    cur.execute(q, params)
+
+    total = int(total_sessions or 0)
+    for r in cur:
+        attended = int(r['attended_sessions'] or 0)
+        pct = round((attended / total * 100) if total > 0 else 0.0, 1)
+        yield {
+            'roll_no': r['roll_no'],
+            'name': r['name'],
+            'attended': attended,
+            'total_sessions': total,
+            'percentage': pct
+        }
 
 
 def json_serial(obj):
@@ -346,25 +465,24 @@ def view():
     date_from = request.form.get("date_from") or None
     date_to = request.form.get("date_to") or None
 
-    # date validation
-    for d in (date_from, date_to):
-        if d:
-            try:
-                datetime.strptime(d, "%Y-%m-%d")
-            except ValueError:
-                return render_template(
-                    "index.html",
-                    classes=classes,
-                    selected_class=selected_class,
-                    selected_date_from=date_from or "",
-                    selected_date_to=date_to or "",
-                    total_students=count_total_students(),
-                    total_classes=len(classes),
-                    total_records=count_total_records(),
-                    class_overview=fetch_class_overview(),
-                    student_attendance=[],
-                    message="Invalid date format. Use YYYY-MM-DD."
-                )
+    # date validation; normalized to zero-padded ISO dates (query cache keys and scopes compare strings)
+    try:
+        date_from, date_to = (datetime.strptime(d, "%Y-%m-%d").date().isoformat() if d else None
+                              for d in (date_from, date_to))
+    except ValueError:
+        return render_template(
+            "index.html",
+            classes=classes,
+            selected_class=selected_class,
+            selected_date_from=date_from or "",
+            selected_date_to=date_to or "",
+            total_students=count_total_students(),
+            total_classes=len(classes),
+            total_records=count_total_records(),
+            class_overview=fetch_class_overview(),
+            student_attendance=[],
+            message="Invalid date format. Use YYYY-MM-DD."
+        )
 
     selected_class_id = int(selected_class) if selected_class and selected_class.isdigit() else None
 
@@ -384,25 +502,153 @@ def view():
     )
 
 
+# --- Streaming exports ---
+
+# Exports run on their own connections so a long download never holds a dashboard pool slot
+export_slots = eventlet.semaphore.Semaphore(EXPORT_MAX_CONCURRENT)
+
+
+def export_connection():
+    """Dedicated connection for one export. A slow client makes MySQL wait on its writes, so the
+    server-side write timeout is raised to keep the result stream open."""
+    conn = mysql.connector.connect(**MYSQL_CONFIG)
+    cur = conn.cursor()
+    cur.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT_SEC,))
+    cur.close()
+    return conn
+
+
+def csv_chunks(header, rows, chunk_bytes=EXPORT_CHUNK_BYTES):
+    """Encode rows as CSV, yielding ~chunk_bytes of UTF-8 at a time."""
+    buf = io.StringIO()
+    cw = csv.writer(buf)
+    cw.writerow(header)
+    for row in rows:
+        cw.writerow(row)
+        if buf.tell() >= chunk_bytes:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def stream_export(filename, mimetype, chunks_for):
+    """Stream chunks_for(conn)'s bytes as a download. The connection and export slot are released
+    when the response closes, whether the download finished or the client went away."""
+    if not export_slots.acquire(blocking=False):
+        return jsonify(status="error", message="Too many exports running, please retry."), 503, {'Retry-After': '5'}
+    try:
+        conn = export_connection()
+    except mysql.connector.Error:
+        export_slots.release()
+        raise
+
+    def release():
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+        export_slots.release()
+
+    response = Response(chunks_for(conn), mimetype=mimetype,
+                        headers={"Content-Disposition": f"attachment; filename={filename}"})
+    response.call_on_close(release)
+    return response
+
+
+def stream_csv(filename, header, produce):
+    """Stream produce(conn)'s rows as a CSV download (see stream_export)."""
+    return stream_export(filename, "text/csv", lambda conn: csv_chunks(header, produce(conn)))
+
+
+def fetch_class_names(cur):
+    cur.execute("SELECT class_id, class_name FROM classes")
+    return dict(cur.fetchall())
+
+
+def execute_records_query(cur, class_id=None, date_from=None, date_to=None, source="attendance"):
+    """Run the per-record export query: (roll_no, name, class_id, date, time) rows in
+    (date, roll_no, class_id) order. source comes from attendance_partitions.history_source().
+
+    That order is the one idx_date (and idx_class_date_roll for one class) already stores, so MySQL
+    sends rows as it reads them instead of sorting the whole range first. Ranges that reach
+    archived months are sorted.
+    """
+    q = f"SELECT roll_no, name, class_id, date, time FROM {source} a WHERE 1=1"
+    params = []
+    if class_id:
+        q += " AND class_id = %s"
+        params.append(class_id)
+    if date_from:
+        q += " AND date >= %s"
+        params.append(date_from)
+    if date_to:
+        q += " AND date <= %s"
+        params.append(date_to)
+    q += " ORDER BY date, roll_no, class_id"
+    cur.execute(q, params)
+
+
+def iter_attendance_records(conn, class_id=None, date_from=None, date_to=None):
+    """Every attendance row in the range as CSV rows, with the class name added."""
+    source = attendance_partitions.history_source(conn, date_from)
+    cur = conn.cursor()
+    class_names = fetch_class_names(cur)
+    execute_records_query(cur, class_id, date_from, date_to, source)
+    while True:
+        rows = cur.fetchmany(EXPORT_FETCH_ROWS)
+        if not rows:
+            break
+        for roll_no, name, cid, day, t in rows:
+            yield roll_no, name, cid, class_names.get(cid, ""), day, json_serial(t) if t is not None else ""
+
+
 @app.route("/export_csv", methods=["GET"])
 def export_csv():
+    """Per-student summary (default) or, with mode=records, every attendance row in the range."""
+    class_id = request.args.get("class_id")
+    date_from = request.args.get("date_from") or None
+    date_to = request.args.get("date_to") or None
+    selected_class_id = int(class_id) if class_id and class_id.isdigit() else None
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if request.args.get("mode") == "records":
+        return stream_csv(
+            f"attendance_records_{stamp}.csv",
+            ["Roll No", "Name", "Class ID", "Class", "Date", "Time"],
+            lambda conn: iter_attendance_records(conn, selected_class_id, date_from, date_to))
+
+    return stream_csv(
+        f"attendance_export_{stamp}.csv",
+        ["Roll No", "Name", "Attended", "Sessions", "Percentage"],
+        lambda conn: ([r['roll_no'], r['name'], r['attended'], r['total_sessions'], r['percentage']]
+                      for r in iter_student_attendance(conn, selected_class_id, date_from, date_to)))
+
+
+@app.route("/export_columnar", methods=["GET"])
+def export_columnar():
+    """Every attendance row (same filters as /export_csv) as Parquet (default) or, with
+    format=arrow, an Arrow IPC stream. Needs the optional pyarrow package."""
+    if not columnar_export.available():
+        return jsonify(status="error", message="Columnar export needs pyarrow: pip install pyarrow"), 501
+    fmt = request.args.get("format", "parquet")
+    if fmt not in columnar_export.FORMATS:
+        return jsonify(status="error", message=f"format must be one of {sorted(columnar_export.FORMATS)}"), 400
     class_id = request.args.get("class_id")
     date_from = request.args.get("date_from") or None
     date_to = request.args.get("date_to") or None
     selected_class_id = int(class_id) if class_id and class_id.isdigit() else None
+    extension, mimetype = columnar_export.FORMATS[fmt]
 
-    rows = fetch_student_attendance(selected_class_id=selected_class_id, date_from=date_from, date_to=date_to)
+    def chunks_for(conn):
+        source = attendance_partitions.history_source(conn, date_from)
+        cur = conn.cursor()
+        class_names = fetch_class_names(cur)
+        execute_records_query(cur, selected_class_id, date_from, date_to, source)
+        yield from columnar_export.stream_batches(columnar_export.iter_batches(cur, class_names), fmt)
 
-    si = io.StringIO()
-    cw = csv.writer(si)
-    cw.writerow(["Roll No", "Name", "Attended", "Sessions", "Percentage"])
-    for r in rows:
-        cw.writerow([r['roll_no'], r['name'], r['attended'], r['total_sessions'], r['percentage']])
-    mem = io.BytesIO()
-    mem.write(si.getvalue().encode("utf-8"))
-    mem.seek(0)
-    filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    return send_file(mem, mimetype="text/csv", as_attachment=True, download_name=filename)
+    filename = f"attendance_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return stream_export(filename, mimetype, chunks_for)
 
 
 @app.route("/student/<roll_no>/attendance", methods=["GET"])
@@ -411,10 +657,11 @@ def student_detail(roll_no):
     date_to = request.args.get("date_to") or None
     conn = get_connection()
     try:
+        source = attendance_partitions.history_source(conn, date_from)
         cur = conn.cursor(dictionary=True)
-        q = """
+        q = f"""
             SELECT a.date, a.time, c.class_name
-            FROM attendance a
+            FROM {source} a
             JOIN classes c ON a.class_id = c.class_id
             WHERE a.roll_no = %s
         """
@@ -444,8 +691,9 @@ def class_trend(class_id):
     date_to = request.args.get("date_to") or None
     conn = get_connection()
     try:
+        source = attendance_partitions.history_source(conn, date_from)
         cur = conn.cursor()
-        q = "SELECT date, COUNT(DISTINCT roll_no) as count FROM attendance WHERE class_id = %s"
+        q = f"SELECT date, COUNT(DISTINCT roll_no) as count FROM {source} a WHERE class_id = %s"
         params = [class_id]
         if date_from:
             q += " AND date >= %s";
@@ -466,6 +714,23 @@ def class_trend(class_id):
         conn.close()
 
 
+@app.errorhandler(PoolExhausted)
+def pool_exhausted(e):
+    """All pooled connections stayed busy: shed the request instead of queueing it indefinitely."""
+    logging.warning(f" [DB POOL] {e}")
+    return jsonify(status="error", message="Dashboard is busy, please retry."), 503, {'Retry-After': '1'}
+
+
+@app.route("/metrics/db_pool", methods=["GET"])
+def db_pool_metrics():
+    return jsonify(db_pool.stats() if db_pool is not None else {'enabled': False})
+
+
+@app.route("/metrics/query_cache", methods=["GET"])
+def query_cache_metrics():
+    return jsonify(query_cache.stats())
+
+
 # --- Main Run Block ---
 if __name__ == "__main__":
     host = os.getenv("HOST", "127.0.0.1")
@@ -0,0 +1,260 @@
+"""
+attendance_dispatcher.py
+Background delivery of attendance marks to the Producer Service.
+
+The recognition loop only calls enqueue(), which appends to an in-memory
+deque (constant time). A dispatcher thread then:
+  1. drains the deque into a local SQLite outbox in one transaction, so
+     marks survive producer outages and process restarts;
+  2. sends due outbox rows over a pooled keep-alive HTTP session, as one
+     batch request when the producer has the batch endpoint, and deletes
+     them once the producer has accepted them;
+  3. on connection errors, backs off exponentially and replays the outbox
+     once the producer is reachable again.
+If the loop itself fails (e.g. the outbox file cannot be written), it is
+logged and restarted with the same backoff, so queued marks are not left
+growing in memory behind a dead thread.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    PRODUCER_API_URL, PRODUCER_BATCH_API_URL, OUTBOX_PATH, DISPATCH_BATCH_SIZE, DISPATCH_LINGER_MS,
+    DISPATCH_TIMEOUT_SEC, DISPATCH_BACKOFF_BASE_SEC, DISPATCH_BACKOFF_MAX_SEC
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    roll_no TEXT NOT NULL,
+    class_id INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class AttendanceDispatcher(threading.Thread):
+    """Durable, non-blocking sender for attendance marks."""
+
+    def __init__(self, url=PRODUCER_API_URL, batch_url=PRODUCER_BATCH_API_URL, outbox_path=OUTBOX_PATH,
+                 batch_size=DISPATCH_BATCH_SIZE, on_result=None):
+        super().__init__(name="attendance-dispatcher", daemon=True)
+        self.url = url
+        self.batch_url = batch_url or None
+        self.outbox_path = outbox_path
+        self.batch_size = batch_size
+        # Optional callable(roll_no, class_id, ok: bool, message: str), called from this thread
+        self.on_result = on_result
+
+        self._pending = deque()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._retry_at = 0.0
+        self._failures = 0
+        self.sent = 0
+        self.backlog = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    # --- Called from the recognition loop ---
+
+    def enqueue(self, roll_no, class_id, timestamp=None):
+        """Queue a mark for delivery. Never blocks on disk or network."""
+        ts = (timestamp or datetime.now()).isoformat()
+        self._pending.append((str(roll_no), int(class_id), ts))
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        """Persist anything still in memory, try one last delivery, and stop the thread."""
+        self._stop_event.set()
+        self._wake.set()
+        self.join(timeout)
+
+    # --- Dispatcher thread ---
+
+    def _open_outbox(self):
+        os.makedirs(os.path.dirname(self.outbox_path) or '.', exist_ok=True)
+        db = sqlite3.connect(self.outbox_path, timeout=5.0)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(_SCHEMA)
+        db.commit()
+        return db
+
+    def _persist_pending(self, db):
+        # Only drop marks from memory once they are committed, so a failed write loses nothing
+        rows = list(self._pending)
+        if rows:
+            with db:
+                db.executemany("INSERT INTO outbox (roll_no, class_id, timestamp) VALUES (?, ?, ?)", rows)
+            for _ in rows:
+                self._pending.popleft()
+        return len(rows)
+
+    def _due_rows(self, db):
+        return db.execute("SELECT id, roll_no, class_id, timestamp FROM outbox ORDER BY id LIMIT ?",
+                          (self.batch_size,)).fetchall()
+
+    def _post(self, roll_no, class_id, timestamp):
+        """Returns 'ok', 'rejected' (permanent, drop it) or 'retry'."""
+        try:
+            resp = self.session.post(self.url, json={'roll_no': roll_no, 'class_id': class_id,
+                                                     'timestamp': timestamp},
+                                     timeout=DISPATCH_TIMEOUT_SEC)
+        except requests.exceptions.RequestException as e:
+            logging.error("❌ Failed to connect to Producer API: %s", e)
+            return 'retry', "API OFFLINE"
+        if resp.status_code == 200:
+            return 'ok', "ALREADY MARKED"  # duplicate dropped by the producer
+        if resp.status_code == 202:
+            return 'ok', "QUEUED"
+        if 400 <= resp.status_code < 500:
+            logging.warning("⚠️ Producer rejected mark for %s: %s", roll_no, resp.text)
+            return 'rejected', f"QUEUE ERROR: {resp.status_code}"
+        logging.warning("⚠️ Queue API responded unexpectedly: %s", resp.text)
+        return 'retry', f"QUEUE ERROR: {resp.status_code}"
+
+    def _post_batch(self, rows):
+        """Returns one (status, message) per row, or None if the producer has no batch endpoint."""
+        marks = [{'roll_no': roll_no, 'class_id': class_id, 'timestamp': ts} for _, roll_no, class_id, ts in rows]
+        try:
+            resp = self.session.post(self.batch_url, json={'marks': marks}, timeout=DISPATCH_TIMEOUT_SEC)
+        except requests.exceptions.RequestException as e:
+            logging.error("❌ Failed to connect to Producer API: %s", e)
+            return [('retry', "API OFFLINE")] * len(rows)
+        if resp.status_code in (404, 405):
+            return None
+        try:
+            results = resp.json()['results'] if resp.status_code in (202, 207) else None
+        except (ValueError, KeyError):
+            results = None
+        if results is None or len(results) != len(rows):
+            logging.warning("⚠️ Queue API responded unexpectedly: %s", resp.text)
+            return [('retry', f"QUEUE ERROR: {resp.status_code}")] * len(rows)
+
+        outcomes = []
+        for (_, roll_no, _, _), result in zip(rows, results):
+            if result.get('status') == 'queued':
+                outcomes.append(('ok', "QUEUED"))
+            elif result.get('status') == 'duplicate':
+                outcomes.append(('ok', "ALREADY MARKED"))
+            elif result.get('status') == 'invalid':
+                logging.warning("⚠️ Producer rejected mark for %s: %s", roll_no, result.get('message'))
+                outcomes.append(('rejected', "QUEUE ERROR: invalid mark"))
+            else:
+                outcomes.append(('retry', "QUEUE ERROR: queueing failed"))
+        return outcomes
+
+    def _send(self, rows):
+        """Deliver rows; returns a (status, message) per row attempted, in order."""
+        if self.batch_url:
+            outcomes = self._post_batch(rows)
+            if outcomes is not None:
+                return outcomes
+            logging.warning("Producer has no batch endpoint at %s; sending marks one by one", self.batch_url)
+            self.batch_url = None
+
+        outcomes = []
+        for _, roll_no, class_id, ts in rows:
+            outcomes.append(self._post(roll_no, class_id, ts))
+            if outcomes[-1][0] == 'retry':
+                break
+        return outcomes
+
+    def _notify(self, roll_no, class_id, ok, message):
+        if self.on_result is not None:
+            try:
+                self.on_result(roll_no, class_id, ok, message)
+            except Exception:
+                logging.exception("Attendance dispatcher result callback failed")
+
+    def _deliver(self, db):
+        """Send due outbox rows in order; stops after a round with a transient failure."""
+        while True:
+            rows = self._due_rows(db)
+            if not rows:
+                self.backlog = 0
+                return
+            done, failed = [], []
+            for (row_id, roll_no, class_id, ts), (status, message) in zip(rows, self._send(rows)):
+                if status == 'retry':
+                    failed.append(row_id)
+                    self._notify(roll_no, class_id, False, message)
+                    continue
+                done.append((row_id,))
+                if status == 'ok':
+                    self.sent += 1
+                    logging.info("✅ Attendance sent to queue for %s (class %s)", roll_no, class_id)
+                self._notify(roll_no, class_id, status == 'ok', message)
+            with db:
+                db.executemany("DELETE FROM outbox WHERE id = ?", done)
+                db.executemany("UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", [(i,) for i in failed])
+            self.backlog = db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            if failed:
+                self._failures += 1
+                delay = min(DISPATCH_BACKOFF_MAX_SEC, DISPATCH_BACKOFF_BASE_SEC * 2 ** (self._failures - 1))
+                self._retry_at = time.time() + delay
+                logging.warning("Producer unreachable; %d mark(s) kept in outbox, retrying in %.0fs",
+                                self.backlog, delay)
+                return
+            self._failures = 0
+
+    def run(self):
+        crashes = 0
+        try:
+            while True:
+                try:
+                    self._serve()
+                    return
+                except Exception:
+                    crashes += 1
+                    delay = min(DISPATCH_BACKOFF_MAX_SEC, DISPATCH_BACKOFF_BASE_SEC * 2 ** (crashes - 1))
+                    logging.exception("Attendance dispatcher crashed with %d mark(s) in memory; restarting in %.0fs "
+                                      "(unsent marks remain in %s)", len(self._pending), delay, self.outbox_path)
+                if self._stop_event.is_set():
+                    if self._pending:
+                        logging.error("Attendance dispatcher stopped; %d mark(s) in memory were not saved",
+                                      len(self._pending))
+                    return
+                # A stop() during the backoff still gets one more pass to persist pending marks
+                self._stop_event.wait(delay)
+        finally:
+            self.session.close()
+
+    def _serve(self):
+        """Dispatch loop; returns once stop() was requested, raises if the outbox fails."""
+        db = self._open_outbox()
+        try:
+            self.backlog = db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            if self.backlog:
+                logging.info("Replaying %d attendance mark(s) from outbox %s", self.backlog, self.outbox_path)
+            if self._pending:
+                self._wake.set()  # marks queued while restarting
+            while True:
+                wait = max(0.0, self._retry_at - time.time()) if self.backlog else None
+                self._wake.wait(wait)
+                self._wake.clear()
+                stopping = self._stop_event.is_set()
+                if self._pending and not stopping:
+                    # Linger briefly so marks from the same moment go out together
+                    time.sleep(DISPATCH_LINGER_MS / 1000.0)
+                self._persist_pending(db)
+                if stopping or time.time() >= self._retry_at:
+                    self._deliver(db)
+                if stopping:
+                    break
+        finally:
+            db.close()
@@ -0,0 +1,284 @@
+"""
+attendance_partitions.py
+Optional monthly range partitioning of the attendance table, plus cold archival.
+
+    python attendance_partitions.py enable     # partition attendance by month (one-off)
+    python attendance_partitions.py maintain   # add future months, archive old ones (run daily)
+    python attendance_partitions.py status
+
+Each partition pYYYYMM holds one month of attendance, and pmax catches
+anything beyond the last month created. Queries that filter on
+date_from/date_to (class_trend, student details, date-filtered reports) only
+read the partitions in that range.
+
+enable rebuilds the table once, so run it in a quiet period. MySQL does not
+allow foreign keys on partitioned tables, so the two FOREIGN KEYs on
+attendance are dropped first. The primary key (roll_no, date, class_id)
+already contains the partitioning column.
+
+maintain keeps ATTENDANCE_PARTITION_MONTHS_AHEAD months of empty partitions
+ready by splitting the empty pmax, which is instant. Partitions older than
+ATTENDANCE_RETENTION_MONTHS are archived and then dropped, also instantly.
+There are two archive modes:
+- 'table': rows are copied into attendance_archive (ROW_FORMAT=COMPRESSED).
+- 'file': rows are written to <ATTENDANCE_ARCHIVE_DIR>/attendance_pYYYYMM.csv.gz.
+A partition is dropped only after the archive is checked to hold every row.
+The summary tables keep counting archived history. summary_tables.py rebuild
+includes attendance_archive, but not file archives.
+
+The dashboard reads the same history as the summaries: history_source() is
+attendance plus attendance_archive whenever a query's date range starts
+before the oldest live month. Months archived to files are no longer
+queryable.
+"""
+
+import os
+import io
+import sys
+import csv
+import gzip
+import time
+from datetime import date
+
+import mysql.connector
+
+from config import (
+    MYSQL_CONFIG, ATTENDANCE_PARTITION_MONTHS_AHEAD, ATTENDANCE_RETENTION_MONTHS, ATTENDANCE_ARCHIVE_MODE,
+    ATTENDANCE_ARCHIVE_DIR, ATTENDANCE_ARCHIVE_CHECK_SEC
+)
+
+ARCHIVE_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS attendance_archive (
+        roll_no VARCHAR(20),
+        name VARCHAR(100),
+        class_id INT,
+        time TIME,
+        date DATE,
+        PRIMARY KEY (roll_no, date, class_id)
+    ) ROW_FORMAT=COMPRESSED
+"""
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(bound):
+    """Name of the partition whose rows are all < bound (the first day of the next month)."""
+    month = add_months(bound, -1)
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def partition_clause(bound):
+    return f"PARTITION {partition_name(bound)} VALUES LESS THAN ('{bound.isoformat()}')"
+
+
+def partitions(cursor):
+    """[(name, upper bound date or None for MAXVALUE)] in order; empty if the table is not partitioned."""
+    cursor.execute("""
+        SELECT partition_name, partition_description FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'attendance' AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+    """)
+    result = []
+    for name, description in cursor.fetchall():
+        bound = description.strip("'")
+        result.append((name, None if bound == 'MAXVALUE' else date.fromisoformat(bound)))
+    return result
+
+
+def archive_table_exists(cursor):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = 'attendance_archive'
+    """)
+    return bool(cursor.fetchall())
+
+
+def archive_boundary(cursor):
+    """First day of the oldest month still in attendance, if attendance_archive holds the months
+    before it; None when there is no archive table.
+
+    Rows dated before the boundary are read from the archive. Rows of the month being archived
+    right now are in both tables for a moment and are read from attendance only.
+    """
+    if not archive_table_exists(cursor):
+        return None
+    bounds = [b for _, b in partitions(cursor) if b is not None]
+    return add_months(bounds[0], -1) if bounds else date.max
+
+
+_boundary_cache = (0.0, None)
+
+
+def history_source(conn, date_from=None):
+    """Table expression for attendance history from date_from (None = all time), to use as
+    "FROM {source} a". Plain attendance unless the range reaches archived months.
+
+    The archive boundary is looked up at most every ATTENDANCE_ARCHIVE_CHECK_SEC seconds;
+    maintain moves it once a month.
+    """
+    global _boundary_cache
+    checked_at, boundary = _boundary_cache
+    if time.monotonic() - checked_at > ATTENDANCE_ARCHIVE_CHECK_SEC:
+        cursor = conn.cursor()
+        try:
+            boundary = archive_boundary(cursor)
+        finally:
+            cursor.close()
+        _boundary_cache = (time.monotonic(), boundary)
+    if boundary is None:
+        return "attendance"
+    if date_from:
+        try:
+            if date.fromisoformat(str(date_from)) >= boundary:
+                return "attendance"
+        except ValueError:
+            pass  # unparseable: let MySQL compare it against both tables
+    return ("(SELECT roll_no, name, class_id, time, date FROM attendance UNION ALL "
+            "SELECT roll_no, name, class_id, time, date FROM attendance_archive "
+            f"WHERE date < '{boundary.isoformat()}')")
+
+
+def enable(conn, months_ahead=ATTENDANCE_PARTITION_MONTHS_AHEAD):
+    cursor = conn.cursor()
+    if partitions(cursor):
+        print("attendance is already partitioned.")
+        return
+    cursor.execute("SELECT MIN(date) FROM attendance")
+    first = cursor.fetchone()[0] or date.today()
+    cursor.execute("""
+        SELECT constraint_name FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE() AND table_name = 'attendance'
+    """)
+    for (constraint,) in cursor.fetchall():
+        print(f" → Dropping foreign key {constraint} (not supported on partitioned tables)")
+        cursor.execute(f"ALTER TABLE attendance DROP FOREIGN KEY {constraint}")
+
+    bounds = []
+    bound = add_months(month_start(first), 1)
+    last = add_months(month_start(date.today()), months_ahead + 1)
+    while bound <= last:
+        bounds.append(bound)
+        bound = add_months(bound, 1)
+    print(f" → Partitioning attendance into {len(bounds)} monthly partitions (rebuilds the table)...")
+    cursor.execute("ALTER TABLE attendance PARTITION BY RANGE COLUMNS(date) ("
+                   + ", ".join(partition_clause(b) for b in bounds)
+                   + ", PARTITION pmax VALUES LESS THAN (MAXVALUE))")
+    print("✅ attendance partitioned by month.")
+
+
+def add_future_partitions(cursor, parts, months_ahead):
+    bounds = [b for _, b in parts if b is not None]
+    target = add_months(month_start(date.today()), months_ahead + 1)
+    new = []
+    bound = add_months(max(bounds), 1) if bounds else add_months(month_start(date.today()), 1)
+    while bound <= target:
+        new.append(bound)
+        bound = add_months(bound, 1)
+    if not new:
+        return 0
+    # pmax is empty as long as maintain runs ahead of the calendar, so this split moves no rows
+    cursor.execute("ALTER TABLE attendance REORGANIZE PARTITION pmax INTO ("
+                   + ", ".join(partition_clause(b) for b in new)
+                   + ", PARTITION pmax VALUES LESS THAN (MAXVALUE))")
+    print(f" → Added partitions {partition_name(new[0])}..{partition_name(new[-1])}")
+    return len(new)
+
+
+def archive_to_table(conn, name):
+    cursor = conn.cursor()
+    cursor.execute(ARCHIVE_TABLE_DDL)
+    # INSERT IGNORE: rows already copied by an interrupted earlier run are skipped
+    cursor.execute(f"INSERT IGNORE INTO attendance_archive (roll_no, name, class_id, time, date) "
+                   f"SELECT roll_no, name, class_id, time, date FROM attendance PARTITION ({name})")
+    conn.commit()
+    cursor.execute(f"SELECT COUNT(*) FROM attendance PARTITION ({name})")
+    total = cursor.fetchone()[0]
+    cursor.execute(f"SELECT COUNT(*) FROM attendance PARTITION ({name}) a "
+                   f"JOIN attendance_archive x USING (roll_no, date, class_id)")
+    return total, cursor.fetchone()[0]
+
+
+def archive_to_file(conn, name, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"attendance_{name}.csv.gz")
+    tmp_path = path + ".tmp"
+    cursor = conn.cursor()  # unbuffered: rows stream to the file instead of piling up in memory
+    written = 0
+    with open(tmp_path, 'wb') as raw:
+        with io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode='wb'), encoding='utf-8', newline='') as out:
+            writer = csv.writer(out)
+            writer.writerow(["roll_no", "name", "class_id", "time", "date"])
+            cursor.execute(f"SELECT roll_no, name, class_id, time, date FROM attendance PARTITION ({name})")
+            for row in cursor:
+                writer.writerow(row)
+                written += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    cursor.close()
+    os.replace(tmp_path, path)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM attendance PARTITION ({name})")
+    total = cursor.fetchone()[0]
+    print(f"   Wrote {written} rows to {path}")
+    return total, written
+
+
+def maintain(conn, months_ahead=ATTENDANCE_PARTITION_MONTHS_AHEAD, retention_months=ATTENDANCE_RETENTION_MONTHS,
+             mode=ATTENDANCE_ARCHIVE_MODE, archive_dir=ATTENDANCE_ARCHIVE_DIR):
+    cursor = conn.cursor()
+    parts = partitions(cursor)
+    if not parts:
+        print("attendance is not partitioned; run 'python attendance_partitions.py enable' first.")
+        return
+    add_future_partitions(cursor, parts, months_ahead)
+    if retention_months <= 0:
+        return
+
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    old = [name for name, bound in parts if bound is not None and bound <= cutoff]
+    # Never drop the last bounded partition: it is the one holding anything older than the rest
+    for name in old[:len([b for _, b in parts if b is not None]) - 1]:
+        print(f" → Archiving {name} ({mode})")
+        if mode == 'file':
+            total, archived = archive_to_file(conn, name, archive_dir)
+        else:
+            total, archived = archive_to_table(conn, name)
+        if archived < total:
+            print(f" [!!!] {name}: only {archived}/{total} rows archived; partition kept.")
+            continue
+        cursor.execute(f"ALTER TABLE attendance DROP PARTITION {name}")
+        print(f"   Dropped {name} ({total} rows archived).")
+
+
+def print_status(conn):
+    cursor = conn.cursor()
+    parts = partitions(cursor)
+    if not parts:
+        print("attendance is not partitioned.")
+        return
+    cursor.execute("""
+        SELECT partition_name, table_rows, data_length + index_length FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'attendance'
+    """)
+    sizes = {name: (rows or 0, size or 0) for name, rows, size in cursor.fetchall()}
+    for name, bound in parts:
+        rows, size = sizes.get(name, (0, 0))
+        print(f"{name:8s} < {bound.isoformat() if bound else 'MAXVALUE':10s} ~{rows:>10} rows {size / 2**20:8.1f} MiB")
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command not in ('enable', 'maintain', 'status'):
+        raise SystemExit("Usage: python attendance_partitions.py enable|maintain|status")
+    connection = mysql.connector.connect(**MYSQL_CONFIG)
+    try:
+        {'enable': enable, 'maintain': maintain, 'status': print_status}[command](connection)
+    finally:
+        connection.close()
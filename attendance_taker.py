@@ -10,29 +10,33 @@ import os
 import pandas as pd
 import time
 import logging
-import datetime
-from collections import deque, defaultdict
-import requests # New import for API calls
+from collections import deque
 
 from config import (
-    CSV_PATH, FRAME_SIZE, CAMERA_INDEX,
-    MIN_CONSEC_MATCHES, REQUIRE_BLINK_BEFORE_MARK, BLINK_VALID_WINDOW_SEC
+    CSV_PATH, GALLERY_PATH, ANN_INDEX_PATH, FRAME_SIZE, CAMERA_INDEX,
+    REQUIRE_BLINK_BEFORE_MARK, BLINK_VALID_WINDOW_SEC, EAR_BLINK_THRESHOLD, EAR_CONSEC_FRAMES,
+    USE_PIPELINE, OUTBOX_PATH
 )
-from face_utils import detect_faces, compute_embedding, image_quality_ok, compare_distance
+from face_utils import detect_faces, compute_embeddings_batch, image_quality_ok, shape_for_rect
+from face_tracker import FaceTracker
+from capture_pipeline import CapturePipeline
+from attendance_dispatcher import AttendanceDispatcher
+from gallery import GalleryMatcher
+from ann_index import IVFIndex
+from embedding_store import EmbeddingStore
 from liveness import ear_from_shape  # safer EAR
-from db_config import get_connection
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- Configuration for Producer Service API ---
-# FIX: Changed invalid 127.0.0.0 to correct 127.0.0.1
-PRODUCER_API_URL = "http://127.0.0.1:5001/api/v1/log_attendance"
-# NOTE: Update 127.0.0.1 to your server's IP if running on separate machines
-
 
 class FaceRecognizer:
-    def __init__(self, class_id: int):
+    def __init__(self, class_id: int, matcher=None, show_window: bool = True, outbox_path: str = OUTBOX_PATH):
         self.class_id = int(class_id)
+        self.show_window = show_window
+        # Durable outbox of unsent marks; one file per recognizer process (see multi_camera.py)
+        self.outbox_path = outbox_path
+        # Optional callable(snapshot dict) receiving pipeline stats (see multi_camera.py)
+        self.stats_sink = None
         self.font = cv2.FONT_ITALIC
         self.frame_cnt = 0
 
@@ -40,9 +44,11 @@ class FaceRecognizer:
         self.face_features_known_list = []
         self.face_roll_no_known_list = []
         self.face_name_known_list = []
+        # A pre-built matcher (e.g. over a shared-memory gallery) skips get_face_database loading
+        self.matcher = matcher
 
-        # Matching & blink tracking
-        self.match_streaks = defaultdict(int)
+        # Face tracks (cached identities) & blink tracking
+        self.tracker = FaceTracker()
         self.last_blink_time = 0
         self.ear_queue = deque(maxlen=12)
         self.blinks_total = 0
@@ -50,6 +56,8 @@ class FaceRecognizer:
 
         # Prevent duplicate marks in a session
         self.marked_today = set()
+        # Background sender with durable outbox; started in process()
+        self.dispatcher = None
 
         # FPS calculation
         self.last_time = time.time()
@@ -60,9 +68,21 @@ class FaceRecognizer:
         self.last_mark_time = 0
 
     def get_face_database(self) -> bool:
-        """Load features from CSV_PATH into memory."""
+        """Map the binary gallery at GALLERY_PATH, falling back to parsing CSV_PATH."""
+        if self.matcher is not None:
+            return True
+        if os.path.exists(GALLERY_PATH):
+            try:
+                store = EmbeddingStore.open(GALLERY_PATH)
+                self._set_gallery(store.features, store.roll_nos, store.names, norms=store.norms)
+                logging.info("Mapped %d embeddings from %s", len(store), GALLERY_PATH)
+                return True
+            except Exception as e:
+                logging.exception("Error opening GALLERY_PATH: %s", e)
+                return False
+
         if not os.path.exists(CSV_PATH):
-            logging.warning("CSV_PATH does not exist: %s", CSV_PATH)
+            logging.warning("Neither GALLERY_PATH (%s) nor CSV_PATH (%s) exists", GALLERY_PATH, CSV_PATH)
             return False
         try:
             df = pd.read_csv(CSV_PATH)
@@ -70,22 +90,39 @@ class FaceRecognizer:
                 logging.warning("CSV missing Roll_No/Name columns: %s", CSV_PATH)
                 return False
 
-            self.face_roll_no_known_list = df['Roll_No'].astype(str).tolist()
-            self.face_name_known_list = df['Name'].astype(str).tolist()
             feats = df.drop(columns=['Roll_No', 'Name'])
-
-            if feats.empty:
-                logging.warning("Features CSV found but no embeddings present.")
-                self.face_features_known_list = []
-                return True
-
-            self.face_features_known_list = feats.values.astype(np.float32)
-            logging.info("Loaded %d embeddings from %s", len(self.face_features_known_list), CSV_PATH)
+            self._set_gallery(feats.values.astype(np.float32),
+                              df['Roll_No'].astype(str).tolist(),
+                              df['Name'].astype(str).tolist())
+            logging.info("Loaded %d embeddings from %s (run 'python embedding_store.py import' "
+                         "for faster startup)", len(self.face_roll_no_known_list), CSV_PATH)
             return True
         except Exception as e:
             logging.exception("Error reading CSV_PATH: %s", e)
             return False
 
+    def _set_gallery(self, features, roll_nos, names, norms=None):
+        self.face_features_known_list = features
+        self.face_roll_no_known_list = roll_nos
+        self.face_name_known_list = names
+        if len(roll_nos) == 0:
+            logging.warning("Face database found but no embeddings present.")
+            self.matcher = None
+            return
+        self.matcher = GalleryMatcher(features, roll_nos, names, norms=norms)
+        self._load_ann_index()
+
+    def _load_ann_index(self):
+        """Attach the approximate index built by features_extraction_to_csv.py, if present and current."""
+        if not os.path.exists(ANN_INDEX_PATH):
+            return
+        try:
+            index = IVFIndex.load(ANN_INDEX_PATH)
+            self.matcher.attach_index(index)
+            logging.info("Using IVF index %s (nlist=%d, nprobe=%d)", ANN_INDEX_PATH, index.nlist, index.nprobe)
+        except Exception as e:
+            logging.warning("Ignoring ANN index %s, falling back to exact search: %s", ANN_INDEX_PATH, e)
+
     def update_fps(self):
         now = time.time()
         dt = now - self.last_time
@@ -105,134 +142,182 @@ class FaceRecognizer:
             cv2.putText(img, self.last_mark_message, (20, 140), self.font, 0.7, (0, 255, 0), 2)
 
     def mark_attendance(self, roll_no: str, name: str):
-        """Sends attendance data to the Producer Service API for queueing."""
+        """Hands the mark to the background dispatcher; constant time, never blocks the video loop."""
         # Use roll_no and class_id only, as name is looked up by the consumer
-        try:
-            payload = {
-                "roll_no": roll_no,
-                "class_id": self.class_id,
-            }
-
-            response = requests.post(PRODUCER_API_URL, json=payload, timeout=2) # Added timeout
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-            if response.status_code == 202:
-                logging.info("✅ Attendance sent to queue for %s (%s)", name, roll_no)
-                self.marked_today.add((roll_no, self.class_id))
-                self.last_mark_message = f"QUEUED: {name} ({roll_no})"
+        self.dispatcher.enqueue(roll_no, self.class_id)
+        # The outbox guarantees eventual delivery, so the student counts as marked now
+        self.marked_today.add((roll_no, self.class_id))
+        self.last_mark_message = f"QUEUED: {name} ({roll_no})"
+        self.last_mark_time = time.time()
+
+    def _on_mark_result(self, roll_no, class_id, ok, message):
+        """Delivery outcome reported by the dispatcher thread (for the HUD)."""
+        if not ok:
+            backlog = self.dispatcher.backlog if self.dispatcher else 0
+            self.last_mark_message = f"{message} ({backlog} pending)" if backlog else message
+            self.last_mark_time = time.time()
+
+    def recognize_frame(self, img_rgb):
+        """Detect and track faces, re-identify tracks that are due, and mark attendance.
+
+        Returns a list of (kind, rect, text) annotations for draw_annotations;
+        kind is 'face' or 'low_quality'.
+        """
+        faces = detect_faces(img_rgb)
+        tracks = self.tracker.update(img_rgb, faces)
+        annotations = []
+        ear_val = None
+
+        # Pass 1: decide per track whether its cached identity is still good enough
+        to_embed = []
+        low_quality = set()
+        for track in tracks:
+            try:
+                if track.marked:
+                    continue
+                if track.needs_embedding(self.frame_cnt):
+                    if not image_quality_ok(img_rgb, track.rect):
+                        annotations.append(('low_quality', track.rect, "LOW QUALITY"))
+                        low_quality.add(track.track_id)
+                        continue
+                    to_embed.append(track)
+                elif REQUIRE_BLINK_BEFORE_MARK and track.confirmed:
+                    # Identity is cached, but liveness still needs fresh landmarks
+                    ear_val = ear_from_shape(shape_for_rect(img_rgb, track.rect))
+            except Exception as face_e:
+                logging.exception("Error processing face: %s", face_e)
+
+        # Pass 2: embed all due faces in one descriptor call, then score them
+        # against the whole gallery in one batch
+        embs = np.empty((0, 128), dtype=np.float32)
+        if to_embed:
+            try:
+                embs, shapes, _ = compute_embeddings_batch(img_rgb, [t.rect for t in to_embed])
+                ear_val = ear_from_shape(shapes[-1])
+            except Exception as face_e:
+                logging.exception("Error embedding faces: %s", face_e)
+                to_embed = []
+
+        if len(embs) and self.matcher is not None:
+            hits = self.matcher.match(embs, k=1)
+        else:
+            hits = [[] for _ in to_embed]
+
+        for track, face_hits in zip(to_embed, hits):
+            best_roll, best_name, best_d = face_hits[0] if face_hits else (None, None, float('inf'))
+            is_match = best_roll is not None and best_d < self.matcher.threshold
+            track.update_identity(best_roll, best_name, best_d, is_match, self.frame_cnt)
+
+        self._update_blink(ear_val)
+
+        # Pass 3: marking decisions on cached identities
+        for track in tracks:
+            if track.track_id in low_quality:
+                continue
+            if track.confirmed and not track.marked:
+                key = (track.roll_no, self.class_id)
+                if key in self.marked_today:
+                    track.marked = True
+                else:
+                    can_mark = True
+                    if REQUIRE_BLINK_BEFORE_MARK:
+                        can_mark = (time.time() - self.last_blink_time) <= BLINK_VALID_WINDOW_SEC
+                    if can_mark:
+                        # --- Action: Queue Attendance for the Producer API ---
+                        self.mark_attendance(track.roll_no, track.name)
+                        track.marked = True
+                        # ---------------------------------------
+
+            if track.roll_no is not None:
+                display = f"#{track.track_id} {track.name} [{track.roll_no}] ({track.distance:.3f})"
+                if track.marked:
+                    display += " MARKED"
             else:
-                logging.warning("⚠️ Queue API responded unexpectedly: %s", response.text)
-                self.last_mark_message = f"QUEUE ERROR: {response.status_code}"
+                display = f"#{track.track_id} Unknown ({track.distance:.3f})"
+            annotations.append(('face', track.rect, display))
 
-            self.last_mark_time = time.time()
+        return annotations
 
-        except requests.exceptions.RequestException as e:
-            # This handles connection errors, timeouts, etc.
-            logging.error("❌ Failed to connect to Producer API: %s", e)
-            self.last_mark_message = "API OFFLINE"
-            self.last_mark_time = time.time()
+    def _update_blink(self, ear_val):
+        """Blink tracking from the most recent EAR sample in the frame."""
+        if ear_val is None:
+            return
+        self.ear_queue.append(ear_val)
+        if ear_val < EAR_BLINK_THRESHOLD:
+            self._below_count += 1
+        else:
+            if self._below_count >= EAR_CONSEC_FRAMES:
+                self.blinks_total += 1
+                self.last_blink_time = time.time()
+            self._below_count = 0
+
+    def draw_annotations(self, frame_bgr, annotations):
+        for kind, rect, text in annotations:
+            if kind == 'low_quality':
+                cv2.rectangle(frame_bgr, (rect.left(), rect.top()), (rect.right(), rect.bottom()), (0, 0, 255), 2)
+                cv2.putText(frame_bgr, text, (rect.left(), max(20, rect.top() - 10)), self.font, 0.6, (0, 0, 255), 1)
+            else:
+                cv2.rectangle(frame_bgr, (rect.left(), rect.top()), (rect.right(), rect.bottom()), (255, 255, 255), 2)
+                cv2.putText(frame_bgr, text, (rect.left(), rect.bottom() + 20), self.font, 0.7, (0, 255, 255), 1)
+
+    @staticmethod
+    def prepare_frame(frame_bgr):
+        """Validate and resize a camera frame; returns (frame_bgr, img_rgb) or None to skip it."""
+        # --- FIX: Robust Frame Checks ---
+        if frame_bgr is None or frame_bgr.size == 0 or frame_bgr.dtype != np.uint8:
+            logging.warning("Captured frame is empty, corrupted, or not 8-bit unsigned integer type; skipping frame.")
+            return None
 
+        if len(frame_bgr.shape) < 3:
+            logging.warning("Frame does not have enough channels for BGR; skipping.")
+            return None
+        # ----------------------------------------------
+
+        frame_bgr = cv2.resize(frame_bgr, FRAME_SIZE)
+        img_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+
+        # FIX: Use np.ascontiguousarray to ensure dlib compatibility
+        return frame_bgr, np.ascontiguousarray(img_rgb)
 
     def process(self, cap):
         if not self.get_face_database():
             logging.error("Face DB not available or malformed. Run features_extraction_to_csv.py first.")
             return
 
+        self.dispatcher = AttendanceDispatcher(outbox_path=self.outbox_path, on_result=self._on_mark_result)
+        self.dispatcher.start()
+
+        if USE_PIPELINE:
+            try:
+                CapturePipeline(self, cap, show_window=self.show_window, on_report=self.stats_sink).run()
+            finally:
+                cap.release()
+                cv2.destroyAllWindows()
+                self.dispatcher.stop()
+            return
+
         try:
             while cap.isOpened():
                 self.frame_cnt += 1
                 ret, frame_bgr = cap.read()
 
-                # --- FIX: Robust Frame Checks ---
                 if not ret:
                     logging.warning("No camera frame returned (ret=False); stopping.")
                     break
 
-                if frame_bgr is None or frame_bgr.size == 0 or frame_bgr.dtype != np.uint8:
-                    logging.warning("Captured frame is empty, corrupted, or not 8-bit unsigned integer type; skipping frame.")
-                    time.sleep(0.1)
-                    continue
-
-                if len(frame_bgr.shape) < 3:
-                    logging.warning("Frame does not have enough channels for BGR; skipping.")
+                prepared = self.prepare_frame(frame_bgr)
+                if prepared is None:
                     time.sleep(0.1)
                     continue
-                # ----------------------------------------------
-
-                frame_bgr = cv2.resize(frame_bgr, FRAME_SIZE)
-                img_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
-
-                # FIX: Use np.ascontiguousarray to ensure dlib compatibility
-                img_rgb_contiguous = np.ascontiguousarray(img_rgb)
-
-                faces = detect_faces(img_rgb_contiguous)
-                names_to_draw = []
-                ear_val = None
-
-                for rect in faces:
-                    try:
-                        if not image_quality_ok(img_rgb_contiguous, rect):
-                            cv2.rectangle(frame_bgr, (rect.left(), rect.top()), (rect.right(), rect.bottom()), (0, 0, 255), 2)
-                            cv2.putText(frame_bgr, "LOW QUALITY", (rect.left(), max(20, rect.top() - 10)), self.font, 0.6, (0, 0, 255), 1)
-                            continue
-
-                        emb, shape, aligned = compute_embedding(img_rgb_contiguous, rect)
-                        ear_val = ear_from_shape(shape)
-
-                        # Default match
-                        best_name, best_roll, best_d, best_thr = "Unknown", None, float('inf'), None
-
-                        if len(self.face_features_known_list) > 0:
-                            for idx, known in enumerate(self.face_features_known_list):
-                                d, thr = compare_distance(emb, known)
-                                if d < best_d:
-                                    best_d = d
-                                    best_roll = self.face_roll_no_known_list[idx]
-                                    best_name = self.face_name_known_list[idx]
-                                    best_thr = thr
-
-                        cv2.rectangle(frame_bgr, (rect.left(), rect.top()), (rect.right(), rect.bottom()), (255, 255, 255), 2)
-                        is_match = (best_thr is not None) and (best_d < best_thr)
-                        display = f"Unknown ({best_d:.3f})"
-
-                        if is_match and best_roll:
-                            self.match_streaks[best_roll] += 1
-                            display = f"{best_name} [{best_roll}] ({best_d:.3f})"
-                            can_mark = self.match_streaks[best_roll] >= MIN_CONSEC_MATCHES
-                            if REQUIRE_BLINK_BEFORE_MARK:
-                                can_mark = can_mark and (time.time() - self.last_blink_time) <= BLINK_VALID_WINDOW_SEC
-                            if can_mark and ((best_roll, self.class_id) not in self.marked_today):
-                                # --- Action: Mark Attendance via API ---
-                                self.mark_attendance(best_roll, best_name)
-                                self.match_streaks[best_roll] = 0
-                                # ---------------------------------------
-                        else:
-                            if best_roll:
-                                self.match_streaks[best_roll] = 0
-
-                        names_to_draw.append((display, (rect.left(), rect.bottom() + 20)))
-                    except Exception as face_e:
-                        logging.exception("Error processing face: %s", face_e)
-
-                # Blink tracking
-                if ear_val is not None:
-                    self.ear_queue.append(ear_val)
-                    from config import EAR_BLINK_THRESHOLD, EAR_CONSEC_FRAMES
-                    if ear_val < EAR_BLINK_THRESHOLD:
-                        self._below_count += 1
-                    else:
-                        if self._below_count >= EAR_CONSEC_FRAMES:
-                            self.blinks_total += 1
-                            self.last_blink_time = time.time()
-                        self._below_count = 0
-
-                # Draw labels
-                for name, pos in names_to_draw:
-                    cv2.putText(frame_bgr, name, pos, self.font, 0.7, (0, 255, 255), 1)
+                frame_bgr, img_rgb = prepared
 
+                annotations = self.recognize_frame(img_rgb)
+                self.draw_annotations(frame_bgr, annotations)
                 self.draw_hud(frame_bgr)
-                cv2.imshow("camera", frame_bgr)
                 self.update_fps()
+                if not self.show_window:
+                    continue
+                cv2.imshow("camera", frame_bgr)
 
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     logging.info("Quit key pressed.")
@@ -243,8 +328,21 @@ class FaceRecognizer:
         finally:
             cap.release()
             cv2.destroyAllWindows()
+            self.dispatcher.stop()
+
+    def run(self, source=None):
+        """Open the camera and process it. source may be a device index or a stream URL/path;
+        without one, the default camera indices and backends are probed."""
+        if source is not None:
+            cap = cv2.VideoCapture(source)
+            if cap.isOpened():
+                logging.info("Opened camera source %s", source)
+                self.process(cap)
+            else:
+                cap.release()
+                logging.error("Failed to open camera source %s", source)
+            return
 
-    def run(self):
         # --- FIX: Robust Camera Initialization (Iterate over backends/indices) ---
         INDEXES_TO_TRY = [CAMERA_INDEX, 0, 1]
         BACKENDS_TO_TRY = [cv2.CAP_DSHOW, cv2.CAP_V4L2, cv2.CAP_ANY]
@@ -314,12 +412,4 @@ def main():
 
 
 if __name__ == '__main__':
-    # Ensure 'requests' is installed for the API call
-    try:
-        import requests
-    except ImportError:
-        print("\nFATAL ERROR: The 'requests' library is required for API communication.")
-        print("Please run: pip install requests")
-        exit(1)
-
     main()
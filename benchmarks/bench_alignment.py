@@ -0,0 +1,98 @@
+"""
+bench_alignment.py
+Compares the 'legacy' and 'chip' alignment modes of face_utils for speed
+(landmarks + alignment + descriptor per face) and embedding agreement.
+
+Agreement is reported two ways: the cosine distance between the two
+embeddings of the same face, and whether nearest-identity decisions made
+in each mode (against a per-person mean gallery built in that same mode)
+agree. Expects the enrolment layout data/data_faces_from_camera/<person>/*.jpg.
+
+Run from the repository root:
+    python -m benchmarks.bench_alignment --faces data/data_faces_from_camera --repeats 3
+"""
+
+import os
+import argparse
+import time
+import cv2
+import numpy as np
+
+from config import THRESHOLD_COSINE
+from face_utils import detect_faces, compute_embeddings_batch
+
+
+def load_faces(root, per_person):
+    """Yield (person, img_rgb, rect) for the largest face in each enrolment image."""
+    for person in sorted(os.listdir(root)):
+        folder = os.path.join(root, person)
+        if not os.path.isdir(folder):
+            continue
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+        for fn in files[:per_person]:
+            img_bgr = cv2.imread(os.path.join(folder, fn))
+            if img_bgr is None:
+                continue
+            img_rgb = np.ascontiguousarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
+            rects = detect_faces(img_rgb)
+            if rects:
+                yield person, img_rgb, max(rects, key=lambda r: r.width() * r.height())
+
+
+def embed_all(faces, mode, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        embs = np.stack([compute_embeddings_batch(img, [rect], mode=mode)[0][0] for _, img, rect in faces])
+    return embs, (time.perf_counter() - start) / (repeats * len(faces))
+
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=-1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=-1, keepdims=True)
+    return 1.0 - np.sum(a * b, axis=-1)
+
+
+def nearest_identity(embs, labels):
+    """Leave-one-out nearest person using per-person mean embeddings."""
+    people = sorted(set(labels))
+    labels = np.array(labels)
+    preds = []
+    for i, e in enumerate(embs):
+        mask = np.arange(len(embs)) != i
+        means = np.stack([embs[mask & (labels == p)].mean(axis=0) if np.any(mask & (labels == p))
+                          else np.full(embs.shape[1], np.inf) for p in people])
+        preds.append(people[int(np.nanargmin(cosine(means, e[None, :])))])
+    return np.array(preds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faces', default="data/data_faces_from_camera")
+    parser.add_argument('--per-person', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    faces = list(load_faces(args.faces, args.per_person))
+    if not faces:
+        raise SystemExit(f"No faces found under {args.faces}")
+    labels = [p for p, _, _ in faces]
+
+    embed_all(faces[:1], 'legacy', 1)  # warm-up / model load
+    legacy, t_legacy = embed_all(faces, 'legacy', args.repeats)
+    chip, t_chip = embed_all(faces, 'chip', args.repeats)
+
+    d = cosine(legacy, chip)
+    print(f"faces={len(faces)} people={len(set(labels))}")
+    print(f"legacy: {t_legacy * 1e3:7.2f} ms/face")
+    print(f"chip:   {t_chip * 1e3:7.2f} ms/face   speedup {t_legacy / t_chip:.2f}x")
+    print(f"legacy-vs-chip cosine distance: mean {d.mean():.4f}  p95 {np.percentile(d, 95):.4f}  "
+          f"max {d.max():.4f}  (match threshold {THRESHOLD_COSINE})")
+    if len(set(labels)) > 1:
+        pl, pc = nearest_identity(legacy, labels), nearest_identity(chip, labels)
+        truth = np.array(labels)
+        print(f"identification accuracy: legacy {np.mean(pl == truth):.3f}  chip {np.mean(pc == truth):.3f}  "
+              f"decision agreement {np.mean(pl == pc):.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+bench_ann_index.py
+Latency / recall@1 trade-off of the IVF index against exact batched search
+on a synthetic clustered gallery of 128-D embeddings.
+
+Run from the repository root:
+    python -m benchmarks.bench_ann_index --gallery 100000 --queries 500
+"""
+
+import argparse
+import time
+import numpy as np
+
+from config import DISTANCE_METRIC
+from gallery import GalleryMatcher
+from ann_index import IVFIndex
+
+
+def synthetic_gallery(n, dim=128, n_clusters=500, spread=0.15, seed=0):
+    """Embeddings grouped around random centres, roughly like real face descriptors."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0.0, 1.0, (n_clusters, dim)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    feats = centres[rng.integers(0, n_clusters, n)] + rng.normal(0.0, spread / np.sqrt(dim), (n, dim))
+    return feats.astype(np.float32)
+
+
+def timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gallery', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=30, help="faces per frame")
+    parser.add_argument('--noise', type=float, default=0.02)
+    parser.add_argument('--metric', default=DISTANCE_METRIC, choices=('cosine', 'euclidean'))
+    parser.add_argument('--nlist', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    feats = synthetic_gallery(args.gallery)
+    rolls = [str(i) for i in range(args.gallery)]
+    truth = rng.choice(args.gallery, args.queries, replace=False)
+    queries = feats[truth] + rng.normal(0.0, args.noise, (args.queries, feats.shape[1])).astype(np.float32)
+    frames = [queries[i:i + args.batch] for i in range(0, args.queries, args.batch)]
+
+    exact = GalleryMatcher(feats, rolls, rolls, metric=args.metric)
+    t_exact, _ = timed(lambda: [exact.search(f, 1) for f in frames], args.repeats)
+    exact_top1 = np.concatenate([exact.search(f, 1)[0][:, 0] for f in frames])
+
+    t0 = time.perf_counter()
+    index = IVFIndex.build(feats, roll_nos=rolls, metric=args.metric, nlist=args.nlist, target_recall=None)
+    build_s = time.perf_counter() - t0
+
+    print(f"gallery={args.gallery} queries={args.queries} batch={args.batch} metric={args.metric}")
+    print(f"index build: {build_s:.2f}s  nlist={index.nlist}")
+    print(f"{'mode':>12} {'ms/frame':>10} {'us/face':>10} {'recall@1':>9} {'speedup':>8}")
+    print(f"{'exact':>12} {t_exact / len(frames) * 1e3:10.2f} {t_exact / args.queries * 1e6:10.1f} {1.0:9.3f} {1.0:8.1f}")
+
+    nprobe = 1
+    while True:
+        t_ivf, _ = timed(lambda: [index.search(f, 1, nprobe=nprobe) for f in frames], args.repeats)
+        approx_top1 = np.concatenate([index.search(f, 1, nprobe=nprobe)[0][:, 0] for f in frames])
+        recall = float(np.mean(approx_top1 == exact_top1))
+        print(f"{'nprobe=' + str(nprobe):>12} {t_ivf / len(frames) * 1e3:10.2f} "
+              f"{t_ivf / args.queries * 1e6:10.1f} {recall:9.3f} {t_exact / t_ivf:8.1f}")
+        if nprobe >= index.nlist:
+            break
+        nprobe = min(nprobe * 2, index.nlist)
+
+
+if __name__ == '__main__':
+    main()
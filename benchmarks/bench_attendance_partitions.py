@@ -0,0 +1,146 @@
+"""
+bench_attendance_partitions.py
+Dashboard-style date-range queries on a large seeded attendance table,
+unpartitioned versus partitioned by month as attendance_partitions.py does.
+
+Two scratch tables are created with the attendance schema and the indexes
+from init_db.py: one plain, and one partitioned by RANGE COLUMNS(date) per
+month. Both are seeded with the same synthetic history (--students x
+--classes x --months, each student present with probability --presence).
+Every query below runs --repeat times on each table, with a one-week
+filter in the middle of the history. Reported per query:
+- median time on each table and the speedup;
+- the partitions the partitioned table's EXPLAIN shows are read (pruning).
+The tables are dropped afterwards unless --keep is given.
+
+Uses the MySQL server from .env. Run from the repository root:
+    python -m benchmarks.bench_attendance_partitions --students 400 --classes 5 --months 36
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import mysql.connector
+
+from config import MYSQL_CONFIG
+from attendance_partitions import add_months, partition_clause
+
+FLAT, PART = 'bench_attendance_flat', 'bench_attendance_part'
+
+TABLE_DDL = """
+    CREATE TABLE {name} (
+        roll_no VARCHAR(20),
+        name VARCHAR(100),
+        class_id INT,
+        time TIME,
+        date DATE,
+        PRIMARY KEY (roll_no, date, class_id),
+        KEY idx_class_date_roll (class_id, date, roll_no),
+        KEY idx_date (date)
+    ) {partitioning}
+"""
+
+QUERIES = [
+    ("class_trend",
+     "SELECT date, COUNT(DISTINCT roll_no) FROM {t} WHERE class_id = %s AND date >= %s AND date <= %s "
+     "GROUP BY date ORDER BY date", ('class', 'from', 'to')),
+    ("sessions in range",
+     "SELECT COUNT(DISTINCT class_id, date) FROM {t} WHERE date >= %s AND date <= %s", ('from', 'to')),
+    ("per-student counts",
+     "SELECT roll_no, COUNT(DISTINCT class_id, date) FROM {t} WHERE date >= %s AND date <= %s "
+     "GROUP BY roll_no", ('from', 'to')),
+    ("student detail",
+     "SELECT date, time, class_id FROM {t} WHERE roll_no = %s AND date >= %s AND date <= %s "
+     "ORDER BY date DESC, time DESC", ('roll', 'from', 'to')),
+    ("late arrivals (no index)",
+     "SELECT COUNT(*) FROM {t} WHERE date >= %s AND date <= %s AND time > '09:30:00'", ('from', 'to')),
+]
+
+
+def seed(conn, args, first_day):
+    cursor = conn.cursor()
+    rng = np.random.default_rng(0)
+    days = (add_months(first_day, args.months) - first_day).days
+    rows = 0
+    batch = []
+    for d in range(days):
+        day = first_day + timedelta(days=d)
+        if day.weekday() >= 5:
+            continue
+        present = rng.random((args.students, args.classes)) < args.presence
+        minutes = rng.integers(0, 60, (args.students, args.classes))
+        for s, c in zip(*np.nonzero(present)):
+            batch.append((f"S{s:05d}", f"Student {s}", int(c) + 1, f"09:{int(minutes[s, c]):02d}:00", day))
+        if len(batch) >= 20000:
+            cursor.executemany(f"INSERT INTO {FLAT} VALUES (%s, %s, %s, %s, %s)", batch)
+            conn.commit()
+            rows += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(f"INSERT INTO {FLAT} VALUES (%s, %s, %s, %s, %s)", batch)
+        rows += len(batch)
+    cursor.execute(f"INSERT INTO {PART} SELECT * FROM {FLAT}")
+    conn.commit()
+    cursor.execute(f"ANALYZE TABLE {FLAT}, {PART}")
+    cursor.fetchall()
+    return rows
+
+
+def timed(cursor, query, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=400)
+    parser.add_argument('--classes', type=int, default=5)
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--presence', type=float, default=0.8)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', action='store_true', help="keep the seeded tables")
+    args = parser.parse_args()
+
+    first_day = add_months(date.today().replace(day=1), -args.months)
+    bounds = [add_months(first_day, m) for m in range(1, args.months + 1)]
+    conn = mysql.connector.connect(**MYSQL_CONFIG)
+    cursor = conn.cursor()
+    try:
+        for name in (FLAT, PART):
+            cursor.execute(f"DROP TABLE IF EXISTS {name}")
+        cursor.execute(TABLE_DDL.format(name=FLAT, partitioning=""))
+        cursor.execute(TABLE_DDL.format(
+            name=PART, partitioning="PARTITION BY RANGE COLUMNS(date) ("
+            + ", ".join(partition_clause(b) for b in bounds) + ", PARTITION pmax VALUES LESS THAN (MAXVALUE))"))
+        started = time.perf_counter()
+        rows = seed(conn, args, first_day)
+        print(f"Seeded {rows} rows over {args.months} months in {time.perf_counter() - started:.0f}s.")
+
+        week_from = add_months(first_day, args.months // 2)
+        values = {'class': 1, 'roll': "S00001", 'from': week_from, 'to': week_from + timedelta(days=6)}
+        print(f"Filter: {values['from']} .. {values['to']}\n")
+        print(f"{'query':26s} {'flat ms':>9} {'part ms':>9} {'speedup':>8}  partitions read")
+        for label, sql, keys in QUERIES:
+            params = tuple(values[k] for k in keys)
+            flat_ms = timed(cursor, sql.format(t=FLAT), params, args.repeat)
+            part_ms = timed(cursor, sql.format(t=PART), params, args.repeat)
+            explain = conn.cursor(dictionary=True)
+            explain.execute("EXPLAIN " + sql.format(t=PART), params)
+            read = explain.fetchall()[0].get('partitions')
+            print(f"{label:26s} {flat_ms:9.2f} {part_ms:9.2f} {flat_ms / part_ms:7.1f}x  {read}")
+    finally:
+        if not args.keep:
+            for name in (FLAT, PART):
+                cursor.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+bench_batch_embedding.py
+Per-face cost of one compute_embedding call per face versus a single
+compute_embeddings_batch call, as the number of faces N in a frame grows.
+
+The largest face in --image is repeated N times, which isolates per-call
+overhead from detection. Requires the dlib model files from config.py.
+
+Run from the repository root:
+    python -m benchmarks.bench_batch_embedding --image data/data_faces_from_camera/1_Alice/img_1.jpg
+"""
+
+import argparse
+import time
+import cv2
+import numpy as np
+
+from face_utils import detect_faces, compute_embedding, compute_embeddings_batch
+
+
+def timed(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True)
+    parser.add_argument('--sizes', default="1,2,4,8,16,30")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    img_bgr = cv2.imread(args.image)
+    if img_bgr is None:
+        raise SystemExit(f"Cannot read image: {args.image}")
+    img_rgb = np.ascontiguousarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
+    rects = detect_faces(img_rgb)
+    if not rects:
+        raise SystemExit("No face found in image")
+    rect = max(rects, key=lambda r: r.width() * r.height())
+
+    single = compute_embedding(img_rgb, rect)[0]
+    batched = compute_embeddings_batch(img_rgb, [rect])[0][0]
+    print(f"max |single - batched| = {np.abs(single - batched).max():.2e}")
+
+    print(f"{'N':>4} {'loop ms/face':>13} {'batch ms/face':>14} {'speedup':>8}")
+    for n in (int(x) for x in args.sizes.split(',')):
+        batch = [rect] * n
+        t_loop = timed(lambda: [compute_embedding(img_rgb, r) for r in batch], args.repeats)
+        t_batch = timed(lambda: compute_embeddings_batch(img_rgb, batch), args.repeats)
+        print(f"{n:4d} {t_loop / n * 1e3:13.2f} {t_batch / n * 1e3:14.2f} {t_loop / t_batch:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
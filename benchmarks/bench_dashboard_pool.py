@@ -0,0 +1,77 @@
+"""
+bench_dashboard_pool.py
+Dashboard page latency with a new MySQL connection per query (the old
+behaviour, DASHBOARD_DB_POOL_SIZE=0) versus the shared connection pool.
+
+Loads the given page through Flask's test client, so the query and
+connection cost is measured without HTTP socket overhead. Uses the MySQL
+server from .env. Concurrent clients run as green threads, because app.py
+monkey-patches with eventlet the same way the real server does.
+
+Run from the repository root:
+    python -m benchmarks.bench_dashboard_pool --requests 50 --concurrency 1,8
+"""
+
+import app as dashboard  # first: eventlet monkey-patching
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from db_pool import ConnectionPool
+from config import MYSQL_CONFIG, DB_POOL_HEALTH_CHECK_SEC
+
+
+def run(path, n, concurrency):
+    client = dashboard.app.test_client()
+    latencies, statuses, lock = [], {}, threading.Lock()
+
+    def worker(count):
+        local = []
+        for _ in range(count):
+            t0 = time.perf_counter()
+            code = client.get(path).status_code
+            local.append(time.perf_counter() - t0)
+            with lock:
+                statuses[code] = statuses.get(code, 0) + 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(max(1, n // concurrency),)) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return np.array(latencies) * 1e3, elapsed, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default="/")
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', default="1,8")
+    parser.add_argument('--pool-size', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'clients':>7} {'pages/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'opened':>7}  statuses")
+    for concurrency in (int(x) for x in args.concurrency.split(',')):
+        for mode in ('direct', 'pooled'):
+            pool = None
+            if mode == 'pooled':
+                pool = ConnectionPool({**MYSQL_CONFIG, 'autocommit': True}, max_size=args.pool_size,
+                                      health_check_sec=DB_POOL_HEALTH_CHECK_SEC)
+            dashboard.db_pool = pool
+            lat, elapsed, statuses = run(args.path, args.requests, concurrency)
+            opened = pool.stats()['created'] if pool else '-'
+            print(f"{mode:>8} {concurrency:7d} {len(lat) / elapsed:8.1f} {np.percentile(lat, 50):8.1f} "
+                  f"{np.percentile(lat, 99):8.1f} {opened:>7}  {statuses}")
+            if pool:
+                pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+bench_export_formats.py
+Size and downstream load time of an attendance export as CSV (/export_csv
+mode=records) versus Parquet and Arrow IPC (/export_columnar).
+
+Synthetic attendance rows (--rows, shaped like the real table: --students
+roll numbers, --classes classes, one day per --per-day rows) are encoded
+with the same code the endpoints use. Reported per format:
+- bytes produced;
+- encode time on the server side;
+- time for an analytics client to load the export into a table: pandas
+  (or the csv module without pandas) for CSV, pyarrow for Parquet/Arrow.
+
+No database needed. Run from the repository root:
+    python -m benchmarks.bench_export_formats --rows 1000000
+"""
+
+import app as dashboard  # first: eventlet monkey-patching
+
+import argparse
+import csv
+import io
+import time
+from datetime import date, timedelta
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+import columnar_export
+
+
+class ListCursor:
+    """fetchmany() over an in-memory list, standing in for the unbuffered MySQL cursor."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._pos = 0
+
+    def fetchmany(self, size):
+        batch = self._rows[self._pos:self._pos + size]
+        self._pos += size
+        return batch
+
+
+def make_rows(args):
+    start = date(2024, 1, 1)
+    return [(f"S{i % args.students:05d}", f"Student {i % args.students}", i % args.classes + 1,
+             start + timedelta(days=i // args.per_day), timedelta(hours=9, minutes=i % 60, seconds=i % 7))
+            for i in range(args.rows)]
+
+
+def load_csv(data):
+    try:
+        import pandas as pd
+        return len(pd.read_csv(io.BytesIO(data)))
+    except ImportError:
+        return sum(1 for _ in csv.reader(io.StringIO(data.decode("utf-8")))) - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--per-day', type=int, default=5000)
+    args = parser.parse_args()
+
+    rows = make_rows(args)
+    class_names = {c: f"CLASS-{c}" for c in range(1, args.classes + 1)}
+    header = ["Roll No", "Name", "Class ID", "Class", "Date", "Time"]
+
+    def csv_rows():
+        for roll_no, name, cid, day, t in rows:
+            yield roll_no, name, cid, class_names[cid], day, dashboard.json_serial(t)
+
+    encoders = {
+        'csv': lambda: dashboard.csv_chunks(header, csv_rows()),
+        'parquet': lambda: columnar_export.stream_batches(
+            columnar_export.iter_batches(ListCursor(rows), class_names), 'parquet'),
+        'arrow': lambda: columnar_export.stream_batches(
+            columnar_export.iter_batches(ListCursor(rows), class_names), 'arrow'),
+    }
+    loaders = {
+        'csv': load_csv,
+        'parquet': lambda data: pq.read_table(io.BytesIO(data)).num_rows,
+        'arrow': lambda data: pa.ipc.open_stream(data).read_all().num_rows,
+    }
+
+    print(f"{'format':>8} {'MB':>8} {'vs csv':>7} {'encode s':>9} {'load s':>8} {'load vs csv':>12}")
+    baseline = {}
+    for fmt, encode in encoders.items():
+        t0 = time.perf_counter()
+        data = b"".join(encode())
+        encode_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        loaded = loaders[fmt](data)
+        load_s = time.perf_counter() - t0
+        assert loaded == len(rows), (fmt, loaded)
+        baseline.setdefault('size', len(data))
+        baseline.setdefault('load', load_s)
+        print(f"{fmt:>8} {len(data) / 2**20:8.1f} {baseline['size'] / len(data):6.1f}x {encode_s:9.2f} "
+              f"{load_s:8.3f} {baseline['load'] / load_s:11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+bench_producer_batch.py
+Marks/sec through producer_service for the single-mark endpoint (one HTTP
+request and one XADD round trip per mark) versus the batch endpoint (one
+request and one pipelined XADD sequence per batch).
+
+Requests go through Flask's test client, so HTTP parsing is included but
+socket overhead is not. The producer's Valkey client is replaced by one for
+--redis-url (a local Valkey or Redis, no TLS), and marks are written to a
+throwaway stream that is deleted afterwards.
+
+Run from the repository root:
+    python -m benchmarks.bench_producer_batch --redis-url redis://127.0.0.1:6379/0 --marks 5000
+"""
+
+import argparse
+import time
+import uuid
+from datetime import datetime
+
+import redis
+
+import producer_service
+import stream_partitions
+
+
+def make_marks(n):
+    """Marks with roll numbers unique to this call, so producer dedup never drops them."""
+    now = datetime.now().isoformat()
+    run = uuid.uuid4().hex[:8]
+    return [{'roll_no': f"R{run}{i:05d}", 'class_id': 1 + i % 20, 'timestamp': now} for i in range(n)]
+
+
+def run_single(client, marks):
+    start = time.perf_counter()
+    for mark in marks:
+        resp = client.post('/api/v1/log_attendance', json=mark)
+        assert resp.status_code == 202, resp.get_data(as_text=True)
+    return time.perf_counter() - start
+
+
+def run_batch(client, marks, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(marks), batch_size):
+        resp = client.post('/api/v1/log_attendance_batch', json={'marks': marks[i:i + batch_size]})
+        assert resp.status_code == 202, resp.get_data(as_text=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default="redis://127.0.0.1:6379/0")
+    parser.add_argument('--marks', type=int, default=5000)
+    parser.add_argument('--batch-sizes', default="10,50,200,500")
+    parser.add_argument('--stream', default="bench_attendance_stream")
+    args = parser.parse_args()
+
+    valkey = redis.Redis.from_url(args.redis_url)
+    valkey.ping()
+    producer_service.valkey_client = valkey
+    stream_partitions.STREAMS = [args.stream]
+    client = producer_service.app.test_client()
+    marks = make_marks(args.marks)
+
+    try:
+        run_batch(client, make_marks(50), 50)  # warm-up
+        t = run_single(client, marks)
+        print(f"{'mode':>12} {'marks/s':>10} {'ms/mark':>9}")
+        print(f"{'single':>12} {len(marks) / t:10.0f} {t / len(marks) * 1e3:9.3f}")
+        for size in (int(x) for x in args.batch_sizes.split(',')):
+            marks = make_marks(args.marks)
+            t = run_batch(client, marks, size)
+            print(f"{'batch ' + str(size):>12} {len(marks) / t:10.0f} {t / len(marks) * 1e3:9.3f}")
+    finally:
+        valkey.delete(args.stream)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+bench_producer_http.py
+HTTP load test for a running Producer Service: requests/sec and latency
+percentiles for POST /api/v1/log_attendance at a given concurrency.
+
+Each client thread keeps one keep-alive session and posts marks back to
+back. Start the service in the mode under test, then run this against it,
+for example:
+
+    PRODUCER_SERVER=flask    FLASK_DEBUG=false python producer_service.py
+    PRODUCER_SERVER=waitress python producer_service.py
+    PRODUCER_SERVER=async    python producer_service.py
+
+    python -m benchmarks.bench_producer_http --url http://127.0.0.1:5001 --requests 5000 --concurrency 32
+
+To get the numbers from before the connection pool (one PING + one XADD per
+request), run the same command against the previous producer_service.py.
+"""
+
+import argparse
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import requests
+
+
+def client_loop(url, n, start_at, latencies, errors, lock):
+    session = requests.Session()
+    mark = {'roll_no': 'BENCH', 'class_id': 1, 'timestamp': datetime.now().isoformat()}
+    run = uuid.uuid4().hex[:8]  # unique roll numbers per client, so producer dedup never drops them
+    local, failed = [], 0
+    while time.perf_counter() < start_at:
+        time.sleep(0.001)
+    for i in range(n):
+        mark['roll_no'] = f"B{run}{i:06d}"
+        t0 = time.perf_counter()
+        try:
+            ok = session.post(url, json=mark, timeout=10).status_code == 202
+        except requests.exceptions.RequestException:
+            ok = False
+        local.append(time.perf_counter() - t0)
+        failed += not ok
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default="http://127.0.0.1:5001")
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/') + '/api/v1/log_attendance'
+    per_client = max(1, args.requests // args.concurrency)
+    latencies, errors, lock = [], [0], threading.Lock()
+    start_at = time.perf_counter() + 0.5
+    threads = [threading.Thread(target=client_loop, args=(url, per_client, start_at, latencies, errors, lock))
+               for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start_at
+
+    lat = np.array(latencies) * 1e3
+    print(f"requests={len(lat)} concurrency={args.concurrency} errors={errors[0]}")
+    print(f"throughput: {len(lat) / elapsed:.0f} req/s")
+    print(f"latency ms: p50 {np.percentile(lat, 50):.2f}  p90 {np.percentile(lat, 90):.2f}  "
+          f"p99 {np.percentile(lat, 99):.2f}  max {lat.max():.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+bench_stream_partitions.py
+How drain throughput and latency change with the number of stream partitions
+when one class is much busier than the rest.
+
+A producer thread floods marks into the partition streams at full speed, with
+--hot-share of them going to one hot class and the rest spread over the other
+classes. --workers consumer threads in one group drain all partitions the same
+way consumer_worker does (one multi-stream XREADGROUP with the COUNT split per
+stream), sleep --commit-ms per batch to stand in for the MySQL commit, and ACK.
+
+Reported per partition count:
+- drain rate (marks/s);
+- end-to-end latency for hot-class marks;
+- latency for cold classes in partitions the hot class does not use (with a
+  single partition, all cold classes).
+
+Needs a local Valkey or Redis; streams are created under --prefix and deleted.
+
+Run from the repository root:
+    python -m benchmarks.bench_stream_partitions --redis-url redis://127.0.0.1:6379/0 --partitions 1,2,4,8
+"""
+
+import argparse
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import redis
+
+import stream_codec
+import stream_partitions
+
+GROUP = 'bench_writers'
+
+
+def now_ms():
+    return stream_codec.make_mark('', 0, datetime.now()).wall_ms
+
+
+def produce(r, streams, total, classes, hot_share):
+    rng = np.random.default_rng(0)
+    hot = rng.random(total) < hot_share
+    cold_classes = rng.integers(2, classes + 1, total)
+    pipe = r.pipeline(transaction=False)
+    for i in range(total):
+        class_id = 1 if hot[i] else int(cold_classes[i])
+        mark = stream_codec.make_mark(f"R{i:06d}", class_id, datetime.now())
+        pipe.xadd(stream_partitions.stream_for(class_id, streams), stream_codec.encode(mark, 'compact'))
+        if len(pipe) >= 100:
+            pipe.execute()
+    pipe.execute()
+
+
+def remaining(r, streams):
+    """Entries not yet ACKed: pending plus not yet delivered (lag), over all partitions."""
+    total = 0
+    for s in streams:
+        group = r.xinfo_groups(s)[0]
+        total += group['pending'] + (group.get('lag') or 0)
+    return total
+
+
+def consume(r, streams, name, batch, commit_ms, latencies, lock, stop):
+    count = max(1, batch // len(streams))
+    local = []
+    while not stop.is_set():
+        messages = r.xreadgroup(GROUP, name, {s: '>' for s in streams}, count=count, block=100)
+        if not messages:
+            continue
+        time.sleep(commit_ms / 1000.0)  # stand-in for the MySQL multi-row INSERT + commit
+        t = now_ms()
+        pipe = r.pipeline(transaction=False)
+        for stream, entries in messages:
+            pipe.xack(stream, GROUP, *[msg_id for msg_id, _ in entries])
+            for _, data in entries:
+                mark = stream_codec.decode(data)
+                local.append((mark.class_id, t - mark.wall_ms))
+        pipe.execute()
+    with lock:
+        latencies.extend(local)
+
+
+def run(r, prefix, partitions, args):
+    streams = stream_partitions.stream_names(partitions, base=prefix)
+    for s in streams:
+        r.delete(s)
+        r.xgroup_create(s, GROUP, id='0', mkstream=True)
+    hot_partition = stream_partitions.partition_of(1, partitions)
+    isolated = {c for c in range(2, args.classes + 1)
+                if partitions == 1 or stream_partitions.partition_of(c, partitions) != hot_partition}
+
+    latencies, lock, stop = [], threading.Lock(), threading.Event()
+    workers = [threading.Thread(target=consume, args=(redis.Redis.from_url(args.redis_url), streams, f"w{i}",
+                                                      args.batch, args.commit_ms, latencies, lock, stop))
+               for i in range(args.workers)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    produce(r, streams, args.marks, args.classes, args.hot_share)
+    while remaining(r, streams):
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for w in workers:
+        w.join()
+    for s in streams:
+        r.delete(s)
+
+    lat = np.array([ms for _, ms in latencies], dtype=float)
+    hot = np.array([ms for c, ms in latencies if c == 1], dtype=float)
+    iso = np.array([ms for c, ms in latencies if c in isolated], dtype=float)
+
+    def pct(a):
+        return f"{np.percentile(a, 50):8.0f} {np.percentile(a, 99):8.0f}" if len(a) else f"{'-':>8} {'-':>8}"
+    print(f"{partitions:10d} {len(lat) / elapsed:10.0f} {pct(hot)} {pct(iso)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default="redis://127.0.0.1:6379/0")
+    parser.add_argument('--partitions', default="1,2,4,8")
+    parser.add_argument('--marks', type=int, default=50000)
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--hot-share', type=float, default=0.8)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--commit-ms', type=float, default=5.0)
+    parser.add_argument('--prefix', default="bench_partition_stream")
+    args = parser.parse_args()
+
+    r = redis.Redis.from_url(args.redis_url)
+    r.ping()
+    print(f"{'partitions':>10} {'marks/s':>10} {'hot p50':>8} {'hot p99':>8} {'cold p50':>8} {'cold p99':>8}  (ms)")
+    for partitions in (int(x) for x in args.partitions.split(',')):
+        run(r, args.prefix, partitions, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+capture_pipeline.py
+Multi-stage threaded pipeline for FaceRecognizer:
+
+    grabber thread -> recognition thread -> render (main thread)
+
+Attendance marks leave the recognition thread through the recognizer's
+AttendanceDispatcher, which sends them in the background.
+
+Stages are connected by bounded queues that drop the oldest item when
+full, so a slow stage never lets stale frames pile up behind it and
+end-to-end latency stays bounded. Each stage reports its throughput.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+import cv2
+
+from config import (
+    CAPTURE_QUEUE_DEPTH, RENDER_QUEUE_DEPTH, PIPELINE_STATS_INTERVAL_SEC
+)
+
+
+class DropOldestQueue:
+    """Bounded FIFO whose put() never blocks: when full, the oldest item is discarded."""
+
+    def __init__(self, maxsize):
+        self._items = deque(maxlen=max(1, int(maxsize)))
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def full(self):
+        return len(self._items) == self._items.maxlen
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    """Thread-safe item counter that reports a rate per reporting interval."""
+
+    def __init__(self, name):
+        self.name = name
+        self.total = 0
+        self._count = 0
+        self._since = time.time()
+        self.rate = 0.0
+        self._lock = threading.Lock()
+
+    def tick(self, n=1):
+        with self._lock:
+            self.total += n
+            self._count += n
+
+    def roll(self):
+        """Close the current interval and return its rate (items/sec)."""
+        with self._lock:
+            now = time.time()
+            dt = now - self._since
+            self.rate = self._count / dt if dt > 0 else 0.0
+            self._count, self._since = 0, now
+            return self.rate
+
+
+class CapturePipeline:
+    """Runs FaceRecognizer over a capture device with decoupled stages."""
+
+    def __init__(self, recognizer, cap, capture_depth=CAPTURE_QUEUE_DEPTH,
+                 render_depth=RENDER_QUEUE_DEPTH,
+                 stats_interval=PIPELINE_STATS_INTERVAL_SEC, show_window=True, on_report=None):
+        self.recognizer = recognizer
+        self.cap = cap
+        self.show_window = show_window
+        self.on_report = on_report  # optional callable(snapshot dict), e.g. multi-camera health
+        self.stats_interval = stats_interval
+
+        self.frames = DropOldestQueue(capture_depth)
+        self.results = DropOldestQueue(render_depth)
+        self.stop_event = threading.Event()
+
+        self.stats = {name: StageStats(name) for name in ('capture', 'recognize', 'render')}
+        self.latency_ms = 0.0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._latency_n = 0
+
+        self._threads = [
+            threading.Thread(target=self._grab_loop, name="frame-grabber", daemon=True),
+            threading.Thread(target=self._recognize_loop, name="recognizer", daemon=True),
+        ]
+
+    # --- Stages ---
+
+    def _grab_loop(self):
+        """Read frames as fast as the camera delivers them; only the newest few are kept."""
+        while not self.stop_event.is_set():
+            ret, frame_bgr = self.cap.read()
+            if not ret:
+                logging.warning("No camera frame returned (ret=False); stopping.")
+                self.stop_event.set()
+                break
+            self.frames.put((time.time(), frame_bgr))
+            self.stats['capture'].tick()
+
+    def _recognize_loop(self):
+        while not self.stop_event.is_set():
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            captured_at, frame_bgr = item
+            prepared = self.recognizer.prepare_frame(frame_bgr)
+            if prepared is None:
+                continue
+            frame_bgr, img_rgb = prepared
+            self.recognizer.frame_cnt += 1
+            try:
+                annotations = self.recognizer.recognize_frame(img_rgb)
+            except Exception as e:
+                logging.exception("Recognition stage failed on frame: %s", e)
+                continue
+            self.results.put((captured_at, frame_bgr, annotations))
+            self.stats['recognize'].tick()
+
+    def _render(self, item):
+        captured_at, frame_bgr, annotations = item
+        self.recognizer.draw_annotations(frame_bgr, annotations)
+        self.recognizer.draw_hud(frame_bgr)
+        cv2.putText(frame_bgr, self.hud_line(), (20, 425), self.recognizer.font, 0.5, (200, 200, 200), 1)
+        if self.show_window:
+            cv2.imshow("camera", frame_bgr)
+        self.recognizer.update_fps()
+
+        latency = (time.time() - captured_at) * 1000.0
+        self._latency_sum += latency
+        self._latency_max = max(self._latency_max, latency)
+        self._latency_n += 1
+        self.stats['render'].tick()
+
+    # --- Reporting ---
+
+    def hud_line(self):
+        s = self.stats
+        return (f"cap {s['capture'].rate:.0f} / rec {s['recognize'].rate:.0f} / "
+                f"out {s['render'].rate:.0f} fps  lat {self.latency_ms:.0f} ms")
+
+    def report(self):
+        for stage in self.stats.values():
+            stage.roll()
+        self.latency_ms = self._latency_sum / self._latency_n if self._latency_n else 0.0
+        latency_max = self._latency_max
+        self._latency_sum, self._latency_max, self._latency_n = 0.0, 0.0, 0
+        logging.info("[pipeline] %s | latency avg %.0f ms max %.0f ms | dropped frames %d/%d",
+                     ", ".join(f"{s.name} {s.rate:.1f}/s" for s in self.stats.values()),
+                     self.latency_ms, latency_max, self.frames.dropped, self.results.dropped)
+        if self.on_report is not None:
+            dispatcher = self.recognizer.dispatcher
+            self.on_report({
+                'time': time.time(),
+                'frames': self.stats['render'].total,
+                'capture_fps': self.stats['capture'].rate,
+                'recognize_fps': self.stats['recognize'].rate,
+                'render_fps': self.stats['render'].rate,
+                'marks': dispatcher.sent if dispatcher is not None else 0,
+                'mark_backlog': dispatcher.backlog if dispatcher is not None else 0,
+                'latency_ms': self.latency_ms,
+                'latency_max_ms': latency_max,
+                'dropped_frames': self.frames.dropped,
+            })
+
+    # --- Main loop ---
+
+    def run(self):
+        """Start the worker stages and render on the calling thread until quit or end of stream."""
+        for t in self._threads:
+            t.start()
+        next_report = time.time() + self.stats_interval
+        try:
+            while not self.stop_event.is_set():
+                item = self.results.get(timeout=0.05)
+                if item is not None:
+                    self._render(item)
+                if time.time() >= next_report:
+                    self.report()
+                    next_report = time.time() + self.stats_interval
+                if self.show_window and cv2.waitKey(1) & 0xFF == ord('q'):
+                    logging.info("Quit key pressed.")
+                    break
+        except KeyboardInterrupt:
+            logging.info("Stopped by user.")
+        finally:
+            self.stop_event.set()
+            for t in self._threads:
+                t.join(timeout=2.0)
+            self.report()
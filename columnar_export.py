@@ -0,0 +1,134 @@
+"""
+columnar_export.py
+Attendance rows as Parquet or Arrow IPC stream, for /export_columnar.
+
+Rows are read from an unbuffered cursor in batches of COLUMNAR_BATCH_ROWS.
+Each batch becomes one Arrow record batch (one Parquet row group), and the
+encoded bytes are handed to the HTTP response as soon as they are written,
+so memory stays bounded by one batch whatever the size of the export.
+
+Columns are typed:
+    roll_no, name  string
+    class_id       int32
+    class_name     dictionary<int32, string>
+    date           date32
+    time           time32[s]
+class_name uses one dictionary (every class, in class_id order) for the
+whole export. Parquet also dictionary-encodes the repeated roll numbers and
+names; both formats are compressed with COLUMNAR_COMPRESSION.
+
+pyarrow is optional. Without it available() is False and the endpoint
+answers 501.
+"""
+
+from config import COLUMNAR_BATCH_ROWS, COLUMNAR_COMPRESSION
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only /export_columnar needs it
+    pa = None
+
+FORMATS = {
+    # format: (file extension, MIME type)
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+def available():
+    return pa is not None
+
+
+def schema():
+    return pa.schema([
+        ('roll_no', pa.string()),
+        ('name', pa.string()),
+        ('class_id', pa.int32()),
+        ('class_name', pa.dictionary(pa.int32(), pa.string())),
+        ('date', pa.date32()),
+        ('time', pa.time32('s')),
+    ])
+
+
+def _seconds(t):
+    """MySQL TIME arrives as a timedelta."""
+    return None if t is None else int(t.total_seconds())
+
+
+def iter_batches(cursor, class_names, batch_rows=COLUMNAR_BATCH_ROWS):
+    """Record batches from an executed cursor over (roll_no, name, class_id, date, time) rows.
+
+    class_names: {class_id: class_name} for every class, used as the shared dictionary.
+    """
+    ids = sorted(class_names)
+    index_of = {class_id: i for i, class_id in enumerate(ids)}
+    dictionary = pa.array([class_names[class_id] for class_id in ids], pa.string())
+    batch_schema = schema()
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            return
+        roll_nos, names, class_ids, dates, times = zip(*rows)
+        yield pa.RecordBatch.from_arrays([
+            pa.array(roll_nos, pa.string()),
+            pa.array(names, pa.string()),
+            pa.array(class_ids, pa.int32()),
+            pa.DictionaryArray.from_arrays(pa.array([index_of.get(c) for c in class_ids], pa.int32()),
+                                           dictionary),
+            pa.array(dates, pa.date32()),
+            pa.array([_seconds(t) for t in times], pa.time32('s')),
+        ], schema=batch_schema)
+
+
+class _ChunkSink:
+    """Write-only file object that collects what the Arrow writers produce, to be drained as chunks."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return b"".join(chunks)
+
+
+def _open_writer(sink, fmt):
+    if fmt == 'parquet':
+        return pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema(), compression=COLUMNAR_COMPRESSION)
+    options = pa.ipc.IpcWriteOptions(compression=None if COLUMNAR_COMPRESSION == 'none' else COLUMNAR_COMPRESSION)
+    return pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema(), options=options)
+
+
+def stream_batches(batches, fmt):
+    """Encode record batches as `fmt` ('parquet' or 'arrow'), yielding bytes as each batch is written."""
+    sink = _ChunkSink()
+    writer = _open_writer(sink, fmt)
+    try:
+        for batch in batches:
+            if fmt == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]))  # one row group per batch
+            else:
+                writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -29,8 +29,15 @@ for key in required_valkey_keys:
 
 # Valkey Stream parameters
 VALKEY_STREAM_NAME = 'attendance_stream'
+# Number of streams marks are spread over by class (see stream_partitions.py); 1 = just VALKEY_STREAM_NAME
+STREAM_PARTITIONS = int(os.getenv("STREAM_PARTITIONS", 1))
 VALKEY_GROUP_NAME = 'attendance_writers'
-VALKEY_CONSUMER_NAME = 'worker_1' # Unique name for this consumer instance
+# Consumers announce the (class_id, date) pairs of every committed batch here, for the dashboard cache
+VALKEY_COMMITS_STREAM = 'attendance_commits'
+COMMITS_STREAM_MAXLEN = 10000  # approximate; only the dashboard's live reader needs recent entries
+# Stream entry format written by producers: 'compact' (one packed field) or 'legacy' (three
+# string fields). Consumers read both; keep 'legacy' until every consumer is upgraded.
+STREAM_CODEC = os.getenv("STREAM_CODEC", "compact").lower()
 
 # --- MySQL Database Configuration ---
 # Use the details from your Aiven for MySQL® service Overview page
@@ -55,6 +62,74 @@ for key in required_keys:
     if not MYSQL_CONFIG.get(key):
         raise RuntimeError(f"❌ Missing MySQL config key: {key}. Check your .env file.")
 
+# --- Producer Service runtime ---
+# 'flask' (dev server), 'waitress' (threaded WSGI) or 'async' (aiohttp + XADD coalescing)
+PRODUCER_SERVER = os.getenv("PRODUCER_SERVER", "flask").lower()
+PRODUCER_THREADS = int(os.getenv("PRODUCER_THREADS", 16))  # waitress request threads
+PRODUCER_MAX_BATCH = 500  # max marks accepted by /api/v1/log_attendance_batch
+VALKEY_POOL_SIZE = int(os.getenv("VALKEY_POOL_SIZE", 32))  # shared connections per producer process
+VALKEY_SOCKET_TIMEOUT_SEC = 5
+VALKEY_HEALTH_CHECK_SEC = 30       # idle connections older than this are PINGed before reuse
+PRODUCER_COALESCE_MS = 2           # async mode: XADDs arriving within this window share one pipeline
+PRODUCER_COALESCE_MAX = 256        # ...flushed early once this many are waiting
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "True").lower() == "true"  # drop repeat marks at ingress
+DEDUP_KEY_PREFIX = 'attendance:seen'  # per-day keys: <prefix>:{<stream>}:<date>:<class_id>:<roll_no>
+DEDUP_GRACE_SEC = 3600             # dedup keys expire this long after the mark's midnight; also the
+                                   # clock skew allowed on client timestamps (see validate_mark)
+DEDUP_LOCAL_MAX = 200000           # in-process cache of confirmed keys (cleared daily)
+
+# --- Stream retention (stream_retention.py) ---
+RETENTION_INTERVAL_SEC = int(os.getenv("RETENTION_INTERVAL_SEC", 60))
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "data/stream_archive")  # gzip JSONL segments
+RETENTION_PAGE_SIZE = 5000            # entries read per XRANGE while archiving
+# Groups that do not hold the trim point back (the dashboard reads with XREAD, not XREADGROUP)
+RETENTION_IGNORE_GROUPS = [g for g in os.getenv("RETENTION_IGNORE_GROUPS", "dashboard_readers").split(',') if g]
+
+# --- Consumer worker (consumer_worker.py) ---
+# Consumer name within the group; leave unset to auto-generate a unique one per process
+VALKEY_CONSUMER_NAME = os.getenv("VALKEY_CONSUMER_NAME") or None
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", 1))  # processes started by consumer_worker.py
+CONSUMER_CLAIM_IDLE_MS = 60000       # pending entries idle this long are reclaimed (XAUTOCLAIM)
+CONSUMER_CLAIM_INTERVAL_SEC = 30     # how often each worker scans for stale pending entries
+CONSUMER_CLAIM_COUNT = 100           # entries per XAUTOCLAIM call
+CONSUMER_IDLE_DELETE_MS = 3600000    # idle consumers with nothing pending are removed from the group
+CONSUMER_BATCH_MIN = 10              # adaptive batch size bounds (messages per read/commit)
+CONSUMER_BATCH_MAX = 2000
+CONSUMER_TARGET_COMMIT_MS = 250      # batches committing slower than this are halved
+CONSUMER_INSERT_ROWS = 500           # rows per multi-row INSERT statement
+CONSUMER_BACKLOG_SAMPLE_SEC = 2      # how often group lag is sampled
+CONSUMER_STATS_SEC = 30              # throughput log interval
+ROSTER_CACHE_TTL_SEC = 3600          # cached student names are re-read after this long
+ROSTER_CACHE_NEGATIVE_TTL_SEC = 60   # roll numbers not in the students table are re-checked sooner
+ROSTER_CACHE_MAX = 100000            # LRU bound on cached roll numbers
+
+# --- Summary tables (summary_tables.py) ---
+# Keep class_sessions / student_class_counts current and read them in the dashboard
+SUMMARY_TABLES_ENABLED = os.getenv("SUMMARY_TABLES_ENABLED", "True").lower() == "true"
+SUMMARY_DEADLOCK_RETRIES = 3          # consumer retries of a batch chosen as deadlock victim
+
+# --- Dashboard (app.py) ---
+DASHBOARD_DB_POOL_SIZE = int(os.getenv("DASHBOARD_DB_POOL_SIZE", 8))  # 0 = new connection per query
+DASHBOARD_DB_POOL_TIMEOUT_SEC = 2.0   # wait for a free connection before answering 503
+DB_POOL_HEALTH_CHECK_SEC = 30         # ping connections idle longer than this before reuse
+QUERY_CACHE_MAX = 256                 # cached dashboard aggregate results (LRU)
+QUERY_CACHE_TTL_SEC = 300             # upper bound on staleness if an invalidation is ever missed
+
+# --- Dashboard CSV export (streamed) ---
+EXPORT_MAX_CONCURRENT = 2             # simultaneous exports; more get a 503
+EXPORT_CHUNK_BYTES = 64 * 1024        # CSV bytes per response chunk
+EXPORT_FETCH_ROWS = 1000              # rows fetched per round from the unbuffered cursor
+EXPORT_NET_WRITE_TIMEOUT_SEC = 600    # MySQL waits this long on a slow downloading client
+COLUMNAR_BATCH_ROWS = 65536           # rows per Arrow record batch / Parquet row group (/export_columnar)
+COLUMNAR_COMPRESSION = os.getenv("COLUMNAR_COMPRESSION", "zstd").lower()  # 'zstd', 'lz4' or 'none'
+
+# --- Attendance partitioning / cold archival (attendance_partitions.py) ---
+ATTENDANCE_PARTITION_MONTHS_AHEAD = 3   # empty monthly partitions kept ready
+ATTENDANCE_RETENTION_MONTHS = int(os.getenv("ATTENDANCE_RETENTION_MONTHS", 24))  # older months are archived; 0 = keep all
+ATTENDANCE_ARCHIVE_MODE = os.getenv("ATTENDANCE_ARCHIVE_MODE", "table").lower()  # 'table' or 'file'
+ATTENDANCE_ARCHIVE_DIR = os.getenv("ATTENDANCE_ARCHIVE_DIR", "data/attendance_archive")
+ATTENDANCE_ARCHIVE_CHECK_SEC = 60       # how long the dashboard trusts its view of what is archived
+
 
 # --- Models ---
 DLIB_LANDMARK_PATH = 'data/data_dlib/shape_predictor_68_face_landmarks.dat'
@@ -68,6 +143,12 @@ USE_CNN_DETECTOR_IF_AVAILABLE = True
 # --- Alignment ---
 ALIGN_FACE = True           # align faces using eye landmarks
 ALIGNED_SIZE = 150          # square output size for alignment
+# 'legacy': rotate the full frame, crop, re-run landmarks on the crop (original behaviour)
+# 'chip':   dlib face-chip warp of the face region only, reusing the first landmarks.
+#           Faster; rebuild the gallery (features_extraction_to_csv.py) after switching.
+ALIGN_MODE = os.getenv("ALIGN_MODE", "legacy")
+FACE_CHIP_SIZE = 150        # dlib's ResNet expects 150x150 chips
+FACE_CHIP_PADDING = 0.25
 
 # --- Quality filters (per-face ROI) ---
 CHECK_QUALITY = True
@@ -76,10 +157,17 @@ MIN_BRIGHTNESS = 40         # min mean pixel
 MAX_BRIGHTNESS = 210        # max mean pixel
 
 # --- Embedding/Matching ---
+EMBED_BATCH_SIZE = 32       # max face chips per batched descriptor call (offline extraction)
 DISTANCE_METRIC = 'cosine'  # 'euclidean' or 'cosine'
 THRESHOLD_EUCLIDEAN = 0.60
 THRESHOLD_COSINE = 0.35
 
+# --- Approximate gallery index (very large galleries) ---
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "data/features_all.ivf.npz")
+ANN_MIN_GALLERY_SIZE = 20000  # below this, exact batched search is fast enough
+ANN_NLIST = 0                 # coarse k-means clusters; 0 = ~4*sqrt(gallery size)
+ANN_TARGET_RECALL = float(os.getenv("ANN_TARGET_RECALL", "0.99"))  # recall@1 vs exact search
+
 # Require N consecutive positive matches before considering "recognized"
 MIN_CONSEC_MATCHES = 2
 
@@ -96,5 +184,40 @@ CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", "0"))
 FRAME_SIZE = (640, 480)
 CSV_PATH = os.getenv("CSV_PATH", "data/features_all.csv")
 
+# --- Face tracking (identity cached per track between reclassifications) ---
+TRACK_IOU_THRESHOLD = 0.3       # min IoU to continue a track
+TRACK_MAX_MISSED = 5            # frames a track survives without a detection
+TRACK_MIN_CONFIDENCE = 0.5      # below this the track is re-embedded immediately
+USE_CORRELATION_TRACKER = False # dlib correlation tracker for position prediction/confidence
+TRACK_PSR_GOOD = 7.0            # correlation peak-to-sidelobe ratio treated as full confidence
+
+# --- Attendance delivery (recognizer -> Producer Service) ---
+PRODUCER_API_URL = os.getenv("PRODUCER_API_URL", "http://127.0.0.1:5001/api/v1/log_attendance")
+# Batch endpoint used when it is available; empty string = always send one mark per request
+PRODUCER_BATCH_API_URL = os.getenv("PRODUCER_BATCH_API_URL", PRODUCER_API_URL + "_batch")
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "data/attendance_outbox.db")  # durable local outbox (SQLite)
+DISPATCH_BATCH_SIZE = 50          # outbox rows sent per delivery round (and per batch request)
+DISPATCH_LINGER_MS = 20           # wait for more marks before a delivery round
+DISPATCH_TIMEOUT_SEC = 2
+DISPATCH_BACKOFF_BASE_SEC = 1     # retry delay doubles per failed round...
+DISPATCH_BACKOFF_MAX_SEC = 60     # ...up to this cap
+
+# --- Threaded capture pipeline ---
+USE_PIPELINE = os.getenv("USE_PIPELINE", "True").lower() == "true"  # False = original serial loop
+CAPTURE_QUEUE_DEPTH = 1     # frames held between grabber and recognizer; older ones are dropped
+RENDER_QUEUE_DEPTH = 2      # recognized frames waiting for display
+PIPELINE_STATS_INTERVAL_SEC = 5
+
+# --- Multi-camera supervisor (multi_camera.py) ---
+MULTI_CAMERA_REPORT_SEC = 10          # how often per-stream health is logged
+MULTI_CAMERA_STALE_SEC = 30           # no stats for this long marks a stream STALLED
+MULTI_CAMERA_RESTART_DELAY_SEC = 5    # back-off before restarting a dead worker
+MULTI_CAMERA_SHOW_WINDOWS = os.getenv("MULTI_CAMERA_SHOW_WINDOWS", "False").lower() == "true"
+
+# --- Gallery storage ---
+GALLERY_PATH = os.getenv("GALLERY_PATH", "data/features_all.bin")   # memory-mapped binary gallery
+GALLERY_DTYPE = os.getenv("GALLERY_DTYPE", "float32")   # 'float16' halves size but is upcast (copied) on load
+EXPORT_FEATURES_CSV = os.getenv("EXPORT_FEATURES_CSV", "False").lower() == "true"  # also write CSV_PATH
+
 # --- Logging/UI ---
 SHOW_DEBUG = os.getenv("SHOW_DEBUG", "False").lower() == "true"
@@ -1,11 +1,38 @@
 import mysql.connector
 from mysql.connector.errors import InterfaceError
 import redis
+import os
+import sys
 import time
 import json
 import ssl
-from datetime import datetime  # Import datetime class for parsing
-from config import VALKEY_CONFIG, MYSQL_CONFIG, VALKEY_STREAM_NAME, VALKEY_GROUP_NAME, VALKEY_CONSUMER_NAME
+import uuid
+import socket
+import queue
+import argparse
+import threading
+import multiprocessing as mp
+import stream_codec
+import stream_partitions
+import summary_tables
+from roster_cache import RosterCache
+from config import (
+    VALKEY_CONFIG, MYSQL_CONFIG, VALKEY_GROUP_NAME, VALKEY_CONSUMER_NAME, VALKEY_COMMITS_STREAM, COMMITS_STREAM_MAXLEN,
+    CONSUMER_WORKERS, CONSUMER_CLAIM_IDLE_MS, CONSUMER_CLAIM_INTERVAL_SEC, CONSUMER_CLAIM_COUNT,
+    CONSUMER_IDLE_DELETE_MS, CONSUMER_BATCH_MIN, CONSUMER_BATCH_MAX, CONSUMER_TARGET_COMMIT_MS,
+    CONSUMER_INSERT_ROWS, CONSUMER_BACKLOG_SAMPLE_SEC, CONSUMER_STATS_SEC,
+    SUMMARY_TABLES_ENABLED, SUMMARY_DEADLOCK_RETRIES
+)
+
+INSERT_PREFIX = "INSERT INTO attendance (roll_no, name, class_id, time, date) VALUES "
+INSERT_ROW = "(%s, %s, %s, %s, %s)"
+INSERT_SUFFIX = " ON DUPLICATE KEY UPDATE name=VALUES(name)"
+
+# Streams this worker follows: every partition (and the unpartitioned stream while it drains)
+STREAMS = stream_partitions.readable_streams()
+
+# Per-process student name cache (each worker process warms its own)
+roster = RosterCache()
 
 
 # --- Connection Helper Functions ---
@@ -43,111 +70,234 @@ def get_valkey_client():
         return None
 
 
+def make_consumer_name():
+    """Unique consumer name within the group: host, pid and a random suffix."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+# --- Adaptive Batching ---
+
+class BatchSizer:
+    """AIMD batch size: grows while there is a backlog and commits are fast, halves when slow.
+
+    The writer reports each commit's latency; backlog is the group's undelivered lag
+    (XINFO GROUPS), or XLEN minus pending on servers that do not report lag.
+    """
+
+    def __init__(self, low=CONSUMER_BATCH_MIN, high=CONSUMER_BATCH_MAX, target_ms=CONSUMER_TARGET_COMMIT_MS):
+        self.low, self.high, self.target_ms = low, high, target_ms
+        self.size = low
+        self.backlog = 0
+        self._next_sample = 0.0
+
+    def observe_commit(self, rows, elapsed_ms):
+        if elapsed_ms > self.target_ms:
+            self.size = max(self.low, self.size // 2)
+        elif self.backlog > self.size and rows >= self.size:
+            # Full batch, fast commit and more waiting: double (multiplicative) to catch up quickly
+            self.size = min(self.high, self.size * 2)
+        # Otherwise keep the size: it is only an upper bound, reads never wait to fill a batch
+
+    def sample_backlog(self, r):
+        if time.time() < self._next_sample:
+            return
+        self._next_sample = time.time() + CONSUMER_BACKLOG_SAMPLE_SEC
+        try:
+            backlog = 0
+            for stream in STREAMS:
+                groups = r.xinfo_groups(stream)
+                group = next((g for g in groups if g['name'] in (VALKEY_GROUP_NAME, VALKEY_GROUP_NAME.encode())),
+                             None)
+                if group is not None and group.get('lag') is not None:
+                    backlog += int(group['lag'])
+                else:
+                    backlog += max(0, r.xlen(stream) - r.xpending(stream, VALKEY_GROUP_NAME)['pending'])
+            self.backlog = backlog
+        except redis.exceptions.RedisError as e:
+            print(f" [VALKEY] Backlog sample failed: {e}")
+
+
 # --- Main Consumer Logic ---
 
-def process_messages(r, mysql_conn):
-    """Reads messages, writes batch to DB, and ACKs them."""
+def read_messages(r, consumer_name, count, block_ms=10000):
+    """Reads up to `count` new messages for this consumer from all partitions in one XREADGROUP.
 
-    # 1. Read messages from the stream
+    Returns (stream, msg_id, data) tuples. COUNT applies per stream, so the budget is split
+    between partitions and a busy partition cannot starve the others.
+    """
     messages = r.xreadgroup(
         groupname=VALKEY_GROUP_NAME,
-        consumername=VALKEY_CONSUMER_NAME,
-        streams={VALKEY_STREAM_NAME: '>'},
-        count=10,  # Batch processing size
-        block=10000
+        consumername=consumer_name,
+        streams={stream: '>' for stream in STREAMS},
+        count=max(1, count // len(STREAMS)),
+        block=block_ms
     )
+    return [(stream, msg_id, data) for stream, entries in messages or [] for msg_id, data in entries]
+
 
-    if not messages:
+def prefetch_reader(r, consumer_name, sizer, batches, stop_event, connect=get_valkey_client):
+    """Reader thread: fetches the next batch while the writer commits the previous one.
+
+    `batches` holds at most one ready batch, so at any time one batch is being written,
+    one is waiting and the reader is filling the next. If the connection drops, the
+    reader opens its own new client with `connect`.
+    """
+    while not stop_event.is_set():
+        if r is None:
+            r = connect()
+            if r is None:
+                time.sleep(2)
+                continue
+        try:
+            sizer.sample_backlog(r)
+            stream_data = read_messages(r, consumer_name, sizer.size)
+        except redis.exceptions.ConnectionError as e:
+            print(f" [VALKEY] Stream reader lost its connection: {e}. Reconnecting...")
+            r = None
+            time.sleep(2)
+            continue
+        except redis.exceptions.RedisError as e:
+            print(f" [VALKEY] Stream read failed: {e}. Retrying...")
+            time.sleep(2)
+            continue
+        while stream_data and not stop_event.is_set():
+            try:
+                batches.put(stream_data, timeout=1.0)
+                break
+            except queue.Full:
+                continue
+
+
+def reclaim_stale(r, mysql_conn, consumer_name):
+    """Take over entries left pending by crashed or stopped consumers and process them.
+
+    XAUTOCLAIM moves entries idle for at least CONSUMER_CLAIM_IDLE_MS to this consumer;
+    the scan walks the whole pending list once.
+    """
+    claimed = 0
+    for stream in STREAMS:
+        cursor = '0-0'
+        while True:
+            reply = r.xautoclaim(stream, VALKEY_GROUP_NAME, consumer_name, min_idle_time=CONSUMER_CLAIM_IDLE_MS,
+                                 start_id=cursor, count=CONSUMER_CLAIM_COUNT)
+            cursor, entries = reply[0], reply[1]
+            # Entries trimmed from the stream while pending come back without data; nothing to write
+            gone = [msg_id for msg_id, data in entries if not data]
+            if gone:
+                r.xack(stream, VALKEY_GROUP_NAME, *gone)
+            stream_data = [(stream, msg_id, data) for msg_id, data in entries if data]
+            if stream_data:
+                claimed += len(stream_data)
+                write_batch(r, mysql_conn, stream_data)
+            if cursor in (b'0-0', '0-0'):
+                break
+    if claimed:
+        print(f" [RECLAIM] {consumer_name} took over {claimed} stale pending messages.")
+
+
+def remove_idle_consumers(r, consumer_name):
+    """Delete group members that own no pending entries and have been idle a long time."""
+    for stream in STREAMS:
+        for info in r.xinfo_consumers(stream, VALKEY_GROUP_NAME):
+            name = info['name'].decode() if isinstance(info['name'], bytes) else info['name']
+            if name != consumer_name and info['pending'] == 0 and info['idle'] >= CONSUMER_IDLE_DELETE_MS:
+                r.xgroup_delconsumer(stream, VALKEY_GROUP_NAME, name)
+                print(f" [VALKEY] Removed idle consumer '{name}' from {stream}.")
+
+
+def insert_records(cursor, records):
+    """Multi-row INSERT, CONSUMER_INSERT_ROWS rows per statement (one round trip each)."""
+    for start in range(0, len(records), CONSUMER_INSERT_ROWS):
+        chunk = records[start:start + CONSUMER_INSERT_ROWS]
+        query = INSERT_PREFIX + ", ".join([INSERT_ROW] * len(chunk)) + INSERT_SUFFIX
+        cursor.execute(query, [value for record in chunk for value in record])
+
+
+def store_records(cursor, records):
+    """Inserts records and, for the ones not stored before, updates the summary tables.
+    Runs inside the caller's transaction; rows are written in primary-key order."""
+    records = sorted(records, key=summary_tables.record_key)
+    if not SUMMARY_TABLES_ENABLED:
+        insert_records(cursor, records)
         return
+    new_keys = summary_tables.lock_new_records(cursor, records)
+    insert_records(cursor, records)
+    summary_tables.apply_deltas(cursor, new_keys)
 
-    stream_data = messages[0][1]
 
+def commit_records(mysql_conn, records, retries=SUMMARY_DEADLOCK_RETRIES):
+    """store_records + commit as one transaction, retried when MySQL picks it as a deadlock victim."""
+    for attempt in range(retries + 1):
+        cursor = mysql_conn.cursor()
+        try:
+            store_records(cursor, records)
+            mysql_conn.commit()
+            return
+        except mysql.connector.Error as e:
+            mysql_conn.rollback()
+            if e.errno not in summary_tables.DEADLOCK_ERRNOS or attempt == retries:
+                raise
+            print(f" [DB] Lock conflict ({e.errno}), retrying batch ({attempt + 1}/{retries}).")
+            time.sleep(0.05 * (attempt + 1))
+        finally:
+            cursor.close()
+
+
+def write_batch(r, mysql_conn, stream_data, sizer=None):
+    """Writes a batch of (stream, msg_id, data) entries to MySQL and ACKs them after commit.
+
+    Returns the number of records committed.
+    """
     # Prepare data structures
     records_to_insert = []
     message_ids_to_ack = []
 
-    # 1.1 Collect all roll numbers for batch name lookup
-    roll_numbers = []
-    for msg_id, data in stream_data:
+    # 1. Decode every entry once (compact or legacy format, see stream_codec)
+    marks = []
+    for stream, msg_id, data in stream_data:
         try:
-            payload = {k.decode('utf-8'): v.decode('utf-8') for k, v in data.items()}
-            roll_numbers.append(payload['roll_no'])
-            message_ids_to_ack.append(msg_id)
+            marks.append(stream_codec.decode(data))
+            message_ids_to_ack.append((stream, msg_id))
         except Exception as e:
             print(f" [!!!] Failed to parse message ID {msg_id}: {e}. Skipping and NOT ACKNOWLEDGING.")
 
-    if not roll_numbers:
-        return
+    if not marks:
+        return 0
 
-    # 2. Batch Lookup Student Names
-    name_lookup = {}
+    # 2. Batch Lookup Student Names (cached; misses go to MySQL in one query)
     try:
-        cursor = mysql_conn.cursor()
-        # Create a placeholder string for the query: (%s, %s, ...)
-        placeholders = ', '.join(['%s'] * len(roll_numbers))
-
-        # Get names for all rolls in the current batch
-        lookup_query = f"SELECT roll_no, name FROM students WHERE roll_no IN ({placeholders})"
-        cursor.execute(lookup_query, roll_numbers)
-
-        for roll_no, name in cursor.fetchall():
-            name_lookup[roll_no] = name
-        cursor.close()
+        name_lookup = roster.get_many(mysql_conn, [mark.roll_no for mark in marks])
     except mysql.connector.Error as e:
         print(f" [!!!] MySQL Name Lookup FAILED: {e}. Cannot process batch.")
         # Rollback is not strictly necessary here, but we exit the function without ACK
-        return
-
-    # 3. Prepare Batch Data for Insertion (Iterate over the stream data again)
-    for msg_id, data in stream_data:
-        try:
-            payload = {k.decode('utf-8'): v.decode('utf-8') for k, v in data.items()}
-            roll_no = payload['roll_no']
-
-            # --- FIX: Parse and format timestamp for MySQL DATE/TIME types ---
-            full_timestamp = payload['timestamp']
-
-            # Parse the ISO 8601 string into a datetime object
-            dt_object = datetime.fromisoformat(full_timestamp)
-
-            # Format to MySQL DATE ('YYYY-MM-DD') and TIME ('HH:MM:SS')
-            attendance_date = dt_object.strftime('%Y-%m-%d')
-            attendance_time = dt_object.strftime('%H:%M:%S')
-
-            student_name = name_lookup.get(roll_no, "Unknown Student")
-
-            # Prepare data tuple for MySQL executemany
-            records_to_insert.append((
-                roll_no,
-                student_name,  # Insert name from lookup
-                payload['class_id'],
-                attendance_time,
-                attendance_date
-            ))
-            # message_ids_to_ack is already populated
-
-        except Exception as e:
-            print(f" [!!!] Failed to process message ID {msg_id} during parsing: {e}. Skipping.")
-            # We don't remove the message ID from message_ids_to_ack yet, we handle failure in the next step
+        return 0
+
+    # 3. Prepare Batch Data for Insertion; DATE/TIME strings come straight from the mark
+    for mark in marks:
+        records_to_insert.append((
+            mark.roll_no,
+            name_lookup.get(mark.roll_no, "Unknown Student"),  # Insert name from lookup
+            mark.class_id,
+            mark.time,
+            mark.date
+        ))
 
     # 4. Write Batch to MySQL
     if records_to_insert:
         try:
-            cursor = mysql_conn.cursor()
-            # Ensure your table structure matches this INSERT statement
-            insert_query = """
-            INSERT INTO attendance
-            (roll_no, name, class_id, time, date)
-            VALUES (%s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE name=VALUES(name)
-            """
-            cursor.executemany(insert_query, records_to_insert)
-            mysql_conn.commit()
-            cursor.close()
-
-            # 5. Acknowledge messages only after successful DB commit
-            r.xack(VALKEY_STREAM_NAME, VALKEY_GROUP_NAME, *message_ids_to_ack)
-            print(f" [SUCCESS] Committed {len(records_to_insert)} records and acknowledged messages.")
+            started = time.perf_counter()
+            # Attendance rows and summary deltas commit together (table layout: INSERT_PREFIX / INSERT_ROW)
+            commit_records(mysql_conn, records_to_insert)
+            if sizer is not None:
+                sizer.observe_commit(len(records_to_insert), (time.perf_counter() - started) * 1000.0)
+
+            # 5. Acknowledge messages only after successful DB commit (one XACK per partition)
+            ack_pipe = r.pipeline(transaction=False)
+            for stream in dict.fromkeys(stream for stream, _ in message_ids_to_ack):
+                ack_pipe.xack(stream, VALKEY_GROUP_NAME, *[m for s, m in message_ids_to_ack if s == stream])
+            publish_commits(ack_pipe, records_to_insert)
+            ack_pipe.execute()
+            return len(records_to_insert)
 
         except mysql.connector.Error as e:
             print(f" [!!!] MySQL Batch Insert FAILED: {e}. Data remains in stream for retry.")
@@ -155,40 +305,131 @@ def process_messages(r, mysql_conn):
             mysql_conn.rollback()  # Ensure transaction is clean
         except Exception as e:
             print(f" [!!!] General error during batch write: {e}")
+    return 0
+
 
+def publish_commits(pipe, records):
+    """Announce the (class_id, date) pairs of committed records on VALKEY_COMMITS_STREAM, so the
+    dashboard drops cached views only once the rows are actually in MySQL."""
+    pairs = sorted({(int(class_id), str(day)) for _, _, class_id, _, day in records})
+    if pairs:
+        pipe.xadd(VALKEY_COMMITS_STREAM, stream_codec.encode_commits(pairs),
+                  maxlen=COMMITS_STREAM_MAXLEN, approximate=True)
 
-def start_consumer():
+
+def start_consumer(consumer_name=None):
     """Main consumer loop that manages connections."""
+    consumer_name = consumer_name or VALKEY_CONSUMER_NAME or make_consumer_name()
+    print(f" [*] Consumer '{consumer_name}' joining group '{VALKEY_GROUP_NAME}'.")
     r = None
     mysql_conn = None
+    next_claim = 0.0
+    sizer = BatchSizer()
+    batches = queue.Queue(maxsize=1)
+    stop_event = threading.Event()
+    reader = None
+    committed, next_stats = 0, time.time() + CONSUMER_STATS_SEC
 
     while True:
         # 1. Connect/Reconnect Valkey
         if r is None:
             r = get_valkey_client()
             if r:
-                # Initialize the Consumer Group (id='0' means start reading from beginning)
-                try:
-                    r.xgroup_create(name=VALKEY_STREAM_NAME, groupname=VALKEY_GROUP_NAME, id='0', mkstream=True)
-                    print(f" [VALKEY] Consumer group '{VALKEY_GROUP_NAME}' created.")
-                except redis.exceptions.ResponseError as e:
-                    if 'BUSYGROUP' in str(e):
-                        print(f" [VALKEY] Consumer group '{VALKEY_GROUP_NAME}' already exists.")
-                    else:
-                        print(f" [VALKEY] Error creating group: {e}")
+                # Initialize the Consumer Group on every partition (id='0' means start reading from beginning)
+                for stream in STREAMS:
+                    try:
+                        r.xgroup_create(name=stream, groupname=VALKEY_GROUP_NAME, id='0', mkstream=True)
+                        print(f" [VALKEY] Consumer group '{VALKEY_GROUP_NAME}' created on {stream}.")
+                    except redis.exceptions.ResponseError as e:
+                        if 'BUSYGROUP' in str(e):
+                            print(f" [VALKEY] Consumer group '{VALKEY_GROUP_NAME}' already exists on {stream}.")
+                        else:
+                            print(f" [VALKEY] Error creating group on {stream}: {e}")
 
         # 2. Connect/Reconnect MySQL
         if mysql_conn is None or not mysql_conn.is_connected():
             mysql_conn = get_mysql_connection()
+            if mysql_conn and roster.db_lookups == 0:
+                try:
+                    print(f" [DB] Roster cache warmed with {roster.warm(mysql_conn)} students.")
+                except mysql.connector.Error as e:
+                    print(f" [DB] Roster warm-up failed: {e}. Names will be fetched on demand.")
 
         # 3. Process messages only if both services are connected
         if r and mysql_conn:
-            process_messages(r, mysql_conn)
+            if time.time() >= next_claim:
+                next_claim = time.time() + CONSUMER_CLAIM_INTERVAL_SEC
+                try:
+                    reclaim_stale(r, mysql_conn, consumer_name)
+                    remove_idle_consumers(r, consumer_name)
+                except redis.exceptions.RedisError as e:
+                    print(f" [VALKEY] Pending-entry reclaim failed: {e}")
+
+            if reader is None:
+                reader = threading.Thread(target=prefetch_reader, name="stream-reader", daemon=True,
+                                          args=(r, consumer_name, sizer, batches, stop_event))
+                reader.start()
+            try:
+                stream_data = batches.get(timeout=1.0)
+            except queue.Empty:
+                stream_data = None
+            if stream_data:
+                committed += write_batch(r, mysql_conn, stream_data, sizer)
+
+            if time.time() >= next_stats:
+                print(f" [STATS] {committed / CONSUMER_STATS_SEC:.0f} records/s | batch size {sizer.size} | "
+                      f"backlog {sizer.backlog} | {roster.stats()}")
+                committed, next_stats = 0, time.time() + CONSUMER_STATS_SEC
         else:
             time.sleep(5)
             print(" [WARNING] Waiting for connections...")
 
 
+def worker_name(slot, base=VALKEY_CONSUMER_NAME):
+    """Consumer name for worker `slot`: "<VALKEY_CONSUMER_NAME>-<slot>", or None to let the
+    worker generate a unique one. Workers must never share a name within the group."""
+    return f"{base}-{slot}" if base else None
+
+
+def run_workers(count):
+    """Run `count` consumer processes in the same group and restart any that exit."""
+    procs = {}
+
+    def spawn(slot):
+        p = mp.Process(target=start_consumer, args=(worker_name(slot),), name=f"consumer-{slot}", daemon=True)
+        p.start()
+        procs[slot] = p
+
+    for slot in range(count):
+        spawn(slot)
+    print(f" [*] Started {count} consumer workers.")
+    try:
+        while True:
+            time.sleep(5)
+            for slot, p in list(procs.items()):
+                if not p.is_alive():
+                    # The replacement keeps the slot's name (or gets a new generated one);
+                    # the dead worker's pending entries are reclaimed either way
+                    print(f" [!!!] Consumer worker {slot} (pid {p.pid}) exited with code {p.exitcode}; restarting.")
+                    spawn(slot)
+    except KeyboardInterrupt:
+        print(" [*] Stopping consumer workers...")
+    finally:
+        for p in procs.values():
+            if p.is_alive():
+                p.terminate()
+        for p in procs.values():
+            p.join(timeout=5)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Attendance consumer: Valkey stream -> MySQL.")
+    parser.add_argument('--workers', type=int, default=CONSUMER_WORKERS,
+                        help="number of consumer processes to run in the group")
+    args = parser.parse_args(sys.argv[1:])
+
     print(f" [*] Starting Attendance Consumer Worker...")
-    start_consumer()
+    if args.workers > 1:
+        run_workers(args.workers)
+    else:
+        start_consumer()
@@ -0,0 +1,187 @@
+"""
+db_pool.py
+Bounded MySQL connection pool for the dashboard.
+
+Connections are opened lazily up to max_size and then reused, so a page load
+no longer pays a TLS handshake per query. The pool only uses the standard
+queue and threading primitives. Under eventlet's monkey patching (app.py)
+these become green, so a request waiting for a connection yields to the other
+greenlets instead of blocking the hub.
+
+mysql.connector's own pooling is not used because it fails immediately when
+the pool is empty. It also does no health checks and keeps no wait metrics.
+
+- A connection idle for longer than health_check_sec is pinged before reuse.
+  A dead connection is replaced transparently.
+- When all connections are busy, acquire() waits up to `timeout` seconds and
+  then raises PoolExhausted. Callers turn that into a 503 instead of letting
+  requests pile up.
+- stats() reports size, idle/in-use counts, and wait-time and timeout totals.
+"""
+
+import queue
+import threading
+import time
+
+import mysql.connector
+
+
+class PoolExhausted(Exception):
+    """No connection became free within the acquire timeout."""
+
+
+class PooledConnection:
+    """Wraps a pooled connection; close() hands it back to the pool instead of closing it."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql.connector.errors.OperationalError("Connection was returned to the pool.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    def __init__(self, connect_kwargs, max_size=8, timeout=2.0, health_check_sec=30):
+        self.connect_kwargs = dict(connect_kwargs)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_sec = health_check_sec
+        self._idle = queue.LifoQueue()  # (conn, last_used); LIFO keeps the warmest connections busy
+        self._lock = threading.Lock()
+        self._size = 0                  # open connections, idle or in use
+        self.acquired = 0
+        self.waited = 0                 # acquisitions that found no idle connection
+        self.wait_total_sec = 0.0
+        self.wait_max_sec = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    def _open(self):
+        conn = mysql.connector.connect(**self.connect_kwargs)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+        with self._lock:
+            self._size -= 1
+            self.discarded += 1
+
+    def _reserve(self):
+        with self._lock:
+            if self._size < self.max_size:
+                self._size += 1
+                return True
+        return False
+
+    def _healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.health_check_sec:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def acquire(self, timeout=None):
+        """Return a raw connection, waiting up to `timeout` seconds for one to free up."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        waited = False
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve():
+                    try:
+                        conn = self._open()
+                    except Exception:
+                        with self._lock:
+                            self._size -= 1
+                        raise
+                    break
+                waited = True
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise PoolExhausted(f"No MySQL connection free after {timeout}s ({self.max_size} in use).")
+                try:
+                    # Short slices, so a slot freed by a discarded connection is noticed as well
+                    conn, last_used = self._idle.get(timeout=min(remaining, 0.25))
+                except queue.Empty:
+                    continue
+            if self._healthy(conn, last_used):
+                break
+            # Dead connection: drop it and retry (the freed slot allows opening a new one)
+            self._discard(conn)
+
+        wait = time.monotonic() - started
+        with self._lock:
+            self.acquired += 1
+            if waited:
+                self.waited += 1
+            self.wait_total_sec += wait
+            self.wait_max_sec = max(self.wait_max_sec, wait)
+        return conn
+
+    def release(self, conn):
+        """Return a connection. Unread rows are drained and an open transaction is rolled back,
+        so the next user starts clean."""
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            if conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def connection(self, timeout=None):
+        """A pooled connection whose close() (or `with` exit) returns it to the pool."""
+        return PooledConnection(self, self.acquire(timeout))
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'wait_avg_ms': round(self.wait_total_sec / self.acquired * 1e3, 3) if self.acquired else 0.0,
+                'wait_max_ms': round(self.wait_max_sec * 1e3, 3),
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'discarded': self.discarded,
+            }
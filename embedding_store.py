@@ -0,0 +1,210 @@
+"""
+embedding_store.py
+Compact binary, memory-mapped gallery of face embeddings.
+
+Layout of the gallery file (little-endian):
+    [64-byte header][count x dim matrix, float32 or float16][count float32 row norms]
+    [roll/name table, UTF-8 TSV]
+The table is in the same file as the vectors, so replacing the file swaps
+both at once and a reader can never pair new names with old vectors.
+Version 1 files kept the table next to the gallery in "<gallery>.names.tsv";
+they are still readable.
+
+The matrix is opened with np.memmap, so startup parses only the header and
+the small name table, and every recognizer process on the machine shares
+one page-cache copy of the data. CSV stays available via import/export:
+
+    python embedding_store.py import data/features_all.csv
+    python embedding_store.py export data/features_all.csv
+"""
+
+import io
+import os
+import sys
+import csv
+import struct
+import logging
+import numpy as np
+
+from config import GALLERY_PATH, GALLERY_DTYPE, CSV_PATH
+
+MAGIC = b'AMSGALRY'
+VERSION = 2
+HEADER_SIZE = 64
+# magic, version, dtype code, dim, count, data offset, norms offset
+_HEADER_V1 = struct.Struct('<8sIIIQQQ')
+# ... then (version 2) table offset, table length
+_HEADER = struct.Struct('<8sIIIQQQQQ')
+_DTYPES = {1: np.dtype('<f4'), 2: np.dtype('<f2')}
+_DTYPE_CODES = {'float32': 1, 'float16': 2}
+
+
+def table_path(path):
+    """Path of the separate roll/name table of a version 1 gallery file."""
+    return path + '.names.tsv'
+
+
+class EmbeddingStore:
+    """Read-only view of a gallery: features (memory-mapped), row norms, roll numbers and names."""
+
+    def __init__(self, features, norms, roll_nos, names, path=None):
+        self.features = features
+        self.norms = norms
+        self.roll_nos = roll_nos
+        self.names = names
+        self.path = path
+
+    def __len__(self):
+        return len(self.roll_nos)
+
+    @classmethod
+    def open(cls, path=GALLERY_PATH):
+        """Map a gallery file without reading or copying the embedding matrix."""
+        # Everything is read through one file object, so a concurrent write()
+        # (which renames a new file over `path`) cannot mix two versions.
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError(f"Truncated gallery header: {path}")
+            magic, version, dtype_code, dim, count, data_off, norms_off = _HEADER_V1.unpack_from(header)
+            if magic != MAGIC:
+                raise ValueError(f"Not a gallery file: {path}")
+            if version not in (1, VERSION):
+                raise ValueError(f"Unsupported gallery version {version}: {path}")
+            if dtype_code not in _DTYPES:
+                raise ValueError(f"Unknown gallery dtype code {dtype_code}: {path}")
+
+            if version == 1:
+                roll_nos, names = _read_table(table_path(path))
+            else:
+                table_off, table_len = _HEADER.unpack_from(header)[7:]
+                f.seek(table_off)
+                table = f.read(table_len)
+                if len(table) != table_len:
+                    raise ValueError(f"Truncated gallery name table: {path}")
+                roll_nos, names = _parse_table(table.decode('utf-8'))
+            if len(roll_nos) != count:
+                raise ValueError(f"Gallery has {count} rows but name table has {len(roll_nos)}")
+
+            if count == 0:
+                features = np.empty((0, dim), dtype=_DTYPES[dtype_code])
+                norms = np.empty(0, dtype=np.float32)
+            else:
+                features = np.memmap(f, dtype=_DTYPES[dtype_code], mode='r', offset=data_off, shape=(count, dim))
+                norms = np.memmap(f, dtype='<f4', mode='r', offset=norms_off, shape=(count,))
+        return cls(features, norms, roll_nos, names, path=path)
+
+    @staticmethod
+    def write(path, features, roll_nos, names, dtype=GALLERY_DTYPE):
+        """Write a gallery atomically (temp file + rename) so readers never see a partial file.
+
+        Vectors, norms and names are all in the one file, so the rename swaps them together.
+        """
+        if dtype not in _DTYPE_CODES:
+            raise ValueError(f"Unsupported gallery dtype: {dtype}")
+        feats = np.asarray(features, dtype=np.float32)
+        if feats.size == 0:
+            feats = feats.reshape(0, 128)
+        count, dim = feats.shape
+        if count != len(roll_nos) or count != len(names):
+            raise ValueError("features, roll_nos and names must have the same length")
+
+        np_dtype = _DTYPES[_DTYPE_CODES[dtype]]
+        matrix = feats.astype(np_dtype)
+        # Norms of the stored (possibly float16-rounded) rows, so distances stay consistent
+        norms = np.linalg.norm(matrix.astype(np.float32), axis=1).astype('<f4')
+        table = _format_table(roll_nos, names).encode('utf-8')
+        data_off = HEADER_SIZE
+        norms_off = data_off + matrix.nbytes
+        table_off = norms_off + norms.nbytes
+        header = _HEADER.pack(MAGIC, VERSION, _DTYPE_CODES[dtype], dim, count, data_off, norms_off,
+                              table_off, len(table))
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            f.write(matrix.tobytes())
+            f.write(norms.tobytes())
+            f.write(table)
+        os.replace(tmp, path)
+
+
+def _parse_table(text):
+    rows = list(csv.reader(io.StringIO(text, newline=''), delimiter='\t'))
+    body = rows[1:] if rows and rows[0] == ['Roll_No', 'Name'] else rows
+    return [r[0] for r in body], [r[1] if len(r) > 1 else '' for r in body]
+
+
+def _read_table(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return _parse_table(f.read())
+
+
+def _format_table(roll_nos, names):
+    out = io.StringIO(newline='')
+    w = csv.writer(out, delimiter='\t')
+    w.writerow(['Roll_No', 'Name'])
+    for roll, name in zip(roll_nos, names):
+        w.writerow([roll, name])
+    return out.getvalue()
+
+
+def remove(path=GALLERY_PATH):
+    """Delete a gallery file and its version 1 name table if present."""
+    for p in (path, table_path(path)):
+        if os.path.isfile(p):
+            os.remove(p)
+
+
+def read_csv(csv_path=CSV_PATH):
+    """Read a features_all.csv file: returns (features, roll_nos, names)."""
+    roll_nos, names, feats = [], [], []
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header or header[:2] != ['Roll_No', 'Name']:
+            raise ValueError(f"CSV missing Roll_No/Name columns: {csv_path}")
+        for row in reader:
+            if not row:
+                continue
+            roll_nos.append(row[0])
+            names.append(row[1])
+            feats.append(row[2:])
+    return np.asarray(feats, dtype=np.float32).reshape(len(roll_nos), -1), roll_nos, names
+
+
+def write_csv(csv_path, features, roll_nos, names):
+    """Write the legacy features_all.csv layout (Roll_No, Name, feature_0..feature_127)."""
+    feats = np.asarray(features, dtype=np.float32)
+    dim = feats.shape[1] if feats.ndim == 2 else 128
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        cw = csv.writer(f)
+        cw.writerow(["Roll_No", "Name"] + [f"feature_{i}" for i in range(dim)])
+        for roll, name, emb in zip(roll_nos, names, feats):
+            cw.writerow([roll, name] + emb.tolist())
+
+
+def import_csv(csv_path=CSV_PATH, path=GALLERY_PATH, dtype=GALLERY_DTYPE):
+    feats, roll_nos, names = read_csv(csv_path)
+    EmbeddingStore.write(path, feats, roll_nos, names, dtype=dtype)
+    logging.info("Imported %d identities from %s into %s (%s)", len(roll_nos), csv_path, path, dtype)
+
+
+def export_csv(csv_path=CSV_PATH, path=GALLERY_PATH):
+    store = EmbeddingStore.open(path)
+    write_csv(csv_path, store.features, store.roll_nos, store.names)
+    logging.info("Exported %d identities from %s to %s", len(store), path, csv_path)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'export'):
+        print("Usage: python embedding_store.py import|export [csv_path] [gallery_path]")
+        sys.exit(1)
+    csv_arg = sys.argv[2] if len(sys.argv) > 2 else CSV_PATH
+    gallery_arg = sys.argv[3] if len(sys.argv) > 3 else GALLERY_PATH
+    if sys.argv[1] == 'import':
+        import_csv(csv_arg, gallery_arg)
+    else:
+        export_csv(csv_arg, gallery_arg)
@@ -22,7 +22,8 @@ from tkinter import font as tkFont, messagebox
 from PIL import Image, ImageTk
 import subprocess
 import mysql.connector
-from config import MYSQL_CONFIG
+from config import MYSQL_CONFIG, GALLERY_PATH, ANN_INDEX_PATH
+import embedding_store
 
 
 # For sound (works on Windows, fallback for other systems)
@@ -144,9 +145,12 @@ class Face_Register:
         features_csv = os.path.join('data', 'features_all.csv')
         if os.path.isfile(features_csv):
             os.remove(features_csv)
+        embedding_store.remove(GALLERY_PATH)
+        if os.path.isfile(ANN_INDEX_PATH):
+            os.remove(ANN_INDEX_PATH)
         self.label_cnt_face_in_database['text'] = "0"
         self.existing_faces_cnt = 0
-        self.log_all["text"] = "Face images and features_all.csv removed!"
+        self.log_all["text"] = "Face images and face gallery removed!"
         self.face_folder_created_flag = False
 
     def GUI_get_input_data(self):
@@ -0,0 +1,137 @@
+"""
+face_tracker.py
+Frame-to-frame face tracking so identities can be cached per track and the
+full embedding pass only runs every RECLASSIFY_INTERVAL frames.
+"""
+
+import itertools
+import dlib
+
+from config import (
+    RECLASSIFY_INTERVAL, MIN_CONSEC_MATCHES, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED,
+    TRACK_MIN_CONFIDENCE, USE_CORRELATION_TRACKER, TRACK_PSR_GOOD
+)
+
+
+def iou(a, b):
+    """Intersection-over-union of two dlib rectangles."""
+    ix = max(0, min(a.right(), b.right()) - max(a.left(), b.left()))
+    iy = max(0, min(a.bottom(), b.bottom()) - max(a.top(), b.top()))
+    inter = ix * iy
+    union = a.width() * a.height() + b.width() * b.height() - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    """One face followed across frames, with its cached identity."""
+
+    def __init__(self, track_id, rect):
+        self.track_id = track_id
+        self.rect = rect
+        self.missed = 0
+        self.confidence = 1.0      # how sure we are this is still the same face (0..1)
+        self.correlation = None    # optional dlib.correlation_tracker
+
+        # Cached identity
+        self.last_embed_frame = None
+        self.roll_no = None
+        self.name = None
+        self.distance = float('inf')
+        self.streak = 0            # consecutive embeddings that matched roll_no
+        self.marked = False        # attendance sent; recognition is skipped entirely
+
+    @property
+    def confirmed(self):
+        return self.roll_no is not None and self.streak >= MIN_CONSEC_MATCHES
+
+    def needs_embedding(self, frame_no):
+        """True if the cached identity must be refreshed on this frame."""
+        if self.marked:
+            return False
+        if self.last_embed_frame is None or self.confidence < TRACK_MIN_CONFIDENCE:
+            return True
+        # A tentative match is re-checked every frame until MIN_CONSEC_MATCHES confirms it
+        if self.roll_no is not None and not self.confirmed:
+            return True
+        return frame_no - self.last_embed_frame >= RECLASSIFY_INTERVAL
+
+    def update_identity(self, roll_no, name, distance, is_match, frame_no):
+        self.last_embed_frame = frame_no
+        self.distance = distance
+        if is_match:
+            self.streak = self.streak + 1 if roll_no == self.roll_no else 1
+            self.roll_no, self.name = roll_no, name
+        else:
+            self.streak = 0
+            self.roll_no, self.name = None, None
+
+
+class FaceTracker:
+    """Greedy IoU tracker, optionally assisted by dlib correlation trackers.
+
+    With correlation tracking enabled each track predicts its own position
+    before matching, and the tracker's peak-to-sidelobe ratio becomes the
+    track confidence; otherwise the confidence is the IoU between the
+    previous box and the new detection.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_missed=TRACK_MAX_MISSED,
+                 use_correlation=USE_CORRELATION_TRACKER):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.use_correlation = use_correlation
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def _start_correlation(self, track, img_rgb, rect):
+        track.correlation = dlib.correlation_tracker()
+        track.correlation.start_track(img_rgb, rect)
+
+    def update(self, img_rgb, rects):
+        """Associate this frame's detections with tracks; returns one Track per rect, in order."""
+        predicted = []
+        for track in self.tracks:
+            if track.correlation is not None:
+                psr = track.correlation.update(img_rgb)
+                pos = track.correlation.get_position()
+                predicted.append(dlib.rectangle(int(pos.left()), int(pos.top()), int(pos.right()), int(pos.bottom())))
+                track.confidence = min(1.0, psr / TRACK_PSR_GOOD)
+            else:
+                predicted.append(track.rect)
+
+        pairs = sorted(
+            ((iou(p, r), ti, ri) for ti, p in enumerate(predicted) for ri, r in enumerate(rects)),
+            reverse=True
+        )
+        assigned = [None] * len(rects)
+        used_tracks = set()
+        for score, ti, ri in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in used_tracks or assigned[ri] is not None:
+                continue
+            track = self.tracks[ti]
+            if track.correlation is None:
+                track.confidence = score
+            elif score < 0.5:
+                # Correlation tracker drifted from the detector; re-seed it
+                self._start_correlation(track, img_rgb, rects[ri])
+            track.rect = rects[ri]
+            track.missed = 0
+            assigned[ri] = track
+            used_tracks.add(ti)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.missed += 1
+
+        for ri, rect in enumerate(rects):
+            if assigned[ri] is None:
+                track = Track(next(self._ids), rect)
+                if self.use_correlation:
+                    self._start_correlation(track, img_rgb, rect)
+                self.tracks.append(track)
+                assigned[ri] = track
+
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        return assigned
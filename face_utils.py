@@ -13,6 +13,7 @@ from typing import Tuple, Optional
 from config import (
     DLIB_LANDMARK_PATH, DLIB_RECOG_MODEL_PATH, DLIB_CNN_DETECTOR_PATH,
     UPSAMPLE_DET, USE_CNN_DETECTOR_IF_AVAILABLE, ALIGN_FACE, ALIGNED_SIZE,
+    ALIGN_MODE, FACE_CHIP_SIZE, FACE_CHIP_PADDING,
     CHECK_QUALITY, MIN_LAPLACIAN_VAR, MIN_BRIGHTNESS, MAX_BRIGHTNESS,
     DISTANCE_METRIC, THRESHOLD_EUCLIDEAN, THRESHOLD_COSINE, SHOW_DEBUG
 )
@@ -122,15 +123,67 @@ def align_face(img_rgb, shape, output_size=ALIGNED_SIZE):
     return cv2.resize(crop, (output_size, output_size))
 
 
-def compute_embedding(img_rgb, rect):
-    """Compute 128D face embedding for a given rect."""
+def prepare_chips(img_rgb, rects, mode=ALIGN_MODE):
+    """Landmark and align each face; returns (shapes, chips, chip_shapes).
+
+    shapes are the landmarks on the input frame (for liveness and quality
+    code). In 'legacy' mode each chip comes from rotating the whole frame and
+    needs a second landmark pass (chip_shapes). In 'chip' mode dlib warps
+    only the face region from the first landmarks into a 150x150 chip, and
+    chip_shapes is None.
+    """
     _load_models()
-    shape = predictor(img_rgb, rect)
-    aligned = align_face(img_rgb, shape, output_size=ALIGNED_SIZE)
-    h, w = aligned.shape[:2]
-    aligned_rect = dlib.rectangle(0, 0, w, h)
-    emb = face_reco_model.compute_face_descriptor(aligned, predictor(aligned, aligned_rect))
-    return np.array(emb, dtype=np.float32), shape, aligned
+    shapes = [predictor(img_rgb, rect) for rect in rects]
+    if mode == 'chip':
+        if not shapes:
+            return shapes, [], None
+        dets = dlib.full_object_detections()
+        for shape in shapes:
+            dets.append(shape)
+        return shapes, dlib.get_face_chips(img_rgb, dets, size=FACE_CHIP_SIZE, padding=FACE_CHIP_PADDING), None
+
+    chips, chip_shapes = [], []
+    for shape in shapes:
+        aligned = align_face(img_rgb, shape, output_size=ALIGNED_SIZE)
+        h, w = aligned.shape[:2]
+        chips.append(aligned)
+        chip_shapes.append(predictor(aligned, dlib.rectangle(0, 0, w, h)))
+    return shapes, chips, chip_shapes
+
+
+def embed_chips(chips, chip_shapes):
+    """Compute (N,128) embeddings for aligned chips with a single batched descriptor call.
+
+    chip_shapes=None means the chips are already dlib face chips (see prepare_chips).
+    """
+    _load_models()
+    if not len(chips):
+        return np.empty((0, 128), dtype=np.float32)
+    if chip_shapes is None:
+        descs = face_reco_model.compute_face_descriptor(list(chips))
+        return np.array(descs, dtype=np.float32).reshape(len(chips), 128)
+
+    batch_faces = []
+    for shape in chip_shapes:
+        dets = dlib.full_object_detections()
+        dets.append(shape)
+        batch_faces.append(dets)
+    descs = face_reco_model.compute_face_descriptor(chips, batch_faces)
+    return np.array([d[0] for d in descs], dtype=np.float32).reshape(len(chips), 128)
+
+
+def compute_embeddings_batch(img_rgb, rects, mode=ALIGN_MODE):
+    """Compute embeddings for every rect in a frame; returns (embs (N,128), shapes, chips)."""
+    if not rects:
+        return np.empty((0, 128), dtype=np.float32), [], []
+    shapes, chips, chip_shapes = prepare_chips(img_rgb, rects, mode=mode)
+    return embed_chips(chips, chip_shapes), shapes, chips
+
+
+def compute_embedding(img_rgb, rect, mode=ALIGN_MODE):
+    """Compute 128D face embedding for a given rect."""
+    embs, shapes, chips = compute_embeddings_batch(img_rgb, [rect], mode=mode)
+    return embs[0], shapes[0], chips[0]
 
 
 def image_quality_ok(img_rgb, rect):
@@ -3,7 +3,6 @@
 
 import os
 import dlib
-import csv
 import numpy as np
 import logging
 import cv2
@@ -12,7 +11,10 @@ from datetime import datetime
 import hashlib
 
 from config import DLIB_LANDMARK_PATH, DLIB_RECOG_MODEL_PATH, CSV_PATH, ALIGNED_SIZE, MIN_LAPLACIAN_VAR, MIN_BRIGHTNESS, MAX_BRIGHTNESS
-from face_utils import detect_faces, compute_embedding
+from config import ANN_INDEX_PATH, ANN_MIN_GALLERY_SIZE, GALLERY_PATH, EXPORT_FEATURES_CSV, EMBED_BATCH_SIZE, ALIGN_MODE
+from face_utils import detect_faces, prepare_chips, embed_chips
+from ann_index import IVFIndex
+from embedding_store import EmbeddingStore, write_csv
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -49,6 +51,11 @@ def save_processing_metadata(metadata):
     with open(metadata_file, 'w') as f:
         json.dump(metadata, f, indent=2)
 
+def can_reuse(entry, folder_hash, align_mode=ALIGN_MODE):
+    """True if a saved metadata entry was computed from the same images with the same alignment."""
+    # Entries saved before align_mode was recorded all used 'legacy' alignment
+    return entry.get('hash') == folder_hash and entry.get('align_mode', 'legacy') == align_mode
+
 def extract_roll_name_from_folder(folder_name):
     roll_no = "UNKNOWN"; person_name = "UNKNOWN"
     parts = folder_name.split('_', 1)
@@ -64,7 +71,11 @@ def extract_roll_name_from_folder(folder_name):
             roll_no = "UNKNOWN_ROLL"
     return roll_no, person_name
 
-def features_from_image(path_img):
+def chip_from_image(path_img):
+    """Aligned chip + chip landmarks for the largest face in an image, or None if unusable.
+
+    The landmarks are None in ALIGN_MODE 'chip' (see face_utils.prepare_chips).
+    """
     img_bgr = cv2.imread(path_img)
     if img_bgr is None:
         return None
@@ -73,13 +84,40 @@ def features_from_image(path_img):
     if not rects:
         return None
     rect = max(rects, key=lambda r: (r.right()-r.left())*(r.bottom()-r.top()))
-    emb, shape, aligned = compute_embedding(img_rgb, rect)
-    gray = cv2.cvtColor(cv2.cvtColor(aligned, cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2GRAY)
+    _, chips, chip_shapes = prepare_chips(img_rgb, [rect])
+    # Quality gate on the aligned chip before paying for the descriptor
+    gray = cv2.cvtColor(chips[0], cv2.COLOR_RGB2GRAY)
     blur = cv2.Laplacian(gray, cv2.CV_64F).var()
     mean = gray.mean()
     if blur < MIN_LAPLACIAN_VAR or mean < MIN_BRIGHTNESS or mean > MAX_BRIGHTNESS:
         return None
-    return emb
+    return chips[0], None if chip_shapes is None else chip_shapes[0]
+
+def features_from_images(paths):
+    """Embeddings for all usable images, computed EMBED_BATCH_SIZE chips per descriptor call."""
+    chips, chip_shapes = [], []
+    for path_img in paths:
+        res = chip_from_image(path_img)
+        if res is not None:
+            chips.append(res[0])
+            chip_shapes.append(res[1])
+    if chip_shapes and chip_shapes[0] is None:
+        chip_shapes = None  # dlib face chips: embed_chips needs no landmarks
+    embs = [embed_chips(chips[i:i + EMBED_BATCH_SIZE],
+                        None if chip_shapes is None else chip_shapes[i:i + EMBED_BATCH_SIZE])
+            for i in range(0, len(chips), EMBED_BATCH_SIZE)]
+    return np.concatenate(embs) if embs else np.empty((0, 128), dtype=np.float32)
+
+def build_ann_index(feats, roll_nos):
+    """Build the IVF index for large galleries; drop a stale one for small galleries."""
+    if len(roll_nos) < ANN_MIN_GALLERY_SIZE:
+        if os.path.exists(ANN_INDEX_PATH):
+            os.remove(ANN_INDEX_PATH)
+            logging.info("Gallery below %d identities; removed stale index %s", ANN_MIN_GALLERY_SIZE, ANN_INDEX_PATH)
+        return
+    index = IVFIndex.build(feats, roll_nos=roll_nos)
+    index.save(ANN_INDEX_PATH)
+    logging.info("Saved IVF index (nlist=%d, nprobe=%d) to %s", index.nlist, index.nprobe, ANN_INDEX_PATH)
 
 def main():
     os.makedirs("data", exist_ok=True)
@@ -96,8 +134,8 @@ def main():
         folder_path = os.path.join(path_images_from_camera, folder_name)
         h = get_folder_hash(folder_path)
 
-        # FULL SKIP if hash matches metadata
-        if folder_name in metadata and metadata[folder_name].get('hash') == h:
+        # FULL SKIP if images and ALIGN_MODE match metadata
+        if folder_name in metadata and can_reuse(metadata[folder_name], h):
             logging.info("Skipping %s (unchanged, using previous record)", folder_name)
             # reuse old embedding data
             roll = metadata[folder_name]['roll_no']
@@ -106,16 +144,15 @@ def main():
             rows.append([roll, name] + embedding)
             updated_metadata[folder_name] = metadata[folder_name]
             continue
+        if folder_name in metadata and metadata[folder_name].get('hash') == h:
+            logging.info("Recomputing %s (saved with ALIGN_MODE=%s, now %s)", folder_name,
+                         metadata[folder_name].get('align_mode', 'legacy'), ALIGN_MODE)
 
         roll, name = extract_roll_name_from_folder(folder_name)
-        embs = []
-        for fn in os.listdir(folder_path):
-            if fn.lower().endswith(('.png', '.jpg', '.jpeg')):
-                emb = features_from_image(os.path.join(folder_path, fn))
-                if emb is not None:
-                    embs.append(emb)
-
-        if embs:
+        embs = features_from_images([os.path.join(folder_path, fn) for fn in os.listdir(folder_path)
+                                     if fn.lower().endswith(('.png', '.jpg', '.jpeg'))])
+
+        if len(embs):
             mean_emb = np.mean(embs, axis=0).tolist()
             rows.append([roll, name] + mean_emb)
             updated_metadata[folder_name] = {
@@ -124,22 +161,25 @@ def main():
                 'roll_no': roll,
                 'name': name,
                 'images_used': len(embs),
+                'align_mode': ALIGN_MODE,
                 'embedding': mean_emb
             }
             logging.info("%s -> %d images processed", folder_name, len(embs))
         else:
             logging.warning("%s -> no valid images", folder_name)
 
-    # Save CSV
-    header = ["Roll_No", "Name"] + [f"feature_{i}" for i in range(128)]
-    with open(CSV_PATH, 'w', newline='') as f:
-        cw = csv.writer(f)
-        cw.writerow(header)
-        for r in rows:
-            cw.writerow(r)
+    # Save binary gallery (and optionally the legacy CSV)
+    feats = np.array([r[2:] for r in rows], dtype=np.float32).reshape(len(rows), 128)
+    roll_nos = [r[0] for r in rows]
+    names = [r[1] for r in rows]
+    EmbeddingStore.write(GALLERY_PATH, feats, roll_nos, names)
+    if EXPORT_FEATURES_CSV:
+        write_csv(CSV_PATH, feats, roll_nos, names)
 
     save_processing_metadata(updated_metadata)
-    logging.info("Saved %d identities to %s", len(rows), CSV_PATH)
+    logging.info("Saved %d identities to %s%s", len(rows), GALLERY_PATH,
+                 f" and {CSV_PATH}" if EXPORT_FEATURES_CSV else "")
+    build_ann_index(feats, roll_nos)
 
 if __name__ == '__main__':
     main()
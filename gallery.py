@@ -0,0 +1,98 @@
+"""
+gallery.py
+Batched matching of face embeddings against the enrolled gallery.
+"""
+
+import numpy as np
+
+from config import DISTANCE_METRIC, THRESHOLD_EUCLIDEAN, THRESHOLD_COSINE
+
+_EPS = 1e-8
+
+
+class GalleryMatcher:
+    """Scores a batch of query embeddings against every enrolled identity at once.
+
+    Row norms of the gallery are computed once at load time (or taken from
+    the embedding store), so a frame costs one matrix product instead of one
+    Python-level comparison per enrolled student. The gallery matrix itself
+    is used as given: a memory-mapped float32 store is never copied. An
+    optional ann_index.IVFIndex built for the same gallery replaces the
+    exact scan.
+    """
+
+    def __init__(self, features, roll_nos, names, metric=DISTANCE_METRIC, index=None, norms=None):
+        if metric not in ('cosine', 'euclidean'):
+            raise ValueError(f"Unsupported distance metric: {metric}")
+        self.metric = metric
+        self.threshold = THRESHOLD_COSINE if metric == 'cosine' else THRESHOLD_EUCLIDEAN
+        self.roll_nos = list(roll_nos)
+        self.names = list(names)
+
+        # No-op for float32 arrays/memmaps; float16 stores are upcast once here
+        feats = np.asarray(features, dtype=np.float32)
+        if feats.size == 0:
+            feats = feats.reshape(0, 128)
+        if feats.ndim != 2 or feats.shape[0] != len(self.roll_nos):
+            raise ValueError(f"Gallery shape {feats.shape} does not match {len(self.roll_nos)} identities")
+
+        if norms is None:
+            norms = np.linalg.norm(feats, axis=1)
+        norms = np.asarray(norms, dtype=np.float32)
+        self._gallery = feats
+        self._inv_norms = 1.0 / (norms + _EPS)
+        self._sq_norms = norms * norms
+
+        self.index = None
+        if index is not None:
+            self.attach_index(index)
+
+    def attach_index(self, index):
+        """Use an approximate index for search; it must cover this gallery and metric."""
+        if index.metric != self.metric:
+            raise ValueError(f"Index metric '{index.metric}' does not match matcher metric '{self.metric}'")
+        if not index.matches_gallery(self.roll_nos):
+            raise ValueError("Index was built for a different gallery; rebuild it")
+        self.index = index
+
+    def __len__(self):
+        return self._gallery.shape[0]
+
+    def distances(self, queries):
+        """Return an (N, G) matrix of distances between N queries and the G gallery rows."""
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.metric == 'cosine':
+            q = q / (np.linalg.norm(q, axis=1, keepdims=True) + _EPS)
+            return 1.0 - (q @ self._gallery.T) * self._inv_norms[None, :]
+        # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g
+        q_sq = np.einsum('ij,ij->i', q, q)[:, None]
+        d2 = q_sq + self._sq_norms[None, :] - 2.0 * (q @ self._gallery.T)
+        return np.sqrt(np.maximum(d2, 0.0))
+
+    def search(self, queries, k=1):
+        """Return (indices, distances), both (N, k), sorted nearest-first for each query."""
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n = len(self)
+        if n == 0 or q.shape[0] == 0:
+            return np.empty((q.shape[0], 0), dtype=np.int64), np.empty((q.shape[0], 0), dtype=np.float32)
+
+        k = min(k, n)
+        if self.index is not None:
+            return self.index.search(q, k)
+
+        d = self.distances(q)
+        if k < n:
+            idx = np.argpartition(d, k - 1, axis=1)[:, :k]
+        else:
+            idx = np.broadcast_to(np.arange(n), d.shape).copy()
+        part = np.take_along_axis(d, idx, axis=1)
+        order = np.argsort(part, axis=1)
+        return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+    def match(self, queries, k=1):
+        """Return one list per query of (roll_no, name, distance) hits, nearest first."""
+        idx, dist = self.search(queries, k)
+        return [
+            [(self.roll_nos[i], self.names[i], float(d)) for i, d in zip(row_idx, row_dist) if i >= 0]
+            for row_idx, row_dist in zip(idx, dist)
+        ]
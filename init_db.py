@@ -1,9 +1,34 @@
+"""
+init_db.py
+Creates and upgrades the database schema through versioned migrations.
+
+Applied versions are recorded in schema_migrations, and each run applies only
+the missing ones, in order. Every step is idempotent (IF NOT EXISTS, or an
+existence check first), so a run interrupted between a DDL statement and its
+version row can simply be repeated. Safe on a live database:
+- A named lock (GET_LOCK) keeps two runs from migrating at the same time.
+- Indexes are added with ALGORITHM=INPLACE, LOCK=NONE. Reads and writes
+  continue during the build; a server that cannot do this fails the step
+  instead of locking the table.
+- lock_wait_timeout is short, so an ALTER waiting for its metadata lock
+  gives up instead of queueing every dashboard query behind it.
+
+    python init_db.py            # apply pending migrations
+    python init_db.py --status   # list applied and pending migrations
+
+Check the dashboard's query plans with `python query_plans.py`.
+"""
+
+import sys
+
 from db_config import get_connection
+import summary_tables
 
-def init_database():
-    conn = get_connection()
-    cursor = conn.cursor()
+MIGRATION_LOCK = 'attendance_schema_migrations'
+DDL_LOCK_WAIT_SEC = 10
 
+
+def create_base_tables(cursor):
     # Create students table
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS students (
@@ -34,6 +59,84 @@ def init_database():
     )
     """)
 
+
+def index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1
+    """, (table, index))
+    return cursor.fetchone() is not None
+
+
+def add_index(table, index, columns):
+    """Migration step: online ADD INDEX, skipped if the index already exists."""
+    def step(cursor):
+        if index_exists(cursor, table, index):
+            print(f"   {table}.{index} already exists.")
+            return
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns}), ALGORITHM=INPLACE, LOCK=NONE")
+        print(f"   Added {table}.{index} ({columns}).")
+    return step
+
+
+# (version, description, steps); append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, "base tables", [create_base_tables]),
+    (2, "summary tables", [summary_tables.create_tables]),
+    (3, "dashboard indexes", [
+        # class_trend, per-class session counts and class/date filters; roll_no makes it covering
+        add_index('attendance', 'idx_class_date_roll', 'class_id, date, roll_no'),
+        # date-range filters across all classes
+        add_index('attendance', 'idx_date', 'date'),
+        add_index('class_sessions', 'idx_date', 'date'),
+    ]),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(100),
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {version for (version,) in cursor.fetchall()}
+
+
+def migrate(conn):
+    """Apply pending migrations in order. Returns the versions applied."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 60)", (MIGRATION_LOCK,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("Another migration run holds the lock; try again later.")
+    done = []
+    try:
+        cursor.execute("SET SESSION lock_wait_timeout = %s", (DDL_LOCK_WAIT_SEC,))
+        applied = applied_versions(cursor)
+        for version, name, steps in MIGRATIONS:
+            if version in applied:
+                continue
+            print(f" → Migration {version}: {name}")
+            for step in steps:
+                step(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            done.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchone()
+        cursor.close()
+    return done
+
+
+def init_database():
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    done = migrate(conn)
+
     # Insert default classes if not already there
     cursor.execute("""
     INSERT INTO classes (class_name)
@@ -43,7 +146,20 @@ def init_database():
 
     conn.commit()
     conn.close()
-    print("✅ Tables created and classes inserted successfully.")
+    print(f"✅ Schema up to date ({len(done)} migration(s) applied) and classes inserted successfully.")
+
+
+def print_status():
+    conn = get_connection()
+    cursor = conn.cursor()
+    applied = applied_versions(cursor)
+    for version, name, _ in MIGRATIONS:
+        print(f"{version:4d}  {'applied' if version in applied else 'PENDING':8s}  {name}")
+    conn.close()
+
 
 if __name__ == "__main__":
-    init_database()
+    if "--status" in sys.argv[1:]:
+        print_status()
+    else:
+        init_database()
@@ -0,0 +1,267 @@
+"""
+multi_camera.py
+Supervisor that runs one recognizer worker process per (camera source, class_id)
+pair on a single machine.
+
+- dlib models are loaded once in the supervisor and inherited by the workers
+  at fork time (copy-on-write), instead of being loaded once per camera.
+- The embedding gallery and its IVF index are copied once into a shared-memory
+  block that every worker maps; only the small roll/name lists are per process.
+- Each worker keeps its own outbox file (camera_outbox_path).
+- Workers push pipeline stats to the supervisor, which logs per-stream FPS,
+  latency, health and memory, and restarts workers that die.
+
+Usage:
+    python multi_camera.py --stream 0 1 --stream rtsp://10.0.0.12/stream 2
+"""
+
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config import (
+    MULTI_CAMERA_REPORT_SEC, MULTI_CAMERA_STALE_SEC, MULTI_CAMERA_RESTART_DELAY_SEC,
+    MULTI_CAMERA_SHOW_WINDOWS, OUTBOX_PATH
+)
+import face_utils
+from attendance_taker import FaceRecognizer
+from ann_index import IVFIndex
+from gallery import GalleryMatcher
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def parse_source(source):
+    """Camera sources given as digits are device indices; anything else is a URL or path."""
+    return int(source) if str(source).isdigit() else source
+
+
+def _open_shared(name):
+    try:
+        # Python 3.13+: attaching processes must not unlink the block on exit
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _memory_mb():
+    """Proportional set size of this process in MB (shared pages split between sharers), if available."""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def _aligned(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+class SharedGallery:
+    """Gallery matrix, row norms and the IVF index arrays (if any) in one shared-memory block,
+    plus picklable metadata.
+
+    layout maps each array name to (offset, shape, dtype). Only small values (roll/name lists,
+    index metric and nprobe) are pickled into the workers; no vector data is copied per process.
+    """
+
+    def __init__(self, shm_name, layout, roll_nos, names, index_meta=None):
+        self.shm_name = shm_name
+        self.layout = layout
+        self.count, self.dim = layout['features'][1]
+        self.roll_nos = roll_nos
+        self.names = names
+        self.index_meta = index_meta  # (metric, nprobe) when the index arrays are in the block
+
+    @classmethod
+    def create(cls, features, roll_nos, names, index=None):
+        feats = np.asarray(features, dtype=np.float32)
+        arrays = {'features': feats, 'norms': np.linalg.norm(feats, axis=1).astype(np.float32)}
+        index_meta = None
+        if index is not None:
+            arrays.update(centroids=index.centroids, offsets=index.offsets, ids=index.ids,
+                          vectors=index.vectors, sq_norms=index.sq_norms)
+            index_meta = (index.metric, index.nprobe)
+
+        layout, size = {}, 0
+        for name, array in arrays.items():
+            offset = _aligned(size)
+            layout[name] = (offset, array.shape, array.dtype.str)
+            size = offset + array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        for name, array in arrays.items():
+            offset, shape, dtype = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = array
+        return cls(shm.name, layout, list(roll_nos), list(names), index_meta=index_meta), shm
+
+    def attach(self):
+        """Map the shared block; returns (shm, matcher). Keep shm referenced while matching."""
+        shm = _open_shared(self.shm_name)
+        views = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                 for name, (offset, shape, dtype) in self.layout.items()}
+        index = None
+        if self.index_meta is not None:
+            metric, nprobe = self.index_meta
+            index = IVFIndex(views['centroids'], views['offsets'], views['ids'], views['vectors'], metric,
+                             nprobe=nprobe, roll_nos=self.roll_nos, sq_norms=views['sq_norms'])
+        matcher = GalleryMatcher(views['features'], self.roll_nos, self.names, norms=views['norms'], index=index)
+        return shm, matcher
+
+
+def camera_outbox_path(slot, base=OUTBOX_PATH):
+    """Outbox file for the camera in position `slot`, e.g. data/attendance_outbox.cam0.db.
+
+    Each worker needs its own SQLite outbox. The path depends only on the slot, so a restarted
+    worker picks up the marks its predecessor left unsent.
+    """
+    root, ext = os.path.splitext(base)
+    return f"{root}.cam{slot}{ext}"
+
+
+def camera_worker(stream_id, source, class_id, gallery, stats_queue, show_window, outbox_path):
+    """Worker process body: attach the shared gallery and run one recognizer."""
+    logging.info("[%s] worker pid %d starting (class %s, outbox %s)", stream_id, os.getpid(), class_id, outbox_path)
+    # shm must stay referenced for as long as the matcher's arrays are in use
+    shm, matcher = gallery.attach()
+    recognizer = FaceRecognizer(class_id, matcher=matcher, show_window=show_window, outbox_path=outbox_path)
+
+    def publish(snapshot):
+        snapshot['pid'] = os.getpid()
+        snapshot['memory_mb'] = _memory_mb()
+        try:
+            stats_queue.put_nowait((stream_id, snapshot))
+        except queue.Full:
+            pass
+
+    recognizer.stats_sink = publish
+    recognizer.run(source=parse_source(source))
+
+
+class CameraSupervisor:
+    """Spawns, monitors and restarts one worker process per camera stream."""
+
+    def __init__(self, streams, show_window=MULTI_CAMERA_SHOW_WINDOWS):
+        self.streams = [(f"cam{i}:{src}", src, int(cid), camera_outbox_path(i))
+                        for i, (src, cid) in enumerate(streams)]
+        self.show_window = show_window
+        if 'fork' in mp.get_all_start_methods():
+            self.ctx = mp.get_context('fork')
+        else:
+            logging.warning("fork is unavailable on this platform; each worker will load its own dlib models.")
+            self.ctx = mp.get_context('spawn')
+        self.stats_queue = self.ctx.Queue(maxsize=1000)
+        self.procs = {}
+        self.last_stats = {}
+        self.restart_at = {}
+        self.gallery = None
+        self._shm = None
+
+    def load(self):
+        """Load models and gallery once, before any worker is forked."""
+        face_utils._load_models()
+        loader = FaceRecognizer(class_id=0)
+        if not loader.get_face_database() or loader.matcher is None:
+            raise RuntimeError("Face DB not available or malformed. Run features_extraction_to_csv.py first.")
+        self.gallery, self._shm = SharedGallery.create(
+            loader.face_features_known_list, loader.face_roll_no_known_list,
+            loader.face_name_known_list, index=loader.matcher.index)
+        logging.info("Shared gallery of %d identities in %s (%.1f MB)", self.gallery.count,
+                     self.gallery.shm_name, self._shm.size / 1e6)
+
+    def _start(self, stream_id, source, class_id, outbox_path):
+        p = self.ctx.Process(target=camera_worker, name=stream_id, daemon=True,
+                             args=(stream_id, source, class_id, self.gallery, self.stats_queue, self.show_window,
+                                   outbox_path))
+        p.start()
+        self.procs[stream_id] = (p, source, class_id, outbox_path, time.time())
+
+    def _drain_stats(self):
+        while True:
+            try:
+                stream_id, snapshot = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.last_stats[stream_id] = snapshot
+
+    def _check_workers(self):
+        now = time.time()
+        for stream_id, (p, source, class_id, outbox_path, started) in list(self.procs.items()):
+            if p.is_alive():
+                continue
+            if stream_id not in self.restart_at:
+                logging.error("[%s] worker exited with code %s; restarting in %ds",
+                              stream_id, p.exitcode, MULTI_CAMERA_RESTART_DELAY_SEC)
+                self.restart_at[stream_id] = now + MULTI_CAMERA_RESTART_DELAY_SEC
+            elif now >= self.restart_at[stream_id]:
+                del self.restart_at[stream_id]
+                self._start(stream_id, source, class_id, outbox_path)
+
+    def health(self, stream_id):
+        p, _, _, _, started = self.procs[stream_id]
+        snap = self.last_stats.get(stream_id)
+        if not p.is_alive():
+            return 'DEAD'
+        last = snap['time'] if snap and snap['time'] >= started else started
+        return 'STALLED' if time.time() - last > MULTI_CAMERA_STALE_SEC else 'OK'
+
+    def report(self):
+        total_mb = 0.0
+        for stream_id, (p, source, class_id, _, _) in self.procs.items():
+            snap = self.last_stats.get(stream_id) or {}
+            mem = snap.get('memory_mb')
+            total_mb += mem or 0.0
+            logging.info("[%s] class=%s pid=%s %s fps=%.1f (cap %.1f) latency=%.0fms frames=%d marks=%d mem=%s",
+                         stream_id, class_id, p.pid, self.health(stream_id),
+                         snap.get('render_fps', 0.0), snap.get('capture_fps', 0.0),
+                         snap.get('latency_ms', 0.0), snap.get('frames', 0), snap.get('marks', 0),
+                         f"{mem:.0f}MB" if mem is not None else "n/a")
+        if total_mb:
+            logging.info("[supervisor] %d streams, total worker PSS %.0f MB", len(self.procs), total_mb)
+
+    def run(self):
+        self.load()
+        try:
+            for stream_id, source, class_id, outbox_path in self.streams:
+                self._start(stream_id, source, class_id, outbox_path)
+            next_report = time.time() + MULTI_CAMERA_REPORT_SEC
+            while True:
+                time.sleep(0.5)
+                self._drain_stats()
+                self._check_workers()
+                if time.time() >= next_report:
+                    self.report()
+                    next_report = time.time() + MULTI_CAMERA_REPORT_SEC
+        except KeyboardInterrupt:
+            logging.info("Stopping all camera workers...")
+        finally:
+            for p, *_ in self.procs.values():
+                if p.is_alive():
+                    p.terminate()
+            for p, *_ in self.procs.values():
+                p.join(timeout=5)
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one recognizer per camera with a shared gallery.")
+    parser.add_argument('--stream', nargs=2, action='append', metavar=('SOURCE', 'CLASS_ID'), required=True,
+                        help="camera index or URL, and the class_id it takes attendance for")
+    parser.add_argument('--show', action='store_true', help="open a preview window per camera")
+    args = parser.parse_args(argv)
+    CameraSupervisor(args.stream, show_window=args.show or MULTI_CAMERA_SHOW_WINDOWS).run()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
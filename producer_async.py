@@ -0,0 +1,205 @@
+"""
+producer_async.py
+asyncio version of the Producer Service (same endpoints and responses as
+producer_service.py), served by aiohttp on top of redis.asyncio.
+
+Concurrent requests do not each pay a Valkey round trip: XADDs issued
+within PRODUCER_COALESCE_MS of each other are collected by XaddCoalescer
+and written as one pipeline, and every request then gets its own message ID.
+
+Run with:
+    PRODUCER_SERVER=async python producer_service.py
+"""
+
+import asyncio
+import logging
+
+import redis
+import redis.asyncio as aioredis
+from aiohttp import web
+
+from config import (
+    PRODUCER_MAX_BATCH, VALKEY_POOL_SIZE, PRODUCER_COALESCE_MS, PRODUCER_COALESCE_MAX
+)
+from producer_service import (
+    valkey_connection_kwargs, validate_mark, queue_command, record_reply, is_known_duplicate, ENQUEUE_ONCE_LUA
+)
+
+UNAVAILABLE = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+
+
+class XaddCoalescer:
+    """Merges mark enqueues that arrive close together into a single pipelined round trip."""
+
+    def __init__(self, client, window_ms=PRODUCER_COALESCE_MS, max_batch=PRODUCER_COALESCE_MAX):
+        self.client = client
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        self.flushes = 0
+        self.items = 0
+
+    async def xadd(self, payload):
+        """Queue one mark and wait for its message ID, or None if it was a duplicate.
+
+        Raises whatever the pipeline raised for this item.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._flush(batch))
+
+    async def _flush(self, batch):
+        self.flushes += 1
+        self.items += len(batch)
+        try:
+            replies = await self._execute([payload for payload, _ in batch])
+        except Exception as e:
+            replies = [e] * len(batch)
+        for (_, future), reply in zip(batch, replies):
+            if future.done():
+                continue
+            if isinstance(reply, Exception):
+                future.set_exception(reply)
+            else:
+                future.set_result(reply)
+
+    async def _execute(self, payloads):
+        """Async twin of producer_service.queue_marks."""
+        pipe = self.client.pipeline(transaction=False)
+        for payload in payloads:
+            queue_command(pipe, payload)
+        replies = await pipe.execute(raise_on_error=False)
+
+        missing = [i for i, r in enumerate(replies) if isinstance(r, redis.exceptions.NoScriptError)]
+        if missing:
+            await self.client.script_load(ENQUEUE_ONCE_LUA)
+            pipe = self.client.pipeline(transaction=False)
+            for i in missing:
+                queue_command(pipe, payloads[i])
+            for i, reply in zip(missing, await pipe.execute(raise_on_error=False)):
+                replies[i] = reply
+        return replies
+
+
+def _json(body, status):
+    return web.json_response(body, status=status)
+
+
+async def log_attendance(request):
+    """Receives attendance data and publishes it to the Valkey Stream via the coalescer."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    payload, error = validate_mark(data)
+    if error:
+        return _json({'status': 'error', 'message': error}, 400)
+    if is_known_duplicate(payload):
+        return _json({'status': 'duplicate', 'message': 'Already marked today'}, 200)
+    try:
+        message_id = await request.app['coalescer'].xadd(payload)
+    except UNAVAILABLE as e:
+        logging.error(f" [!] Valkey unavailable: {e}")
+        return _json({'status': 'error', 'message': 'Queue service unavailable'}, 503)
+    except Exception as e:
+        logging.error(f" [!] Error during attendance processing: {e}")
+        return _json({'status': 'error', 'message': 'Internal queueing error'}, 500)
+    if record_reply(payload, message_id) == 'duplicate':
+        return _json({'status': 'duplicate', 'message': 'Already marked today'}, 200)
+    logging.debug(" [x] Sent message ID: %s for Roll No: %s", message_id.decode(), payload.roll_no)
+    return _json({'status': 'success', 'message': 'Attendance queued'}, 202)
+
+
+async def log_attendance_batch(request):
+    """Batch endpoint; the marks join whatever other XADDs are being coalesced."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    marks = data.get('marks') if isinstance(data, dict) else data
+    if not isinstance(marks, list) or not marks:
+        return _json({'status': 'error', 'message': 'Expected a non-empty list of marks'}, 400)
+    if len(marks) > PRODUCER_MAX_BATCH:
+        return _json({'status': 'error', 'message': f'Batch too large (max {PRODUCER_MAX_BATCH} marks)'}, 413)
+
+    results = [None] * len(marks)
+    valid = []
+    for i, mark in enumerate(marks):
+        payload, error = validate_mark(mark)
+        if error:
+            results[i] = {'status': 'invalid', 'message': error}
+        elif is_known_duplicate(payload):
+            results[i] = {'status': 'duplicate'}
+        else:
+            valid.append((i, payload))
+
+    coalescer = request.app['coalescer']
+    replies = await asyncio.gather(*(coalescer.xadd(p) for _, p in valid), return_exceptions=True)
+    if replies and all(isinstance(r, UNAVAILABLE) for r in replies):
+        return _json({'status': 'error', 'message': 'Queue service unavailable'}, 503)
+    for (i, payload), reply in zip(valid, replies):
+        outcome = record_reply(payload, reply)
+        if outcome == 'error':
+            results[i] = {'status': 'error', 'message': 'Internal queueing error'}
+        elif outcome == 'duplicate':
+            results[i] = {'status': 'duplicate'}
+        else:
+            results[i] = {'status': 'queued', 'id': reply.decode()}
+
+    queued = sum(1 for r in results if r['status'] == 'queued')
+    duplicates = sum(1 for r in results if r['status'] == 'duplicate')
+    status = 'success' if queued + duplicates == len(marks) else 'partial'
+    return _json({'status': status, 'queued': queued, 'duplicates': duplicates, 'results': results},
+                 202 if status == 'success' else 207)
+
+
+async def _open_valkey(app):
+    pool = aioredis.BlockingConnectionPool(
+        connection_class=aioredis.SSLConnection,
+        max_connections=VALKEY_POOL_SIZE,
+        **valkey_connection_kwargs()
+    )
+    app['valkey'] = aioredis.Redis(connection_pool=pool)
+    app['coalescer'] = XaddCoalescer(app['valkey'])
+
+
+async def _close_valkey(app):
+    coalescer = app['coalescer']
+    if coalescer.flushes:
+        logging.info(" [VALKEY] %d marks in %d pipelines (avg %.1f per round trip)",
+                     coalescer.items, coalescer.flushes, coalescer.items / coalescer.flushes)
+    close = getattr(app['valkey'], 'aclose', None) or app['valkey'].close  # aclose() since redis-py 5
+    await close()
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_post('/api/v1/log_attendance', log_attendance)
+    app.router.add_post('/api/v1/log_attendance_batch', log_attendance_batch)
+    app.on_startup.append(_open_valkey)
+    app.on_cleanup.append(_close_valkey)
+    return app
+
+
+def run(host, port):
+    web.run_app(create_app(), host=host, port=port, access_log=None)
+
+
+if __name__ == '__main__':
+    import os
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    run(os.getenv("HOST", "127.0.0.1"), int(os.getenv("PORT", 5001)))
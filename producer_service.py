@@ -1,12 +1,17 @@
 import os
 from flask import Flask, request, jsonify
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import redis
-import json
 import ssl
-import time
+import hashlib
 import logging  # Added logging
-from config import VALKEY_CONFIG, VALKEY_STREAM_NAME
+import stream_codec
+import stream_partitions
+from config import (
+    VALKEY_CONFIG, PRODUCER_MAX_BATCH, VALKEY_POOL_SIZE, VALKEY_SOCKET_TIMEOUT_SEC,
+    VALKEY_HEALTH_CHECK_SEC, PRODUCER_SERVER, PRODUCER_THREADS, DEDUP_ENABLED, DEDUP_KEY_PREFIX,
+    DEDUP_GRACE_SEC, DEDUP_LOCAL_MAX
+)
 
 # Set up logging for the producer
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,75 +21,293 @@ app = Flask(__name__)
 
 
 # --- Valkey Client Initialization ---
-def get_valkey_client():
-    """Returns a connected Redis/Valkey client, or None on failure."""
-    try:
+def valkey_connection_kwargs():
+    """Connection settings shared by the sync pool here and the asyncio pool in producer_async.py."""
+    return dict(
+        host=VALKEY_CONFIG['host'],
+        port=VALKEY_CONFIG['port'],
+        password=VALKEY_CONFIG['password'],
         # Aiven Valkey/Redis usually uses 'redis-py' with SSL
-        r = redis.Redis(
-            host=VALKEY_CONFIG['host'],
-            port=VALKEY_CONFIG['port'],
-            password=VALKEY_CONFIG['password'],
-            ssl=True,
-            ssl_cert_reqs=ssl.CERT_REQUIRED,
-            ssl_ca_certs=VALKEY_CONFIG['ssl_ca_certs'],
-            decode_responses=False  # Keep stream data as bytes for efficiency
-        )
-        r.ping()
-        logging.info(" [VALKEY] Producer client connected successfully.")
-        return r
-    except Exception as e:
-        logging.error(f" [!] Valkey connection failed: {e}")
-        return None
+        ssl_cert_reqs=ssl.CERT_REQUIRED,
+        ssl_ca_certs=VALKEY_CONFIG['ssl_ca_certs'],
+        socket_timeout=VALKEY_SOCKET_TIMEOUT_SEC,
+        socket_connect_timeout=VALKEY_SOCKET_TIMEOUT_SEC,
+        # Idle connections are re-checked before reuse; busy ones never pay for a PING
+        health_check_interval=VALKEY_HEALTH_CHECK_SEC,
+        decode_responses=False,  # Keep stream data as bytes for efficiency
+    )
 
 
-# Global Valkey client instance
-valkey_client = get_valkey_client()
+def get_valkey_client():
+    """Returns a Redis/Valkey client backed by a shared connection pool.
 
+    Connections are opened lazily on first use. A connection that fails is
+    dropped by the pool and replaced on the next command, so requests do not
+    need a PING probe first.
+    """
+    pool = redis.BlockingConnectionPool(
+        connection_class=redis.SSLConnection,
+        max_connections=VALKEY_POOL_SIZE,
+        timeout=VALKEY_SOCKET_TIMEOUT_SEC,  # wait this long for a free connection
+        **valkey_connection_kwargs()
+    )
+    return redis.Redis(connection_pool=pool)
 
-@app.route('/api/v1/log_attendance', methods=['POST'])
-def log_attendance():
-    """Receives attendance data and publishes it instantly to the Valkey Stream."""
-    global valkey_client
 
-    # Check if Valkey client is available, try reconnecting if needed
-    if valkey_client is None or not valkey_client.ping():
-        valkey_client = get_valkey_client()
-        if valkey_client is None:
-            # Critical failure, cannot queue message
-            return jsonify({'status': 'error', 'message': 'Queue service unavailable'}), 503
+# Global Valkey client instance (thread-safe; shared by all request threads)
+valkey_client = get_valkey_client()
+
 
+def validate_mark(data):
+    """Returns (stream_codec.Mark, None) for a valid mark, or (None, error message)."""
+    if not isinstance(data, dict):
+        return None, 'Mark must be a JSON object'
+    roll_no = data.get('roll_no')
+    class_id = data.get('class_id')
+
+    if not roll_no or not class_id:
+        return None, 'Missing Roll No or Class ID'
     try:
-        data = request.json
-        roll_no = data.get('roll_no')
-        class_id = data.get('class_id')
+        class_id = int(class_id)
+    except (TypeError, ValueError):
+        return None, 'Invalid Class ID'
+    if not 1 <= class_id <= stream_codec.MAX_CLASS_ID:
+        return None, 'Invalid Class ID'
+
+    # Devices replaying an offline outbox send the original capture time
+    now = datetime.now()
+    timestamp = data.get('timestamp')
+    if timestamp:
+        try:
+            timestamp = datetime.fromisoformat(str(timestamp))
+        except ValueError:
+            return None, 'Invalid timestamp'
+        # Accepted only while the mark's dedup key can exist: from DEDUP_GRACE_SEC ahead of the
+        # server clock back to DEDUP_GRACE_SEC after the end of the mark's day. An older mark
+        # would get an already-expired key and pass dedup on every replay.
+        wall = timestamp.replace(tzinfo=None)
+        day_end = datetime.combine(wall.date(), datetime.min.time()) + timedelta(days=1)
+        grace = timedelta(seconds=DEDUP_GRACE_SEC)
+        if wall > now + grace or now > day_end + grace:
+            return None, 'Timestamp outside the accepted window'
+    else:
+        timestamp = now
+
+    return stream_codec.make_mark(roll_no, class_id, timestamp), None
+
+
+# --- Duplicate suppression ---
+# One mark per (roll_no, class_id, date) enters the stream. The SET NX on a per-day key
+# and the XADD run atomically in Valkey, so concurrent producers cannot both enqueue.
+# The dedup key carries the stream name as its hash tag ({<stream>}), so on a Valkey cluster
+# it hashes to the same slot as the stream and the script does not fail with CROSSSLOT.
+ENQUEUE_ONCE_LUA = """
+-- KEYS[1] = per-day dedup key, KEYS[2] = stream
+-- ARGV[1] = dedup key expiry (unix time), ARGV[2..] = field/value pairs
+if redis.call('SET', KEYS[1], '1', 'NX') then
+    redis.call('EXPIREAT', KEYS[1], ARGV[1])
+    return redis.call('XADD', KEYS[2], '*', unpack(ARGV, 2))
+end
+return false
+"""
+ENQUEUE_ONCE_SHA = hashlib.sha1(ENQUEUE_ONCE_LUA.encode()).hexdigest()
+
+
+class SeenMarks:
+    """Dedup keys this process has already seen confirmed by Valkey, so repeats skip the round trip.
+
+    Valkey stays the source of truth; this is only a shortcut. It is cleared when the
+    day changes or it grows past max_entries.
+    """
+
+    def __init__(self, max_entries=DEDUP_LOCAL_MAX):
+        self.max_entries = max_entries
+        self._keys = set()
+        self._day = date.today()
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def add(self, key):
+        today = date.today()
+        if today != self._day or len(self._keys) >= self.max_entries:
+            self._keys = set()
+            self._day = today
+        self._keys.add(key)
+
+
+seen_marks = SeenMarks()
+
+
+def dedup_key(payload):
+    """Per-day key for a validated mark; the day comes from the mark's own timestamp.
+
+    A key without braces hashes as a whole, so the tag {<stream>} puts this key in the
+    stream's cluster slot.
+    """
+    stream = stream_partitions.stream_for(payload.class_id)
+    return f"{DEDUP_KEY_PREFIX}:{{{stream}}}:{payload.date}:{payload.class_id}:{payload.roll_no}"
 
-        if not roll_no or not class_id:
-            return jsonify({'status': 'error', 'message': 'Missing Roll No or Class ID'}), 400
 
-        # The payload is stored as key-value pairs (must be bytes/strings in Redis)
-        payload = {
-            'roll_no': str(roll_no),
-            'class_id': str(class_id),
-            'timestamp': datetime.now().isoformat()
-        }
+def is_known_duplicate(payload):
+    return DEDUP_ENABLED and dedup_key(payload) in seen_marks
 
+
+def queue_command(pipe, payload):
+    """Queue the enqueue command for one mark on a (sync or asyncio) pipeline."""
+    fields = stream_codec.encode(payload)
+    stream = stream_partitions.stream_for(payload.class_id)
+    if not DEDUP_ENABLED:
         # XADD adds the message to the stream. '*' auto-generates the message ID.
-        message_id = valkey_client.xadd(
-            name=VALKEY_STREAM_NAME,
-            fields=payload,
-            maxlen=1000000,  # Cap stream to 1 million entries
-            approximate=True
-        )
-        logging.info(" [x] Sent message ID: %s for Roll No: %s", message_id.decode(), roll_no)
+        # No MAXLEN: stream_retention.py trims only what every consumer group has processed.
+        pipe.xadd(name=stream, fields=fields)
+        return
+    # The key lives until the end of the mark's day (plus grace for clock skew between kiosks)
+    day = datetime.fromisoformat(payload.date)
+    expire_at = int((day + timedelta(days=1)).timestamp()) + DEDUP_GRACE_SEC
+    fields = [v for kv in fields.items() for v in kv]
+    pipe.evalsha(ENQUEUE_ONCE_SHA, 2, dedup_key(payload), stream, expire_at, *fields)
+
+
+def record_reply(payload, reply):
+    """Remember the outcome of queue_command; returns 'queued', 'duplicate' or 'error'."""
+    if isinstance(reply, Exception):
+        return 'error'
+    if DEDUP_ENABLED:
+        seen_marks.add(dedup_key(payload))
+    return 'queued' if reply is not None else 'duplicate'
+
+
+def queue_marks(payloads):
+    """Enqueue marks in one pipelined round trip.
+
+    Returns one reply per payload: the stream message ID, None if the mark was a
+    duplicate, or the exception for that item. Connection errors are raised.
+    """
+    # transaction=False: plain pipelining, no MULTI/EXEC around the batch
+    pipe = valkey_client.pipeline(transaction=False)
+    for payload in payloads:
+        queue_command(pipe, payload)
+    replies = pipe.execute(raise_on_error=False)
+
+    # After a Valkey restart or failover the script cache is empty: load it and resend those items
+    missing = [i for i, r in enumerate(replies) if isinstance(r, redis.exceptions.NoScriptError)]
+    if missing:
+        valkey_client.script_load(ENQUEUE_ONCE_LUA)
+        pipe = valkey_client.pipeline(transaction=False)
+        for i in missing:
+            queue_command(pipe, payloads[i])
+        for i, reply in zip(missing, pipe.execute(raise_on_error=False)):
+            replies[i] = reply
+    return replies
+
+
+@app.route('/api/v1/log_attendance', methods=['POST'])
+def log_attendance():
+    """Receives attendance data and publishes it instantly to the Valkey Stream."""
+    try:
+        payload, error = validate_mark(request.json)
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 400
+
+        if is_known_duplicate(payload):
+            return jsonify({'status': 'duplicate', 'message': 'Already marked today'}), 200
+
+        message_id = queue_marks([payload])[0]
+        if isinstance(message_id, Exception):
+            raise message_id
+        if record_reply(payload, message_id) == 'duplicate':
+            return jsonify({'status': 'duplicate', 'message': 'Already marked today'}), 200
+        logging.info(" [x] Sent message ID: %s for Roll No: %s", message_id.decode(), payload.roll_no)
 
         # Respond immediately to the device for maximum speed
         return jsonify({'status': 'success', 'message': 'Attendance queued'}), 202
 
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+        # The pool discards the broken connection; the next request reconnects
+        logging.error(f" [!] Valkey unavailable: {e}")
+        return jsonify({'status': 'error', 'message': 'Queue service unavailable'}), 503
     except Exception as e:
         logging.error(f" [!] Error during attendance processing: {e}")
         return jsonify({'status': 'error', 'message': 'Internal queueing error'}), 500
 
 
+@app.route('/api/v1/log_attendance_batch', methods=['POST'])
+def log_attendance_batch():
+    """Receives a list of marks and publishes the valid ones with one pipelined XADD round trip.
+
+    Body: a JSON array of marks, or {"marks": [...]}. Each item's result is 'queued',
+    'duplicate' (already marked today), 'invalid' or 'error', in input order. Responds
+    202 when every mark was queued or a duplicate, otherwise 207.
+    """
+    data = request.get_json(silent=True)
+    marks = data.get('marks') if isinstance(data, dict) else data
+    if not isinstance(marks, list) or not marks:
+        return jsonify({'status': 'error', 'message': 'Expected a non-empty list of marks'}), 400
+    if len(marks) > PRODUCER_MAX_BATCH:
+        return jsonify({'status': 'error',
+                        'message': f'Batch too large (max {PRODUCER_MAX_BATCH} marks)'}), 413
+
+    results = [None] * len(marks)
+    valid = []
+    for i, mark in enumerate(marks):
+        payload, error = validate_mark(mark)
+        if error:
+            results[i] = {'status': 'invalid', 'message': error}
+        elif is_known_duplicate(payload):
+            results[i] = {'status': 'duplicate'}
+        else:
+            valid.append((i, payload))
+
+    if valid:
+        try:
+            replies = queue_marks([payload for _, payload in valid])
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            logging.error(f" [!] Valkey unavailable: {e}")
+            return jsonify({'status': 'error', 'message': 'Queue service unavailable'}), 503
+        except Exception as e:
+            logging.error(f" [!] Error during batch attendance processing: {e}")
+            replies = [e] * len(valid)
+
+        for (i, payload), reply in zip(valid, replies):
+            outcome = record_reply(payload, reply)
+            if outcome == 'error':
+                results[i] = {'status': 'error', 'message': 'Internal queueing error'}
+            elif outcome == 'duplicate':
+                results[i] = {'status': 'duplicate'}
+            else:
+                results[i] = {'status': 'queued', 'id': reply.decode()}
+
+    queued = sum(1 for r in results if r['status'] == 'queued')
+    duplicates = sum(1 for r in results if r['status'] == 'duplicate')
+    rejected = len(marks) - queued - duplicates
+    logging.info(" [x] Batch of %d marks: %d queued, %d duplicate, %d rejected",
+                 len(marks), queued, duplicates, rejected)
+    status = 'success' if not rejected else 'partial'
+    code = 202 if status == 'success' else 207
+    return jsonify({'status': status, 'queued': queued, 'duplicates': duplicates, 'results': results}), code
+
+
+def serve(host, port, server=PRODUCER_SERVER, debug=False):
+    """Run the producer with the chosen server.
+
+    'flask'    - Flask development server (single process, debug reloader).
+    'waitress' - production WSGI server; PRODUCER_THREADS request threads share the Valkey pool.
+    'async'    - asyncio/aiohttp service in producer_async.py that coalesces concurrent XADDs.
+    """
+    if server == 'waitress':
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            raise SystemExit("PRODUCER_SERVER=waitress needs the 'waitress' package: pip install waitress")
+        waitress_serve(app, host=host, port=port, threads=PRODUCER_THREADS)
+    elif server == 'async':
+        import producer_async
+        producer_async.run(host, port)
+    else:
+        app.run(host=host, port=port, debug=debug)
+
+
 if __name__ == '__main__':
     host = os.getenv("HOST", "127.0.0.1")
     # FIX: Use port 5001 to avoid conflict with the Dashboard Server (app.py)
@@ -93,7 +316,9 @@ if __name__ == '__main__':
 
     logging.info("=" * 60)
     logging.info(f"PRODUCER SERVICE URL: http://{host}:{port}/api/v1/log_attendance")
+    logging.info(f"BATCH ENDPOINT URL:   http://{host}:{port}/api/v1/log_attendance_batch")
+    logging.info(f"SERVER MODE: {PRODUCER_SERVER}")
     logging.info("=" * 60)
 
     # Run the producer service
-    app.run(host=host, port=port, debug=debug_mode)
+    serve(host, port, debug=debug_mode)
@@ -0,0 +1,107 @@
+"""
+query_cache.py
+In-memory cache of dashboard aggregate results, invalidated by attendance events.
+
+Each entry is stored under a key (query name plus filter parameters) together
+with its scope: the class it covers (None = all classes) and its date range
+(None = open-ended, otherwise an ISO 'YYYY-MM-DD' string). Each consumer
+announces the (class_id, date) pairs of every batch it commits on
+VALKEY_COMMITS_STREAM. When the dashboard's stream reader sees such a notice,
+it drops only the entries whose scope contains one of the pairs. Views of
+other classes and of past date ranges stay cached.
+
+Invalidating on the commit, not on the mark itself, means a lagging consumer
+cannot leave a result computed before its commit in the cache. Results
+computed while an invalidation was in flight are returned but not stored.
+Bulk loads that bypass the consumer (stream_retention.py replay,
+summary_tables.py rebuild) show up when entries expire.
+
+The cache only serves results while it is active, meaning the stream reader
+is connected. Otherwise there is nobody to invalidate it, and every call goes
+straight to MySQL. Entries also expire after a TTL as a safety net, and the
+least recently used ones are evicted beyond max_entries.
+
+Not thread-safe by itself; the dashboard runs it under eventlet, where
+greenlets only switch inside the compute callback's I/O.
+"""
+
+import time
+from collections import OrderedDict
+
+from config import QUERY_CACHE_MAX, QUERY_CACHE_TTL_SEC
+
+
+def _covers(scope, class_id, day):
+    scope_class, date_from, date_to = scope
+    if scope_class is not None and scope_class != class_id:
+        return False
+    return (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+
+
+class QueryCache:
+    """LRU + TTL cache of query results, invalidated by (class_id, date) scope."""
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX, ttl=QUERY_CACHE_TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.active = False
+        self._entries = OrderedDict()  # key -> (value, scope, expires_at)
+        self._generation = 0           # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, scope, compute):
+        """Cached result for key, or compute() it. scope = (class_id or None, date_from, date_to)."""
+        if not self.active:
+            return compute()
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > time.time():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        generation = self._generation
+        value = compute()
+        if self.active and generation == self._generation:
+            self._entries[key] = (value, scope, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, events):
+        """Drop entries covering any of the (class_id, 'YYYY-MM-DD') events."""
+        events = set(events)
+        if not events:
+            return 0
+        self._generation += 1
+        stale = [key for key, (_, scope, _) in self._entries.items()
+                 if any(_covers(scope, class_id, day) for class_id, day in events)]
+        for key in stale:
+            del self._entries[key]
+        self.invalidated += len(stale)
+        return len(stale)
+
+    def activate(self):
+        self.active = True
+
+    def deactivate(self):
+        """Stop serving and drop everything (events may be missed while deactivated)."""
+        self.active = False
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'active': self.active,
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'invalidated': self.invalidated,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,105 @@
+"""
+query_plans.py
+Reports whether the dashboard's queries use indexes.
+
+Loads every dashboard page through Flask's test client, with and without
+class/date filters. The SELECTs app.py actually sends are recorded, so the
+check cannot drift from the code. Each one is then EXPLAINed against the
+configured database, and the plan is printed per table: access type, chosen
+key and estimated rows.
+
+A full scan (type ALL) is flagged unless the table is one the query is meant
+to list completely (students, classes). Exits with status 1 if anything is
+flagged, so it can run after `python init_db.py` in a deploy script.
+
+    python query_plans.py [--class-id 1] [--roll-no R001] [--date-from 2024-01-01] [--date-to 2024-12-31]
+"""
+
+import app as dashboard  # first: eventlet monkey-patching
+
+import argparse
+import sys
+
+import mysql.connector
+
+from config import MYSQL_CONFIG
+
+# Tables the dashboard lists in full on purpose (EXPLAIN reports them by alias in app.py's queries)
+LISTED_TABLES = {'students', 'classes', 's', 'c'}
+
+
+class RecordingCursor:
+    def __init__(self, cursor, log):
+        self._cursor = cursor
+        self._log = log
+
+    def execute(self, query, params=()):
+        self._log.append((" ".join(query.split()), tuple(params or ())))
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class RecordingConnection:
+    def __init__(self, conn, log):
+        self._conn = conn
+        self._log = log
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._conn.cursor(*args, **kwargs), self._log)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def record_dashboard_queries(class_id, roll_no, date_from, date_to):
+    log = []
+    get_connection = dashboard.get_connection
+    dashboard.get_connection = lambda: RecordingConnection(get_connection(), log)
+    dashboard.query_cache.deactivate()  # every call must reach MySQL
+    client = dashboard.app.test_client()
+    dates = {'date_from': date_from, 'date_to': date_to}
+    try:
+        client.get("/")
+        client.post("/view", data={'class_id': str(class_id), **dates})
+        client.post("/view", data={'class_id': '', **dates})
+        client.get(f"/student/{roll_no}/attendance")
+        client.get(f"/student/{roll_no}/attendance", query_string=dates)
+        client.get(f"/class_trend/{class_id}")
+        client.get(f"/class_trend/{class_id}", query_string=dates)
+    finally:
+        dashboard.get_connection = get_connection
+    return list(dict.fromkeys(q for q in log if q[0].upper().startswith("SELECT")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--class-id', type=int, default=1)
+    parser.add_argument('--roll-no', default="1")
+    parser.add_argument('--date-from', default="2024-01-01")
+    parser.add_argument('--date-to', default="2024-12-31")
+    args = parser.parse_args()
+
+    queries = record_dashboard_queries(args.class_id, args.roll_no, args.date_from, args.date_to)
+    conn = mysql.connector.connect(**MYSQL_CONFIG)
+    flagged = 0
+    try:
+        cur = conn.cursor(dictionary=True)
+        for query, params in queries:
+            cur.execute("EXPLAIN " + query, params)
+            plan = cur.fetchall()
+            scans = [row['table'] for row in plan if row['type'] == 'ALL' and row['table'] not in LISTED_TABLES]
+            flagged += bool(scans)
+            print(f"\n{'SCAN on ' + ', '.join(scans) if scans else 'OK (indexed)'}: {query[:150]}")
+            for row in plan:
+                print(f"    {str(row['table']):22s} type={str(row['type']):7s} key={str(row['key']):22s} "
+                      f"rows={row['rows']}  {row.get('Extra') or ''}")
+    finally:
+        conn.close()
+    print(f"\n{len(queries)} dashboard queries checked, {flagged} with full scans.")
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+roster_cache.py
+In-process roll_no -> name cache for the consumer worker.
+
+Warmed with one bulk SELECT at startup. Entries expire after a TTL and the
+least recently used ones are evicted beyond max_entries. All misses and
+expired entries of a batch are resolved with a single SELECT ... IN, so only
+keys a batch actually uses are refreshed, never the whole roster. Roll numbers
+missing from the students table are cached too (for a shorter time), so an
+unknown student does not cost a query per mark.
+"""
+
+import time
+from collections import OrderedDict
+
+from config import ROSTER_CACHE_TTL_SEC, ROSTER_CACHE_NEGATIVE_TTL_SEC, ROSTER_CACHE_MAX
+
+
+class RosterCache:
+    """TTL + LRU cache of student names keyed by roll_no."""
+
+    def __init__(self, ttl=ROSTER_CACHE_TTL_SEC, negative_ttl=ROSTER_CACHE_NEGATIVE_TTL_SEC,
+                 max_entries=ROSTER_CACHE_MAX):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # roll_no -> (name or None, expires_at)
+        self.hits = 0
+        self.misses = 0
+        self.db_lookups = 0
+        self.evictions = 0
+
+    def _store(self, roll_no, name, now):
+        self._entries[roll_no] = (name, now + (self.ttl if name is not None else self.negative_ttl))
+        self._entries.move_to_end(roll_no)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def warm(self, conn):
+        """Load the roster in one query (up to max_entries rows). Returns the number cached."""
+        cursor = conn.cursor()
+        cursor.execute("SELECT roll_no, name FROM students LIMIT %s", (self.max_entries,))
+        now = time.time()
+        rows = cursor.fetchall()
+        cursor.close()
+        for roll_no, name in rows:
+            self._store(roll_no, name, now)
+        self.db_lookups += 1
+        return len(rows)
+
+    def get_many(self, conn, roll_nos):
+        """Returns {roll_no: name} for the roll numbers found in the students table.
+
+        Fresh entries are served from memory; everything else is fetched with one
+        coalesced SELECT. Database errors propagate to the caller.
+        """
+        now = time.time()
+        found, missing = {}, []
+        for roll_no in dict.fromkeys(roll_nos):
+            entry = self._entries.get(roll_no)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(roll_no)
+                self.hits += 1
+                if entry[0] is not None:
+                    found[roll_no] = entry[0]
+            else:
+                self.misses += 1
+                missing.append(roll_no)
+
+        if missing:
+            cursor = conn.cursor()
+            # Create a placeholder string for the query: (%s, %s, ...)
+            placeholders = ', '.join(['%s'] * len(missing))
+            cursor.execute(f"SELECT roll_no, name FROM students WHERE roll_no IN ({placeholders})", missing)
+            fetched = dict(cursor.fetchall())
+            cursor.close()
+            self.db_lookups += 1
+            for roll_no in missing:
+                name = fetched.get(roll_no)
+                self._store(roll_no, name, now)
+                if name is not None:
+                    found[roll_no] = name
+        return found
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100.0 if total else 0.0
+        return (f"roster cache {len(self._entries)} entries, hit rate {rate:.1f}% "
+                f"({self.hits} hits / {self.misses} misses), {self.db_lookups} DB lookups, "
+                f"{self.evictions} evictions")
@@ -0,0 +1,107 @@
+"""
+stream_codec.py
+Encoding of attendance marks in the Valkey stream, shared by the producer,
+the consumer worker and the dashboard reader.
+
+Two formats are understood when decoding:
+
+  legacy  - three UTF-8 fields: roll_no, class_id, timestamp (ISO 8601)
+  compact - one field b'm' holding struct '<BIq' (version, class_id,
+            wall-clock milliseconds) followed by the UTF-8 roll_no
+
+"Wall-clock" milliseconds count from 1970-01-01 00:00 of the kiosk's local
+time, ignoring time zones, so the attendance date and time written to MySQL
+are exactly what the kiosk saw, whatever the server's time zone.
+STREAM_CODEC chooses what producers write. Set it to 'legacy' until every
+consumer runs this module.
+
+Consumers also write one entry per committed batch to VALKEY_COMMITS_STREAM:
+field b'c' holding "class_id:YYYY-MM-DD" pairs joined by ';'
+(encode_commits/decode_commits).
+"""
+
+import struct
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from config import STREAM_CODEC
+
+COMPACT_FIELD = b'm'
+COMPACT_VERSION = 1
+COMMITS_FIELD = b'c'
+_HEADER = struct.Struct('<BIq')  # version, class_id, wall-clock ms
+# Largest class_id that fits both the uint32 above and the signed INT column in MySQL
+MAX_CLASS_ID = 2**31 - 1
+EPOCH = datetime(1970, 1, 1)
+_MS_PER_DAY = 86400000
+
+
+@lru_cache(maxsize=64)
+def _day_string(day):
+    return (EPOCH + timedelta(days=day)).strftime('%Y-%m-%d')
+
+
+class Mark(namedtuple('Mark', 'roll_no class_id wall_ms')):
+    """One attendance mark: roll_no (str), class_id (int), wall-clock time in ms."""
+    __slots__ = ()
+
+    @property
+    def date(self):
+        """'YYYY-MM-DD' as used by the MySQL DATE column."""
+        return _day_string(self.wall_ms // _MS_PER_DAY)
+
+    @property
+    def time(self):
+        """'HH:MM:SS' as used by the MySQL TIME column."""
+        s = (self.wall_ms // 1000) % 86400
+        return f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}"
+
+    @property
+    def timestamp(self):
+        return EPOCH + timedelta(milliseconds=self.wall_ms)
+
+
+def make_mark(roll_no, class_id, timestamp):
+    """Build a Mark from a (naive or aware) datetime; aware ones keep their local wall clock."""
+    wall_ms = (timestamp.replace(tzinfo=None) - EPOCH) // timedelta(milliseconds=1)
+    return Mark(str(roll_no), int(class_id), wall_ms)
+
+
+def encode(mark, fmt=None):
+    """Stream fields for a mark in the configured (or given) format."""
+    if (fmt or STREAM_CODEC) == 'legacy':
+        return {'roll_no': mark.roll_no, 'class_id': str(mark.class_id), 'timestamp': mark.timestamp.isoformat()}
+    return {COMPACT_FIELD: _HEADER.pack(COMPACT_VERSION, mark.class_id, mark.wall_ms) + mark.roll_no.encode('utf-8')}
+
+
+def encode_commits(pairs):
+    """Stream fields announcing committed (class_id, 'YYYY-MM-DD') pairs (VALKEY_COMMITS_STREAM)."""
+    return {COMMITS_FIELD: ";".join(f"{class_id}:{day}" for class_id, day in pairs).encode('ascii')}
+
+
+def decode_commits(fields):
+    """Set of (class_id, 'YYYY-MM-DD') pairs from an encode_commits entry. Raises ValueError if malformed."""
+    blob = fields.get(COMMITS_FIELD)
+    if blob is None:
+        raise ValueError("Missing commits field")
+    pairs = set()
+    for item in blob.decode('ascii').split(';'):
+        class_id, _, day = item.partition(':')
+        pairs.add((int(class_id), day))
+    return pairs
+
+
+def decode(fields):
+    """Mark from stream fields in either format. Raises ValueError for anything malformed."""
+    blob = fields.get(COMPACT_FIELD)
+    if blob is not None:
+        if len(blob) < _HEADER.size or blob[0] != COMPACT_VERSION:
+            raise ValueError(f"Unsupported compact mark (version byte {blob[:1]!r})")
+        _, class_id, wall_ms = _HEADER.unpack_from(blob)
+        return Mark(blob[_HEADER.size:].decode('utf-8'), class_id, wall_ms)
+    try:
+        return make_mark(fields[b'roll_no'].decode('utf-8'), fields[b'class_id'],
+                         datetime.fromisoformat(fields[b'timestamp'].decode('utf-8')))
+    except KeyError as e:
+        raise ValueError(f"Missing field {e}") from None
@@ -0,0 +1,41 @@
+"""
+stream_partitions.py
+Partitioning of attendance marks across several Valkey streams by class.
+
+With STREAM_PARTITIONS = N > 1, a mark for class_id goes to
+'<VALKEY_STREAM_NAME>:<k>' with k = crc32(class_id) % N. All marks for a
+class therefore stay in order in one stream, and a busy class only adds
+backlog to its own partition. With N = 1 the single stream keeps its
+original name, so existing deployments are unchanged.
+"""
+
+import zlib
+
+from config import VALKEY_STREAM_NAME, STREAM_PARTITIONS
+
+
+def stream_names(partitions=STREAM_PARTITIONS, base=VALKEY_STREAM_NAME):
+    """Names of the partition streams, in partition order."""
+    if partitions <= 1:
+        return [base]
+    return [f"{base}:{k}" for k in range(partitions)]
+
+
+STREAMS = stream_names()
+
+
+def partition_of(class_id, partitions):
+    return zlib.crc32(str(class_id).encode('utf-8')) % partitions
+
+
+def stream_for(class_id, streams=None):
+    """The stream a mark for class_id is written to."""
+    streams = streams or STREAMS
+    return streams[partition_of(class_id, len(streams))] if len(streams) > 1 else streams[0]
+
+
+def readable_streams(streams=None, base=VALKEY_STREAM_NAME):
+    """Streams readers should follow: the partitions, plus the unpartitioned stream while
+    it may still hold entries written before partitioning was enabled."""
+    streams = list(streams or STREAMS)
+    return streams if base in streams else streams + [base]
@@ -0,0 +1,216 @@
+"""
+stream_retention.py
+Retention for the attendance streams: archive processed entries to compressed
+local segments, then trim them from Valkey.
+
+For every stream, the trim point is the oldest entry some consumer group still
+needs:
+- the smallest pending (delivered but un-ACKed) ID of each group;
+- or, if a group has nothing pending, the entry after its last-delivered ID.
+Groups in RETENTION_IGNORE_GROUPS are skipped (the dashboard's group is never
+read through XREADGROUP).
+
+Everything older than the trim point is written to
+<RETENTION_ARCHIVE_DIR>/<stream>/<first-id>_<last-id>.jsonl.gz and then removed
+with XTRIM MINID. Unacknowledged entries are never trimmed. If the process stops
+between archiving and trimming, the next run archives those entries again.
+That is harmless, because replay is idempotent.
+
+Usage:
+    python stream_retention.py run            # loop every RETENTION_INTERVAL_SEC
+    python stream_retention.py once           # one archive + trim pass
+    python stream_retention.py replay data/stream_archive/attendance_stream/*.jsonl.gz
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+
+import redis
+
+from config import RETENTION_ARCHIVE_DIR, RETENTION_INTERVAL_SEC, RETENTION_IGNORE_GROUPS, RETENTION_PAGE_SIZE
+import stream_codec
+import stream_partitions
+from consumer_worker import get_valkey_client, get_mysql_connection, commit_records
+from roster_cache import RosterCache
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _next_id(stream_id):
+    ms, seq = stream_id.split('-')
+    return f"{ms}-{int(seq) + 1}"
+
+
+def _id_key(stream_id):
+    ms, seq = stream_id.split('-')
+    return int(ms), int(seq)
+
+
+def trim_point(r, stream):
+    """Oldest ID any consumer group still needs, or None if no group is reading the stream."""
+    needed = []
+    for group in r.xinfo_groups(stream):
+        name = _text(group['name'])
+        if name in RETENTION_IGNORE_GROUPS:
+            continue
+        if group['pending']:
+            needed.append(_text(r.xpending(stream, name)['min']))
+        else:
+            needed.append(_next_id(_text(group['last-delivered-id'])))
+    return min(needed, key=_id_key) if needed else None
+
+
+def archive_record(msg_id, fields):
+    """One archive line; entries that do not decode are kept raw (hex) so nothing is lost."""
+    try:
+        mark = stream_codec.decode(fields)
+        return {'id': msg_id, 'roll_no': mark.roll_no, 'class_id': mark.class_id, 'wall_ms': mark.wall_ms}
+    except ValueError:
+        return {'id': msg_id, 'raw': {_text(k): v.hex() for k, v in fields.items()}}
+
+
+def archive_and_trim(r, stream, archive_dir=RETENTION_ARCHIVE_DIR):
+    """Archive everything before the trim point of `stream`, then XTRIM it. Returns entries trimmed."""
+    minid = trim_point(r, stream)
+    if minid is None:
+        return 0
+
+    folder = os.path.join(archive_dir, stream.replace(':', '_'))
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, f".segment-{os.getpid()}.tmp")
+    first = last = None
+    count = 0
+    start = '-'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            while True:
+                # Exclusive end: everything strictly older than the trim point
+                entries = r.xrange(stream, min=start, max=f"({minid}", count=RETENTION_PAGE_SIZE)
+                if not entries:
+                    break
+                lines = []
+                for msg_id, fields in entries:
+                    msg_id = _text(msg_id)
+                    lines.append(json.dumps(archive_record(msg_id, fields), separators=(',', ':')))
+                gz.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                first = first or _text(entries[0][0])
+                last = _text(entries[-1][0])
+                count += len(entries)
+                start = f"({last}"
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    if not count:
+        os.remove(tmp_path)
+        return 0
+    segment = os.path.join(folder, f"{first}_{last}.jsonl.gz")
+    os.replace(tmp_path, segment)
+
+    # Exact (not approximate) trim so the stream starts exactly where the archive ends
+    trimmed = r.xtrim(stream, minid=minid, approximate=False)
+    print(f" [RETENTION] {stream}: archived {count} entries to {segment}, trimmed {trimmed}.")
+    return trimmed
+
+
+def run_once(r):
+    total = 0
+    for stream in stream_partitions.readable_streams():
+        if not r.exists(stream):
+            continue
+        try:
+            total += archive_and_trim(r, stream)
+        except redis.exceptions.ResponseError as e:
+            print(f" [RETENTION] {stream}: skipped ({e}).")
+    return total
+
+
+def run_forever(interval=RETENTION_INTERVAL_SEC):
+    r = None
+    while True:
+        if r is None:
+            r = get_valkey_client()
+        if r is not None:
+            try:
+                run_once(r)
+            except redis.exceptions.ConnectionError as e:
+                print(f" [RETENTION] Valkey connection lost: {e}")
+                r = None
+        time.sleep(interval)
+
+
+# --- Replay ---
+
+def read_segment(path):
+    """Yields archive records from one segment."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def replay(paths, batch_size=5000):
+    """Bulk-load archived marks into MySQL the way the consumer writes them (summaries included).
+
+    Idempotent thanks to ON DUPLICATE KEY UPDATE; raw (undecodable) entries are reported and skipped.
+    """
+    conn = get_mysql_connection()
+    if conn is None:
+        raise SystemExit("MySQL unavailable.")
+    roster = RosterCache()
+    roster.warm(conn)
+    started, loaded, skipped = time.time(), 0, 0
+
+    def flush(marks):
+        names = roster.get_many(conn, [m.roll_no for m in marks])
+        commit_records(conn, [(m.roll_no, names.get(m.roll_no, "Unknown Student"), m.class_id, m.time, m.date)
+                              for m in marks])
+
+    try:
+        for path in paths:
+            marks = []
+            for record in read_segment(path):
+                if 'raw' in record:
+                    skipped += 1
+                    continue
+                marks.append(stream_codec.Mark(record['roll_no'], record['class_id'], record['wall_ms']))
+                if len(marks) >= batch_size:
+                    flush(marks)
+                    loaded += len(marks)
+                    marks = []
+            if marks:
+                flush(marks)
+                loaded += len(marks)
+            print(f" [REPLAY] {path} done ({loaded} records so far).")
+    finally:
+        conn.close()
+    elapsed = max(time.time() - started, 1e-9)
+    print(f" [REPLAY] Loaded {loaded} records in {elapsed:.1f}s ({loaded / elapsed:.0f} records/s), "
+          f"skipped {skipped} undecodable entries.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive, trim and replay the attendance streams.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_p = sub.add_parser('run', help="archive and trim periodically")
+    run_p.add_argument('--interval', type=float, default=RETENTION_INTERVAL_SEC)
+    sub.add_parser('once', help="one archive + trim pass")
+    replay_p = sub.add_parser('replay', help="bulk-load archive segments into MySQL")
+    replay_p.add_argument('segments', nargs='+')
+    replay_p.add_argument('--batch', type=int, default=5000)
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.command == 'run':
+        run_forever(args.interval)
+    elif args.command == 'once':
+        client = get_valkey_client()
+        if client is None:
+            raise SystemExit("Valkey unavailable.")
+        run_once(client)
+    else:
+        replay(args.segments, args.batch)
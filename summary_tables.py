@@ -0,0 +1,153 @@
+"""
+summary_tables.py
+Summary tables behind the dashboard's class and student aggregates.
+
+  class_sessions        (class_id, date) -> attendees   one row per held session
+  student_class_counts  (roll_no, class_id) -> attended sessions attended per student and class
+
+The consumer keeps them current in the same transaction as its attendance
+inserts (see consumer_worker.store_records):
+1. lock_new_records() locks the batch's attendance keys with SELECT ... FOR
+   UPDATE and returns the records that are not in the table yet.
+   Redelivered marks update an existing row and must not be counted again.
+   The lock stops two consumers from both counting the same new row.
+2. The attendance rows are inserted.
+3. apply_deltas() adds the new rows to both summaries with upserts.
+Rows are locked in primary-key order, which keeps deadlocks between
+consumers rare. The ones that still happen are retried by the consumer.
+
+Backfill (or repair) from the attendance table:
+    python summary_tables.py rebuild
+
+The rebuild runs in one transaction. INSERT ... SELECT holds shared locks on
+the attendance rows it reads, so consumer commits wait for the rebuild to
+finish and no mark is counted twice or missed.
+"""
+
+import sys
+from collections import Counter
+
+import mysql.connector
+
+from config import MYSQL_CONFIG, CONSUMER_INSERT_ROWS
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS class_sessions (
+        class_id INT NOT NULL,
+        date DATE NOT NULL,
+        attendees INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (class_id, date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS student_class_counts (
+        roll_no VARCHAR(20) NOT NULL,
+        class_id INT NOT NULL,
+        attended INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (roll_no, class_id),
+        KEY idx_class (class_id)
+    )
+    """,
+]
+
+# MySQL error numbers worth retrying the whole transaction for
+DEADLOCK_ERRNOS = (1213, 1205)  # ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+
+def create_tables(cursor):
+    for ddl in SCHEMA:
+        cursor.execute(ddl)
+
+
+def record_key(record):
+    """Attendance primary key (roll_no, date, class_id) of an insert record."""
+    roll_no, _, class_id, _, day = record
+    return roll_no, str(day), int(class_id)
+
+
+def lock_new_records(cursor, records):
+    """Lock the attendance keys of `records` (FOR UPDATE) and return the keys not yet stored.
+
+    Must run inside the transaction that inserts the records. Duplicates within the batch count once.
+    """
+    keys = sorted(set(record_key(record) for record in records))
+    existing = set()
+    for start in range(0, len(keys), CONSUMER_INSERT_ROWS):
+        chunk = keys[start:start + CONSUMER_INSERT_ROWS]
+        cursor.execute(
+            "SELECT roll_no, date, class_id FROM attendance WHERE (roll_no, date, class_id) IN ("
+            + ", ".join(["(%s, %s, %s)"] * len(chunk)) + ") FOR UPDATE",
+            [value for key in chunk for value in key])
+        existing.update((roll_no, str(day), int(class_id)) for roll_no, day, class_id in cursor.fetchall())
+    return [key for key in keys if key not in existing]
+
+
+def apply_deltas(cursor, new_keys):
+    """Add newly stored attendance rows (keys from lock_new_records) to both summaries."""
+    if not new_keys:
+        return
+    sessions = sorted(Counter((class_id, day) for _, day, class_id in new_keys).items())
+    students = sorted(Counter((roll_no, class_id) for roll_no, _, class_id in new_keys).items())
+    for start in range(0, len(sessions), CONSUMER_INSERT_ROWS):
+        chunk = sessions[start:start + CONSUMER_INSERT_ROWS]
+        cursor.execute(
+            "INSERT INTO class_sessions (class_id, date, attendees) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(chunk))
+            + " ON DUPLICATE KEY UPDATE attendees = attendees + VALUES(attendees)",
+            [value for (class_id, day), n in chunk for value in (class_id, day, n)])
+    for start in range(0, len(students), CONSUMER_INSERT_ROWS):
+        chunk = students[start:start + CONSUMER_INSERT_ROWS]
+        cursor.execute(
+            "INSERT INTO student_class_counts (roll_no, class_id, attended) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(chunk))
+            + " ON DUPLICATE KEY UPDATE attended = attended + VALUES(attended)",
+            [value for (roll_no, class_id), n in chunk for value in (roll_no, class_id, n)])
+
+
+def rebuild(conn):
+    """Recompute both summaries from the attendance table (and attendance_archive, when
+    attendance_partitions.py has archived months into it) in one transaction."""
+    cursor = conn.cursor()
+    try:
+        create_tables(cursor)
+        cursor.execute("""
+            SELECT 1 FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'attendance_archive'
+        """)
+        if cursor.fetchall():
+            # UNION, not UNION ALL: a month being archived may briefly be in both tables
+            source = ("(SELECT roll_no, class_id, date FROM attendance"
+                      " UNION SELECT roll_no, class_id, date FROM attendance_archive) AS history")
+        else:
+            source = "attendance"
+        cursor.execute("DELETE FROM class_sessions")
+        cursor.execute("""
+            INSERT INTO class_sessions (class_id, date, attendees)
+            SELECT class_id, date, COUNT(*) FROM {source} GROUP BY class_id, date
+        """.format(source=source))
+        sessions = cursor.rowcount
+        cursor.execute("DELETE FROM student_class_counts")
+        cursor.execute("""
+            INSERT INTO student_class_counts (roll_no, class_id, attended)
+            SELECT roll_no, class_id, COUNT(*) FROM {source} GROUP BY roll_no, class_id
+        """.format(source=source))
+        students = cursor.rowcount
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return sessions, students
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['rebuild']:
+        raise SystemExit("Usage: python summary_tables.py rebuild")
+    connection = mysql.connector.connect(**MYSQL_CONFIG)
+    try:
+        n_sessions, n_students = rebuild(connection)
+        print(f"✅ Rebuilt summaries: {n_sessions} class sessions, {n_students} student/class counts.")
+    finally:
+        connection.close()
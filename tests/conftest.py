@@ -0,0 +1,11 @@
+import os
+import sys
+
+# config.py refuses to load without these; the tests never connect to either service
+os.environ.setdefault("VALKEY_HOST", "localhost")
+os.environ.setdefault("VALKEY_PASSWORD", "test")
+for key, value in (("MYSQL_HOST", "localhost"), ("MYSQL_PORT", "3306"), ("MYSQL_USER", "test"),
+                   ("MYSQL_PASS", "test"), ("MYSQL_DB", "test")):
+    os.environ.setdefault(key, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+import sqlite3
+import time
+
+import pytest
+
+import attendance_dispatcher
+from attendance_dispatcher import AttendanceDispatcher
+
+
+@pytest.fixture
+def dispatcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(attendance_dispatcher, 'DISPATCH_BACKOFF_BASE_SEC', 0.01)
+    monkeypatch.setattr(attendance_dispatcher, 'DISPATCH_LINGER_MS', 0)
+    d = AttendanceDispatcher(outbox_path=str(tmp_path / "outbox.db"))
+    monkeypatch.setattr(d, '_deliver', lambda db: None)  # keep marks in the outbox
+    yield d
+    d.stop()
+
+
+def outbox_rows(d):
+    db = sqlite3.connect(d.outbox_path)
+    try:
+        return db.execute("SELECT roll_no, class_id FROM outbox ORDER BY id").fetchall()
+    finally:
+        db.close()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline and not condition():
+        time.sleep(0.01)
+    return condition()
+
+
+def test_dispatch_loop_restarts_after_outbox_failure(dispatcher, monkeypatch):
+    original = dispatcher._persist_pending
+    calls = []
+
+    def fail_once(db):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("disk I/O error")
+        return original(db)
+
+    monkeypatch.setattr(dispatcher, '_persist_pending', fail_once)
+    dispatcher.start()
+    dispatcher.enqueue("101", 1)
+
+    assert wait_for(lambda: outbox_rows(dispatcher) == [("101", 1)])
+    assert dispatcher.is_alive()
+    assert not dispatcher._pending
+
+    dispatcher.enqueue("102", 1)
+    assert wait_for(lambda: outbox_rows(dispatcher) == [("101", 1), ("102", 1)])
+
+
+def test_stop_persists_pending_marks(dispatcher):
+    dispatcher.start()
+    dispatcher.enqueue("101", 2)
+    dispatcher.stop()
+    assert not dispatcher.is_alive()
+    assert outbox_rows(dispatcher) == [("101", 2)]
@@ -0,0 +1,76 @@
+"""attendance_partitions.history_source: when dashboard queries must include attendance_archive."""
+
+from datetime import date
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+import attendance_partitions
+
+
+class FakeCursor:
+    """Answers the information_schema queries of archive_boundary."""
+
+    def __init__(self, archive, bounds):
+        self.archive = archive
+        self.bounds = bounds
+        self._rows = []
+
+    def execute(self, query, params=None):
+        if "information_schema.tables" in query:
+            self._rows = [(1,)] if self.archive else []
+        else:
+            self._rows = [(f"p{i}", f"'{b.isoformat()}'" if b else "MAXVALUE") for i, b in enumerate(self.bounds)]
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, archive, bounds):
+        self.cursor_calls = 0
+        self.archive, self.bounds = archive, bounds
+
+    def cursor(self):
+        self.cursor_calls += 1
+        return FakeCursor(self.archive, self.bounds)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(attendance_partitions, "_boundary_cache", (float("-inf"), None))
+
+
+LIVE = [date(2024, 3, 1), date(2024, 4, 1), None]  # oldest live month: February 2024
+
+
+def test_no_archive_reads_live_table():
+    conn = FakeConnection(False, LIVE)
+    assert attendance_partitions.history_source(conn) == "attendance"
+    assert attendance_partitions.history_source(conn, "2020-01-01") == "attendance"
+
+
+@pytest.mark.parametrize("date_from, archived", [
+    (None, True),
+    ("2024-01-31", True),
+    ("2024-02-01", False),
+    (date(2024, 3, 15), False),
+    ("not a date", True),
+])
+def test_archive_included_before_oldest_live_month(date_from, archived):
+    source = attendance_partitions.history_source(FakeConnection(True, LIVE), date_from)
+    if archived:
+        assert "attendance_archive" in source and "date < '2024-02-01'" in source
+    else:
+        assert source == "attendance"
+
+
+def test_boundary_is_cached():
+    conn = FakeConnection(True, LIVE)
+    attendance_partitions.history_source(conn)
+    attendance_partitions.history_source(conn, "2024-01-01")
+    assert conn.cursor_calls == 1
@@ -0,0 +1,82 @@
+"""consumer_worker: commit notices for the dashboard cache."""
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+pytest.importorskip("redis")
+
+import consumer_worker
+import stream_codec
+from config import VALKEY_COMMITS_STREAM
+
+
+class RecordingPipe:
+    def __init__(self):
+        self.calls = []
+
+    def xadd(self, name, fields, **kwargs):
+        self.calls.append((name, fields, kwargs))
+
+
+def test_publish_commits_announces_distinct_pairs():
+    pipe = RecordingPipe()
+    consumer_worker.publish_commits(pipe, [
+        ("S1", "A", 3, "09:00:00", "2024-01-05"),
+        ("S2", "B", 3, "09:01:00", "2024-01-05"),
+        ("S1", "A", 4, "10:00:00", "2024-01-05"),
+    ])
+    (name, fields, kwargs), = pipe.calls
+    assert name == VALKEY_COMMITS_STREAM
+    assert stream_codec.decode_commits(fields) == {(3, "2024-01-05"), (4, "2024-01-05")}
+    assert kwargs["approximate"]
+
+
+def test_publish_commits_skips_empty_batch():
+    pipe = RecordingPipe()
+    consumer_worker.publish_commits(pipe, [])
+    assert pipe.calls == []
+
+
+def test_worker_names_are_distinct_per_slot():
+    assert [consumer_worker.worker_name(slot, "kiosk-db") for slot in range(3)] == \
+        ["kiosk-db-0", "kiosk-db-1", "kiosk-db-2"]
+
+
+def test_worker_name_generated_without_base():
+    assert consumer_worker.worker_name(0, None) is None
+
+
+class FakeSizer:
+    size = 10
+
+    def sample_backlog(self, r):
+        pass
+
+
+class DroppedClient:
+    def xreadgroup(self, **kwargs):
+        raise consumer_worker.redis.exceptions.ConnectionError("Connection reset by peer")
+
+
+class LiveClient:
+    def xreadgroup(self, streams, **kwargs):
+        stream = next(iter(streams))
+        return [(stream, [(b"1-0", {b"m": b"payload"})])]
+
+
+def test_prefetch_reader_reconnects_after_connection_error(monkeypatch):
+    monkeypatch.setattr(consumer_worker.time, "sleep", lambda seconds: None)
+    batches = consumer_worker.queue.Queue(maxsize=1)
+    stop_event = consumer_worker.threading.Event()
+    clients = iter([None, LiveClient()])
+    reader = consumer_worker.threading.Thread(
+        target=consumer_worker.prefetch_reader, daemon=True,
+        args=(DroppedClient(), "kiosk-db-0", FakeSizer(), batches, stop_event),
+        kwargs={"connect": lambda: next(clients)})
+    reader.start()
+    try:
+        stream_data = batches.get(timeout=2.0)
+    finally:
+        stop_event.set()
+        reader.join(2.0)
+    assert stream_data[0][1:] == (b"1-0", {b"m": b"payload"})
@@ -0,0 +1,82 @@
+"""Dashboard routes render end to end against a fake MySQL connection."""
+
+import pytest
+
+pytest.importorskip("eventlet")
+pytest.importorskip("flask_socketio")
+pytest.importorskip("mysql.connector")
+
+import app as dashboard
+
+
+class FakeCursor:
+    """Empty result for every query: no classes, students or attendance."""
+
+    def __init__(self, dictionary=False):
+        self.dictionary = dictionary
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+
+    def fetchone(self):
+        return {'total_sessions': 0} if self.dictionary else (0,)
+
+    def fetchall(self):
+        return []
+
+    def __iter__(self):
+        return iter([])
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(dictionary)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(dashboard, "get_connection", FakeConnection)
+    return dashboard.app.test_client()
+
+
+def test_index(client):
+    assert client.get("/").status_code == 200
+
+
+@pytest.mark.parametrize("form", [
+    {},
+    {'class_id': "1", 'date_from': "2024-1-5", 'date_to': "2024-02-01"},
+    {'date_from': "not a date"},
+])
+def test_view(client, form):
+    response = client.post("/view", data=form)
+    assert response.status_code == 200
+    if form.get('date_from') == "not a date":
+        assert b"Invalid date format" in response.data
+
+
+def test_student_table_cached_until_commit_notice(monkeypatch):
+    calls = []
+    monkeypatch.setattr(dashboard, "_fetch_student_attendance",
+                        lambda *args: calls.append(args) or [])
+    monkeypatch.setattr(dashboard, "query_cache", dashboard.QueryCache())
+    dashboard.query_cache.activate()
+
+    dashboard.fetch_student_attendance(3, "2024-01-01", "2024-01-31")
+    dashboard.fetch_student_attendance(3, "2024-01-01", "2024-01-31")
+    assert len(calls) == 1
+
+    dashboard.query_cache.invalidate({(4, "2024-01-10")})  # another class
+    dashboard.fetch_student_attendance(3, "2024-01-01", "2024-01-31")
+    assert len(calls) == 1
+
+    dashboard.query_cache.invalidate({(3, "2024-01-10")})
+    dashboard.fetch_student_attendance(3, "2024-01-01", "2024-01-31")
+    assert len(calls) == 2
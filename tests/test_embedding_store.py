@@ -0,0 +1,70 @@
+"""embedding_store: single-file gallery layout, version 1 compatibility, atomic replacement."""
+
+import csv
+import struct
+
+import numpy as np
+import pytest
+
+import embedding_store
+from embedding_store import EmbeddingStore
+
+
+def gallery(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.normal(size=(n, 128)).astype(np.float32),
+            [f"{seed}{i:03d}" for i in range(n)], [f"Student {seed}-{i}" for i in range(n)])
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_round_trip(tmp_path, dtype):
+    path = str(tmp_path / "g.bin")
+    feats, rolls, names = gallery(5)
+    names[1] = "Tab\there, ünïcode"
+    EmbeddingStore.write(path, feats, rolls, names, dtype=dtype)
+
+    store = EmbeddingStore.open(path)
+    assert store.roll_nos == rolls and store.names == names
+    np.testing.assert_allclose(store.features, feats, rtol=1e-3 if dtype == "float16" else 0, atol=1e-3)
+    np.testing.assert_allclose(store.norms, np.linalg.norm(np.asarray(store.features, np.float32), axis=1),
+                               rtol=1e-6)
+    assert not (tmp_path / "g.bin.names.tsv").exists()
+
+
+def test_empty_gallery(tmp_path):
+    path = str(tmp_path / "g.bin")
+    EmbeddingStore.write(path, np.empty((0, 128)), [], [])
+    store = EmbeddingStore.open(path)
+    assert len(store) == 0 and store.features.shape == (0, 128)
+
+
+def test_reads_version_1(tmp_path):
+    path = str(tmp_path / "g.bin")
+    feats, rolls, names = gallery(3)
+    norms = np.linalg.norm(feats, axis=1).astype("<f4")
+    header = struct.pack("<8sIIIQQQ", b"AMSGALRY", 1, 1, 128, 3, 64, 64 + feats.nbytes)
+    with open(path, "wb") as f:
+        f.write(header.ljust(64, b"\0") + feats.tobytes() + norms.tobytes())
+    with open(embedding_store.table_path(path), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(["Roll_No", "Name"])
+        w.writerows(zip(rolls, names))
+
+    store = EmbeddingStore.open(path)
+    assert store.roll_nos == rolls and store.names == names
+    np.testing.assert_array_equal(store.features, feats)
+
+
+def test_rewrite_keeps_open_store_consistent(tmp_path):
+    path = str(tmp_path / "g.bin")
+    old = gallery(4, seed=1)
+    new = gallery(6, seed=2)
+    EmbeddingStore.write(path, *old)
+    before = EmbeddingStore.open(path)
+    EmbeddingStore.write(path, *new)
+    after = EmbeddingStore.open(path)
+
+    assert before.roll_nos == old[1]
+    np.testing.assert_array_equal(before.features, old[0])
+    assert after.roll_nos == new[1]
+    np.testing.assert_array_equal(after.features, new[0])
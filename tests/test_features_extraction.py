@@ -0,0 +1,127 @@
+"""features_extraction_to_csv: chip preparation and batched embedding in both ALIGN_MODEs.
+
+dlib (and its model files) is replaced by a small fake, so this checks the
+plumbing between chip_from_image, prepare_chips and embed_chips, not the models.
+"""
+
+import functools
+import importlib
+import sys
+import types
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+
+class Rect:
+    def __init__(self, left, top, right, bottom):
+        self._box = (left, top, right, bottom)
+
+    def left(self):
+        return self._box[0]
+
+    def top(self):
+        return self._box[1]
+
+    def right(self):
+        return self._box[2]
+
+    def bottom(self):
+        return self._box[3]
+
+
+class Shape:
+    """68 landmarks spread over the rect, eyes level."""
+
+    def __init__(self, rect):
+        self.rect = rect
+
+    def part(self, i):
+        r = self.rect
+        x = r.left() + (r.right() - r.left()) * (0.3 if i < 42 else 0.7)
+        y = r.top() + (r.bottom() - r.top()) * 0.4
+        return types.SimpleNamespace(x=int(x), y=int(y))
+
+
+class RecognitionModel:
+    def __init__(self):
+        self.calls = []
+
+    def compute_face_descriptor(self, chips, batch_faces=None):
+        self.calls.append(batch_faces)
+        descs = [np.full(128, float(chip.mean()), np.float32) for chip in chips]
+        return descs if batch_faces is None else [[d] for d in descs]
+
+
+def fake_dlib():
+    dlib = types.ModuleType("dlib")
+    dlib.rectangle = Rect
+    dlib.full_object_detections = list
+    dlib.shape_predictor = lambda path: (lambda img, rect: Shape(rect))
+    dlib.face_recognition_model_v1 = lambda path: RecognitionModel()
+    dlib.get_frontal_face_detector = lambda: (lambda img, upsample: [Rect(20, 20, 180, 180)])
+    dlib.get_face_chips = lambda img, dets, size, padding: [
+        np.ascontiguousarray(cv2.resize(img[s.rect.top():s.rect.bottom(), s.rect.left():s.rect.right()],
+                                        (size, size))) for s in dets]
+    return dlib
+
+
+@pytest.fixture
+def extraction(monkeypatch):
+    monkeypatch.setitem(sys.modules, "dlib", fake_dlib())
+    for name in ("face_utils", "features_extraction_to_csv"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    face_utils = importlib.import_module("face_utils")
+    module = importlib.import_module("features_extraction_to_csv")
+    dlib = sys.modules["dlib"]
+    monkeypatch.setattr(face_utils, "predictor", dlib.shape_predictor(None))
+    monkeypatch.setattr(face_utils, "face_reco_model", dlib.face_recognition_model_v1(None))
+    monkeypatch.setattr(face_utils, "detector", dlib.get_frontal_face_detector())
+    return module, face_utils
+
+
+@pytest.fixture
+def images(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(5):
+        path = str(tmp_path / f"{i}.png")
+        cv2.imwrite(path, rng.integers(0, 256, (200, 200, 3), dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("mode", ["legacy", "chip"])
+def test_features_from_images(extraction, images, monkeypatch, mode):
+    module, face_utils = extraction
+    monkeypatch.setattr(module, "prepare_chips", functools.partial(face_utils.prepare_chips, mode=mode))
+    monkeypatch.setattr(module, "EMBED_BATCH_SIZE", 2)
+
+    chip, chip_shape = module.chip_from_image(images[0])
+    assert chip.shape[:2] == (150, 150)
+    assert (chip_shape is None) == (mode == "chip")
+
+    embs = module.features_from_images(images)
+    assert embs.shape == (len(images), 128)
+    calls = face_utils.face_reco_model.calls
+    assert len(calls) == 3  # 5 chips in batches of 2
+    assert all((batch is None) == (mode == "chip") for batch in calls)
+
+
+def test_features_from_images_skips_unreadable(extraction, tmp_path):
+    module, _ = extraction
+    assert module.features_from_images([str(tmp_path / "missing.png")]).shape == (0, 128)
+
+
+def test_saved_embedding_reused_only_for_same_alignment(extraction):
+    module, _ = extraction
+    entry = {'hash': "abc", 'align_mode': "chip", 'embedding': [0.0] * 128}
+    assert module.can_reuse(entry, "abc", align_mode="chip")
+    assert not module.can_reuse(entry, "abc", align_mode="legacy")
+    assert not module.can_reuse(entry, "changed", align_mode="chip")
+    # Metadata from before align_mode was recorded was computed with 'legacy'
+    old_entry = {'hash': "abc", 'embedding': [0.0] * 128}
+    assert module.can_reuse(old_entry, "abc", align_mode="legacy")
+    assert not module.can_reuse(old_entry, "abc", align_mode="chip")
@@ -0,0 +1,64 @@
+"""multi_camera: gallery and IVF index shared with workers through one shared-memory block."""
+
+import importlib
+import sys
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("pandas")
+
+from ann_index import IVFIndex
+
+
+@pytest.fixture
+def multi_camera(monkeypatch):
+    # Only the module imports are exercised; no dlib model is loaded
+    monkeypatch.setitem(sys.modules, "dlib", sys.modules.get("dlib") or types.ModuleType("dlib"))
+    return importlib.import_module("multi_camera")
+
+
+def test_shared_gallery_shares_index_arrays(multi_camera):
+    rng = np.random.default_rng(0)
+    feats = rng.normal(size=(300, 128)).astype(np.float32)
+    rolls = [f"S{i:04d}" for i in range(300)]
+    index = IVFIndex.build(feats, roll_nos=rolls, metric='cosine', nlist=16, target_recall=None)
+    index.nprobe = 4
+
+    gallery, owner = multi_camera.SharedGallery.create(feats, rolls, [f"n{i}" for i in range(300)], index=index)
+    try:
+        shm, matcher = gallery.attach()
+        shared = np.ndarray((shm.size,), dtype=np.uint8, buffer=shm.buf)
+        for array in (matcher.index.centroids, matcher.index.vectors, matcher.index.ids,
+                      matcher.index.offsets, matcher.index.sq_norms):
+            assert np.shares_memory(array, shared)
+        assert matcher.index.nprobe == 4
+
+        queries = feats[:20] + rng.normal(0, 0.01, (20, 128)).astype(np.float32)
+        np.testing.assert_array_equal(matcher.index.search(queries, k=3)[0], index.search(queries, k=3)[0])
+        del shared, matcher
+        shm.close()
+    finally:
+        owner.close()
+        owner.unlink()
+
+
+def test_shared_gallery_without_index(multi_camera):
+    feats = np.eye(4, 128, dtype=np.float32)
+    gallery, owner = multi_camera.SharedGallery.create(feats, list("abcd"), list("ABCD"))
+    try:
+        shm, matcher = gallery.attach()
+        assert matcher.index is None and len(matcher) == 4
+        del matcher
+        shm.close()
+    finally:
+        owner.close()
+        owner.unlink()
+
+
+def test_each_camera_has_its_own_outbox(multi_camera):
+    paths = [multi_camera.camera_outbox_path(slot, "data/attendance_outbox.db") for slot in range(3)]
+    assert paths == ["data/attendance_outbox.cam0.db", "data/attendance_outbox.cam1.db",
+                     "data/attendance_outbox.cam2.db"]
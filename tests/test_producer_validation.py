@@ -0,0 +1,55 @@
+"""producer_service.validate_mark: what the ingest endpoints accept or reject with 'invalid'/400."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("redis")
+
+import producer_service
+import stream_codec
+import stream_partitions
+from producer_service import validate_mark
+
+
+@pytest.mark.parametrize("class_id", [1, "7", stream_codec.MAX_CLASS_ID])
+def test_valid_class_id(class_id):
+    mark, error = validate_mark({'roll_no': "S001", 'class_id': class_id})
+    assert error is None
+    assert mark.class_id == int(class_id)
+    assert stream_codec.decode(stream_codec.encode(mark, 'compact')).class_id == int(class_id)
+
+
+@pytest.mark.parametrize("class_id", [-1, "-5", 2**31, 2**32, 2**40, "abc", None, 0])
+def test_invalid_class_id(class_id):
+    mark, error = validate_mark({'roll_no': "S001", 'class_id': class_id})
+    assert mark is None and error
+
+
+def test_invalid_timestamp():
+    mark, error = validate_mark({'roll_no': "S001", 'class_id': 1, 'timestamp': "yesterday"})
+    assert mark is None and error == 'Invalid timestamp'
+
+
+@pytest.mark.parametrize("offset", [timedelta(0), timedelta(minutes=-30), timedelta(minutes=30)])
+def test_recent_timestamp_accepted(offset):
+    timestamp = (datetime.now() + offset).isoformat()
+    mark, error = validate_mark({'roll_no': "S001", 'class_id': 1, 'timestamp': timestamp})
+    assert error is None and mark is not None
+
+
+@pytest.mark.parametrize("offset", [timedelta(days=-3), timedelta(days=-400), timedelta(hours=3), timedelta(days=30)])
+def test_timestamp_outside_window_rejected(offset):
+    timestamp = (datetime.now() + offset).isoformat()
+    mark, error = validate_mark({'roll_no': "S001", 'class_id': 1, 'timestamp': timestamp})
+    assert mark is None and error == 'Timestamp outside the accepted window'
+
+
+def test_dedup_key_shares_the_stream_slot():
+    mark, _ = validate_mark({'roll_no': "S001", 'class_id': 7})
+    stream = stream_partitions.stream_for(7)
+    key = producer_service.dedup_key(mark)
+    # Cluster hash tag: the text between the first '{' and the next '}' is what gets hashed
+    assert key[key.index('{') + 1:key.index('}')] == stream
+    assert key.endswith(f":{mark.date}:7:S001")
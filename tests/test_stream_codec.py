@@ -0,0 +1,29 @@
+"""stream_codec: mark formats and the consumers' commit notices."""
+
+from datetime import datetime
+
+import pytest
+
+import stream_codec
+
+
+@pytest.mark.parametrize("fmt", ["compact", "legacy"])
+def test_mark_round_trip(fmt):
+    mark = stream_codec.make_mark("S001", 42, datetime(2024, 1, 5, 9, 3, 7))
+    fields = {k.encode() if isinstance(k, str) else k: v.encode() if isinstance(v, str) else v
+              for k, v in stream_codec.encode(mark, fmt).items()}
+    decoded = stream_codec.decode(fields)
+    assert decoded == mark
+    assert (decoded.date, decoded.time) == ("2024-01-05", "09:03:07")
+
+
+def test_commits_round_trip():
+    pairs = [(1, "2024-01-05"), (12, "2024-01-06")]
+    assert stream_codec.decode_commits(stream_codec.encode_commits(pairs)) == set(pairs)
+
+
+@pytest.mark.parametrize("fields", [{}, {stream_codec.COMMITS_FIELD: b"x:2024-01-05"},
+                                    {stream_codec.COMMITS_FIELD: b""}])
+def test_malformed_commits(fields):
+    with pytest.raises(ValueError):
+        stream_codec.decode_commits(fields)